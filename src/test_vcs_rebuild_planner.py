@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+vcs_rebuild_planner.py 的测试
+使用记录命令行参数的桩vcs程序，检查build每次只调用一次完整设计的分区编译，
+以及子模块端口变化时例化它的分区会被标记为需要重编。
+
+用法:
+    python -m unittest test_vcs_rebuild_planner
+"""
+
+import os
+import sys
+import json
+import shlex
+import tempfile
+import unittest
+import contextlib
+
+import vcs_rebuild_planner as planner
+
+
+STUB_VCS = r'''
+import sys, json
+with open(sys.argv[1], 'a') as f:
+    f.write(json.dumps(sys.argv[2:]) + "\n")
+args = sys.argv[2:]
+simv = args[args.index('-o') + 1]
+open(simv, 'w').close()
+'''
+
+TB = "module test_gpu_axi_top;\n  mid u_mid(.a(1'b0));\nendmodule\n"
+MID = "module mid(input a);\n  leaf u_leaf(.a(a));\nendmodule\n"
+LEAF = "module leaf(input a);\n  wire b = a;\nendmodule\n"
+
+
+class BuildTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        root = self.tmp.name
+        # 目录结构与仓库一致: 在src下运行，testbench位于../testcase/test_gpgpu_axi_top/common
+        src = os.path.join(root, "src")
+        tb_dir = os.path.join(root, "testcase", "test_gpgpu_axi_top", "common")
+        self.tree = "gen_fpga_verilog_stub"
+        os.makedirs(os.path.join(src, self.tree))
+        os.makedirs(tb_dir)
+        self.write(os.path.join(tb_dir, "test_gpu_axi_top.sv"), TB)
+        self.write(os.path.join(src, self.tree, "mid.v"), MID)
+        self.write(os.path.join(src, self.tree, "leaf.v"), LEAF)
+
+        self.log = os.path.join(root, "vcs_args.jsonl")
+        stub = os.path.join(root, "stub_vcs.py")
+        self.write(stub, STUB_VCS)
+        self.vcs_cmd = (f"{shlex.quote(sys.executable)} {shlex.quote(stub)} {shlex.quote(self.log)} "
+                        "-partcomp -Mdir={mdir} -f {filelist} {partcfg} -top vcs_partitions -o {simv}")
+
+        self.cwd = os.getcwd()
+        os.chdir(src)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.tmp.cleanup()
+
+    @staticmethod
+    def write(path, text):
+        with open(path, 'w') as f:
+            f.write(text)
+
+    def build(self):
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            ret = planner.build_command(self.tree, max_depth=2, vcs_cmd=self.vcs_cmd, jobs=1)
+        self.assertEqual(ret, 0)
+        if not os.path.exists(self.log):
+            return []
+        with open(self.log) as f:
+            calls = [json.loads(line) for line in f]
+        os.remove(self.log)
+        return calls
+
+    def plan(self):
+        with open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            return planner.make_plan(self.tree, planner.DEFAULT_TOP, 2, jobs=1)
+
+    def test_single_linked_compile(self):
+        calls = self.build()
+        self.assertEqual(len(calls), 1)
+        args = calls[0]
+        self.assertIn("-partcomp", args)
+        self.assertEqual(args[args.index("-top") + 1], planner.PARTITION_CONFIG)
+
+        # filelist包含完整设计(含testbench)，分区根写入config
+        with open(args[args.index("-f") + 1]) as f:
+            files = sorted(os.path.basename(line.strip()) for line in f)
+        self.assertEqual(files, ["leaf.v", "mid.v", "test_gpu_axi_top.sv"])
+        partcfg = next(a for a in args if a.endswith(planner.PARTITION_CONFIG + ".v"))
+        with open(partcfg) as f:
+            config = f.read()
+        self.assertIn("design test_gpu_axi_top;", config)
+        self.assertIn("partition cell leaf;", config)
+        self.assertTrue(os.path.exists(args[args.index("-o") + 1]))
+
+        # 没有变化时不再调用vcs
+        self.assertEqual(self.build(), [])
+
+    def test_body_change_only_dirties_own_partition(self):
+        self.build()
+        self.write(os.path.join(self.tree, "leaf.v"), LEAF.replace("wire b = a;", "wire b = ~a;"))
+        plan = self.plan()
+        self.assertEqual(plan['dirty'], {"leaf": "修改"})
+        self.assertEqual(plan['dirty_parts'], {"leaf"})
+        self.assertEqual(len(self.build()), 1)
+
+    def test_port_change_dirties_instantiating_partition(self):
+        self.build()
+        self.write(os.path.join(self.tree, "leaf.v"), LEAF.replace("input a", "input [1:0] a"))
+        plan = self.plan()
+        self.assertEqual(plan['dirty']["leaf"], "修改")
+        self.assertIn("leaf", plan['dirty']["mid"])
+        self.assertEqual(plan['dirty_parts'], {"leaf", planner.TOP_PARTITION})
+
+
+if __name__ == "__main__":
+    unittest.main()
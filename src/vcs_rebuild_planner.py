@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+VCS Rebuild Planner
+基于内容哈希的增量编译规划工具
+
+主要功能:
+1. plan  - 对比新的gen_fpga目录与上次编译的清单，报告变化的模块和分区，估算可节省的时间
+2. build - 以VCS分区编译(-partcomp)方式编译并链接simv，成功后更新清单
+3. show  - 显示某个配置的编译清单
+
+每个配置的清单保存在 .vcs_build/<cfg>/manifest.json，记录每个文件和模块的内容哈希、
+模块端口签名、模块所属分区以及上次的编译耗时。
+
+分区不能作为独立设计单独编译(缺少上层模块无法elaborate)，build始终对完整filelist
+调用一次VCS: 分区根写入Verilog config中的 partition cell 语句，所有分区共用同一个
+-Mdir，VCS只重编内容变化的分区并完成顶层elaboration和链接。planner负责报告和
+在没有变化时跳过编译。
+"""
+
+import os
+import re
+import sys
+import time
+import json
+import hashlib
+import shlex
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import verilog_module_index
+from verilog_data_process import _index_inputs, config_name
+
+
+BUILD_DIR = ".vcs_build"
+DEFAULT_TOP = "test_gpu_axi_top"
+DEFAULT_DEPTH = 4
+SHARED_PARTITION = "__shared__"
+TOP_PARTITION = "__top__"
+PARTITION_CONFIG = "vcs_partitions"
+DEFAULT_VCS_CMD = ("vcs -full64 -sverilog -timescale=1ns/1ns +incdir+{incdir} "
+                   "-partcomp -fastpartcomp=j{jobs} -Mdir={mdir} -f {filelist} {partcfg} "
+                   "-top " + PARTITION_CONFIG + " -o {simv}")
+
+# 模块头: module <name> [#(...)] [(...)] ; 到第一个分号为止(ANSI端口列表中没有分号)
+MODULE_HEADER_RE = re.compile(rb'\b(?:macro)?module\s+([A-Za-z_]\w*)\b([^;]*);(.*?)\bendmodule\b', re.S)
+# 非ANSI风格在模块体中声明的端口和参数
+PORT_DECL_RE = re.compile(rb'\b(?:input|output|inout|parameter)\b[^;]*;')
+
+
+def manifest_path(config):
+    """返回某个配置的清单文件路径"""
+    return os.path.join(BUILD_DIR, config, "manifest.json")
+
+
+def load_manifest(config):
+    """读取清单，不存在时返回None"""
+    path = manifest_path(config)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r') as f:
+        return json.load(f)
+
+
+def save_manifest(config, manifest):
+    """原子地写入清单"""
+    path = manifest_path(config)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def port_signatures(path):
+    """返回文件中每个模块端口列表的哈希 {模块: 签名}
+
+    签名覆盖模块头(参数和ANSI端口列表)以及模块体中的input/output/inout/parameter声明，
+    空白和注释不影响签名。模块体内部实现变化时签名不变。
+    """
+    with open(path, 'rb') as f:
+        text = verilog_module_index.COMMENT_RE.sub(b' ', f.read())
+    signatures = {}
+    for match in MODULE_HEADER_RE.finditer(text):
+        header = match.group(2) + b';' + b''.join(PORT_DECL_RE.findall(match.group(3)))
+        signatures[match.group(1).decode()] = hashlib.sha256(b' '.join(header.split())).hexdigest()
+    return signatures
+
+
+def scan_tree(tree_dir, top, jobs=None):
+    """索引目录并返回当前状态: 文件哈希、模块->文件、模块依赖、可达模块"""
+    gen_paths, axi_paths, tb_paths = _index_inputs([tree_dir])
+    all_paths = gen_paths[tree_dir] + axi_paths + tb_paths
+    index = verilog_module_index.build_index(all_paths, jobs=jobs)
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        file_hashes = dict(zip(all_paths, pool.map(verilog_module_index.hash_file, all_paths)))
+
+    # axi_replace在模块级覆盖生成目录中的同名模块
+    module_file = {}
+    for path in gen_paths[tree_dir] + tb_paths:
+        for module in index[path]['declares']:
+            module_file.setdefault(module, path)
+    for path in axi_paths:
+        for module in index[path]['declares']:
+            module_file[module] = path
+
+    children = {m: sorted(c for c in index[p]['instantiates'] if c in module_file and c != m)
+                for m, p in module_file.items()}
+    if top not in module_file:
+        return None
+
+    # 按最短深度做BFS，得到可达模块及其深度
+    depth = {top: 0}
+    frontier = [top]
+    while frontier:
+        nxt = []
+        for module in frontier:
+            for child in children[module]:
+                if child not in depth:
+                    depth[child] = depth[module] + 1
+                    nxt.append(child)
+        frontier = nxt
+
+    # testbench也必须进入filelist，否则顶层无法elaborate
+    files = {p: file_hashes[p] for p in set(module_file[m] for m in depth)}
+    modules = {m: file_hashes[module_file[m]] for m in depth}
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        file_ports = dict(zip(files, pool.map(port_signatures, files)))
+    return {
+        'files': files,
+        'modules': modules,
+        'ports': {m: file_ports[module_file[m]].get(m, "") for m in modules},
+        'module_file': {m: module_file[m] for m in modules},
+        'children': {m: children[m] for m in depth},
+        'depth': depth,
+    }
+
+
+def assign_partitions(state, max_depth):
+    """把模块划分为稳定的分区
+
+    最短深度等于max_depth的模块作为分区根，只被一个根覆盖的模块归入该根的分区，
+    被多个根共享的模块归入__shared__，深度小于max_depth的模块归入__top__。
+    分区以根模块名命名，生成目录更新后只要层次结构不变，分区划分就保持不变。
+    """
+    depth = state['depth']
+    children = state['children']
+    roots = sorted(m for m, d in depth.items() if d == max_depth)
+    owners = {}
+    for root in roots:
+        stack = [root]
+        seen = {root}
+        while stack:
+            module = stack.pop()
+            owners.setdefault(module, set()).add(root)
+            for child in children[module]:
+                if child not in seen and depth[child] >= max_depth:
+                    seen.add(child)
+                    stack.append(child)
+
+    partitions = {}
+    for module in state['modules']:
+        if depth[module] < max_depth:
+            partitions[module] = TOP_PARTITION
+        elif len(owners.get(module, ())) == 1:
+            partitions[module] = next(iter(owners[module]))
+        else:
+            partitions[module] = SHARED_PARTITION
+    return partitions
+
+
+def diff_state(old, state, partitions):
+    """对比新旧清单，返回 (变化的模块{模块: 原因}, 需要重新编译的分区集合)"""
+    old_modules = old['modules'] if old else {}
+    old_partitions = old['partitions'] if old else {}
+    old_ports = old.get('ports', {}) if old else {}
+    dirty = {}
+    for module, digest in state['modules'].items():
+        if module not in old_modules:
+            dirty[module] = "新增"
+        elif old_modules[module] != digest:
+            dirty[module] = "修改"
+        elif old_partitions.get(module) != partitions[module]:
+            dirty[module] = "分区变化"
+
+    # 子模块端口列表变化时，例化它的模块即使自身未改也要随分区重编
+    for module, children in state['children'].items():
+        if module in dirty:
+            continue
+        changed = [c for c in children if c in old_ports and old_ports[c] != state['ports'][c]]
+        if changed:
+            dirty[module] = f"子模块端口变化: {', '.join(changed)}"
+    dirty_parts = {partitions[m] for m in dirty}
+
+    # 删除的模块使其原分区失效(分区本身已不存在时无需重编)
+    current_parts = set(partitions.values())
+    for module in set(old_modules) - set(state['modules']):
+        dirty[module] = "删除"
+        if old_partitions.get(module) in current_parts:
+            dirty_parts.add(old_partitions[module])
+    return dirty, dirty_parts
+
+
+def estimate_saving(old, state, partitions, dirty_parts):
+    """估算VCS复用干净分区可节省的编译时间(秒)
+
+    VCS只报告整体耗时，按各分区文件大小占上次完整编译耗时的比例估算。
+    """
+    if not old:
+        return 0.0
+    clean_parts = set(partitions.values()) - dirty_parts
+    full_seconds = old.get('full_seconds', 0.0)
+    sizes = {}
+    for module, part in partitions.items():
+        path = state['module_file'][module]
+        sizes[part] = sizes.get(part, 0) + os.path.getsize(path)
+    total = sum(sizes.values()) or 1
+    return full_seconds * sum(sizes.get(p, 0) for p in clean_parts) / total
+
+
+def make_plan(tree_dir, top, max_depth, jobs=None):
+    """生成增量编译计划"""
+    config = config_name(tree_dir)
+    state = scan_tree(tree_dir, top, jobs)
+    if state is None:
+        print(f"错误: 找不到顶层模块 {top} 的定义")
+        return None
+    partitions = assign_partitions(state, max_depth)
+    old = load_manifest(config)
+    dirty, dirty_parts = diff_state(old, state, partitions)
+    saving = estimate_saving(old, state, partitions, dirty_parts)
+    return {
+        'config': config,
+        'tree_dir': tree_dir,
+        'top': top,
+        'state': state,
+        'partitions': partitions,
+        'old': old,
+        'dirty': dirty,
+        'dirty_parts': dirty_parts,
+        'saving': saving,
+    }
+
+
+def print_plan(plan):
+    """打印变化模块报告"""
+    partitions = plan['partitions']
+    all_parts = sorted(set(partitions.values()))
+    print(f"配置 {plan['config']} (顶层 {plan['top']}):")
+    if plan['old'] is None:
+        print("  没有上次编译的清单，需要完整编译")
+    print(f"  模块: {len(partitions)} 个, 分区: {len(all_parts)} 个, "
+          f"变化模块: {len(plan['dirty'])} 个, 需重编分区: {len(plan['dirty_parts'])} 个")
+    for module in sorted(plan['dirty']):
+        part = partitions.get(module, plan['old']['partitions'].get(module) if plan['old'] else "-")
+        print(f"    [{plan['dirty'][module]}] {module}  (分区 {part})")
+    for part in all_parts:
+        count = sum(1 for p in partitions.values() if p == part)
+        mark = "重编" if part in plan['dirty_parts'] else "跳过"
+        print(f"  {mark} {part}: {count} 个模块")
+    print(f"  预计节省编译时间: {plan['saving']:.1f} s")
+
+
+def write_filelist(plan, out_dir):
+    """写出完整设计的filelist，使用绝对路径以便在任意目录下编译"""
+    filelist = os.path.join(out_dir, "design.f")
+    with open(filelist, 'w') as f:
+        for path in sorted(plan['state']['files']):
+            f.write(os.path.abspath(path) + "\n")
+    return filelist
+
+
+def write_partition_config(plan, out_dir):
+    """写出VCS分区编译使用的Verilog config，每个分区根一条partition cell语句
+
+    __top__和__shared__中的模块留在顶层分区。
+    """
+    roots = sorted(set(plan['partitions'].values()) - {TOP_PARTITION, SHARED_PARTITION})
+    path = os.path.join(out_dir, PARTITION_CONFIG + ".v")
+    with open(path, 'w') as f:
+        f.write(f"config {PARTITION_CONFIG};\n")
+        f.write(f"  design {plan['top']};\n")
+        f.write("  default liblist work;\n")
+        for root in roots:
+            f.write(f"  partition cell {root};\n")
+        f.write("endconfig\n")
+    return path
+
+
+def build_command(tree_dir=None, top=DEFAULT_TOP, max_depth=DEFAULT_DEPTH, vcs_cmd=DEFAULT_VCS_CMD,
+                  jobs=None, force=False):
+    """执行build命令 - 对完整设计做一次VCS分区编译，成功后更新清单
+
+    所有分区共用一个-Mdir，由VCS复用未变化分区的编译结果并链接出simv。
+    没有变化且simv存在时跳过编译。
+    """
+    plan = make_plan(tree_dir, top, max_depth, jobs)
+    if plan is None:
+        return 1
+    print_plan(plan)
+
+    partitions = plan['partitions']
+    all_parts = sorted(set(partitions.values()))
+    out_dir = os.path.abspath(os.path.join(BUILD_DIR, plan['config']))
+    simv = os.path.join(out_dir, "simv")
+    full = force or plan['old'] is None
+    if not full and not plan['dirty'] and os.path.exists(simv):
+        print(f"没有变化的模块，{simv} 已是最新")
+        return 0
+
+    mdir = os.path.join(out_dir, "csrc")
+    os.makedirs(mdir, exist_ok=True)
+    filelist = write_filelist(plan, out_dir)
+    partcfg = write_partition_config(plan, out_dir)
+    cmd = vcs_cmd.format(incdir=os.path.abspath("define"), mdir=mdir, filelist=filelist,
+                         partcfg=partcfg, simv=simv, jobs=jobs or os.cpu_count() or 1)
+    print(f"分区编译: {cmd}")
+    start_time = time.time()
+    ret = subprocess.call(shlex.split(cmd))
+    seconds = time.time() - start_time
+    if ret != 0:
+        print(f"编译失败，返回码: {ret}，清单未更新")
+        return ret
+
+    state = plan['state']
+    rebuilt = all_parts if full else sorted(plan['dirty_parts'])
+    save_manifest(plan['config'], {
+        'top': top,
+        'tree_dir': tree_dir,
+        'files': state['files'],
+        'modules': state['modules'],
+        'ports': state['ports'],
+        'partitions': partitions,
+        'rebuilt_partitions': rebuilt,
+        # 增量编译的耗时不代表完整编译，估算节省时间时使用上次完整编译的耗时
+        'full_seconds': seconds if full else plan['old'].get('full_seconds', seconds),
+        'last_seconds': seconds,
+        'simv': simv,
+        'built_at': time.strftime("%Y-%m-%d %H:%M:%S"),
+    })
+    print(f"编译完成: 重编 {len(rebuilt)}/{len(all_parts)} 个分区, 耗时 {seconds:.1f} s, 清单已更新")
+    return 0
+
+
+def plan_command(tree_dir=None, top=DEFAULT_TOP, max_depth=DEFAULT_DEPTH, jobs=None):
+    """执行plan命令 - 只报告，不编译"""
+    plan = make_plan(tree_dir, top, max_depth, jobs)
+    if plan is None:
+        return 1
+    print_plan(plan)
+    return 0
+
+
+def show_command(tree_dir):
+    """执行show命令 - 显示清单摘要"""
+    config = config_name(tree_dir)
+    manifest = load_manifest(config)
+    if manifest is None:
+        print(f"配置 {config} 还没有编译清单")
+        return 1
+    parts = sorted(set(manifest['partitions'].values()))
+    print(f"配置 {config}: 上次编译 {manifest['built_at']}, 顶层 {manifest['top']}")
+    print(f"  文件: {len(manifest['files'])} 个, 模块: {len(manifest['modules'])} 个, 分区: {len(parts)} 个")
+    print(f"  完整编译: {manifest.get('full_seconds', 0.0):.1f} s, "
+          f"上次编译: {manifest.get('last_seconds', 0.0):.1f} s, simv: {manifest.get('simv', '-')}")
+    for part in parts:
+        count = sum(1 for p in manifest['partitions'].values() if p == part)
+        mark = " (上次重编)" if part in manifest.get('rebuilt_partitions', parts) else ""
+        print(f"  {part}: {count} 个模块{mark}")
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="VCS增量编译规划工具",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python vcs_rebuild_planner.py plan  --name gen_fpga_verilog_1sm8w32t
+  python vcs_rebuild_planner.py build --name gen_fpga_verilog_1sm8w32t
+  python vcs_rebuild_planner.py build --name gen_fpga_verilog_1sm8w32t --vcs-cmd "./stub_vcs -Mdir={mdir} -f {filelist} {partcfg} -o {simv}"
+  python vcs_rebuild_planner.py show  --name gen_fpga_verilog_1sm8w32t
+        """
+    )
+    parser.add_argument('command', choices=['plan', 'build', 'show'], help='要执行的命令')
+    parser.add_argument('--name', required=True, help='gen_fpga目录')
+    parser.add_argument('--top', default=DEFAULT_TOP, help=f'顶层模块，默认 {DEFAULT_TOP}')
+    parser.add_argument('--depth', type=int, default=DEFAULT_DEPTH,
+                        help=f'分区根所在的层次深度，默认 {DEFAULT_DEPTH}')
+    parser.add_argument('--vcs-cmd', default=DEFAULT_VCS_CMD,
+                        help='编译命令模板，可用 {mdir} {filelist} {partcfg} {simv} {incdir} {jobs} 占位符')
+    parser.add_argument('--force', action='store_true', help='build: 忽略清单，重新编译全部分区')
+    parser.add_argument('-j', '--jobs', type=int, default=None, help='并行工作数，默认为CPU核数')
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        return 0
+
+    args = parser.parse_args()
+    if not os.path.isdir(args.name):
+        print(f"错误: 目录 {args.name} 不存在")
+        return 1
+
+    if args.command == 'plan':
+        return plan_command(args.name, args.top, args.depth, args.jobs)
+    elif args.command == 'build':
+        return build_command(args.name, args.top, args.depth, args.vcs_cmd, args.jobs, args.force)
+    elif args.command == 'show':
+        return show_command(args.name)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
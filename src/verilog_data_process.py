@@ -5,17 +5,36 @@ Verilog Data Process Tool
 用于处理Ventus GPGPU Verilog项目文件的工具脚本
 
 主要功能:
-1. get - 列出并解压/tmp目录下的ventus tar.gz文件
+1. get - 列出并解压/tmp目录下的ventus tar.gz文件，--only 只解压指定的成员
 2. run - 生成filelist.f文件并创建软链接
 3. show - 显示当前软链接状态
+4. ingest - 将gen_fpga目录存入内容寻址存储，相同文件以硬链接去重
+5. gc - 删除存储中没有任何目录引用的文件
+6. convert - 将tar.gz转换为分块压缩并带成员索引的格式，可以只解压部分成员
 """
 
 import os
 import sys
+import time
+import zlib
+import gzip
+import shutil
 import tarfile
+import tempfile
 import glob
+import json
+import fnmatch
+import hashlib
 import argparse
 from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+
+import verilog_module_index
+
+
+INDEX_SUFFIX = ".idx.json"
+INDEX_VERSION = 2
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024   # 分块格式中每块解压后的目标大小
 
 
 def list_ventus_archives():
@@ -25,8 +44,233 @@ def list_ventus_archives():
     return sorted(archives)
 
 
-def extract_archive(archive_path, extract_name=None):
-    """解压tar.gz文件到指定目录"""
+def load_archive_index(archive_path):
+    """读取tar.gz旁边的成员索引，没有索引或索引与压缩包不一致时返回None"""
+    index_path = archive_path + INDEX_SUFFIX
+    if not os.path.exists(index_path):
+        return None
+    try:
+        with open(index_path, 'r') as f:
+            index = json.load(f)
+    except ValueError:
+        print(f"警告: 索引 {index_path} 无法解析，按普通tar.gz处理")
+        return None
+    if index.get('version') != INDEX_VERSION or index.get('archive_size') != os.path.getsize(archive_path):
+        print(f"警告: 索引 {index_path} 与压缩包不一致，按普通tar.gz处理 (可重新执行convert)")
+        return None
+    return index
+
+
+def _strip_member_path(name):
+    """去掉tar成员路径的顶级目录，返回安全的相对路径；无效或顶级目录本身返回None"""
+    parts = [p for p in name.replace('\\', '/').split('/') if p and p != '.']
+    if len(parts) <= 1:
+        return None
+    rel_parts = parts[1:]
+    if any(p == '..' for p in rel_parts):
+        return None
+    return os.path.join(*rel_parts)
+
+
+def _unsafe_member(dest_dir, rel_path, real_dirs, linkname=None):
+    """检查成员能否安全写出，返回不能写出的原因，可以写出时返回None
+
+    上级目录中有软链接时拒绝(否则后面的成员会经软链接写到解压目录之外)；软链接的目标必须是
+    相对路径，且从链接所在目录解析后仍在解压目录内。确认过的真实目录缓存在real_dirs中。
+    """
+    prefix = ''
+    parent = os.path.dirname(rel_path)
+    for part in parent.split(os.sep) if parent else []:
+        prefix = os.path.join(prefix, part)
+        if prefix in real_dirs:
+            continue
+        path = os.path.join(dest_dir, prefix)
+        if os.path.islink(path):
+            return f"上级目录 {prefix} 是软链接"
+        if os.path.isdir(path):
+            real_dirs.add(prefix)
+    if linkname is not None:
+        target = os.path.normpath(os.path.join(os.path.dirname(rel_path), linkname.replace('\\', '/')))
+        if not linkname or linkname.startswith(('/', '\\')) or os.path.isabs(linkname) \
+                or target == '..' or target.startswith('..' + os.sep):
+            return f"软链接目标 {linkname} 在解压目录之外"
+    return None
+
+
+def _write_member(dest_path, data, mode):
+    """线程池任务: 将一个成员的数据写入磁盘"""
+    with open(dest_path, 'wb') as f:
+        f.write(data)
+    os.chmod(dest_path, mode & 0o777 or 0o644)
+    return len(data)
+
+
+def _extract_to_dir(archive_path, dest_dir, jobs):
+    """流式读取tar.gz并用线程池并行写出成员文件，返回(文件数, 解压后字节数)
+
+    用gzip模块解压: convert生成的文件由多个gzip成员拼接而成，tarfile的 'r|gz' 只会读第一个。
+    """
+    # 解压数据在内存中排队的上限，避免大文件堆积
+    max_pending_bytes = 256 * 1024 * 1024
+    pending = []
+    pending_bytes = 0
+    file_count = 0
+    total_bytes = 0
+    created_dirs = set()
+    real_dirs = set()
+    written = {}              # 目标路径 -> 写出任务，硬链接需要等目标写完
+
+    def ensure_dir(path):
+        if path not in created_dirs:
+            os.makedirs(path, exist_ok=True)
+            created_dirs.add(path)
+
+    def drain(limit):
+        nonlocal pending_bytes, total_bytes
+        while pending and pending_bytes > limit:
+            future, size = pending.pop(0)
+            total_bytes += future.result()
+            pending_bytes -= size
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        with gzip.open(archive_path, 'rb') as gz, tarfile.open(fileobj=gz, mode='r|') as tar:
+            for member in tar:
+                rel_path = _strip_member_path(member.name)
+                if rel_path is None:
+                    continue
+                dest_path = os.path.join(dest_dir, rel_path)
+                reason = _unsafe_member(dest_dir, rel_path, real_dirs, member.linkname if member.issym() else None)
+                if reason:
+                    print(f"警告: {member.name}: {reason}，已跳过")
+                    continue
+                if member.isdir():
+                    ensure_dir(dest_path)
+                elif member.issym():
+                    ensure_dir(os.path.dirname(dest_path))
+                    os.symlink(member.linkname, dest_path)
+                elif member.isfile():
+                    ensure_dir(os.path.dirname(dest_path))
+                    data = tar.extractfile(member).read()
+                    future = pool.submit(_write_member, dest_path, data, member.mode)
+                    written[dest_path] = future
+                    pending.append((future, len(data)))
+                    pending_bytes += len(data)
+                    file_count += 1
+                    drain(max_pending_bytes)
+                elif member.islnk():
+                    target_rel = _strip_member_path(member.linkname)
+                    target_path = os.path.join(dest_dir, target_rel) if target_rel else None
+                    if target_path not in written:
+                        print(f"警告: 硬链接 {member.name} 的目标 {member.linkname} 不在压缩包中，已跳过")
+                        continue
+                    written[target_path].result()
+                    ensure_dir(os.path.dirname(dest_path))
+                    os.link(target_path, dest_path)
+                    written[dest_path] = written[target_path]
+                    file_count += 1
+                else:
+                    print(f"警告: 不支持的成员类型 {member.name} (type={member.type!r})，已跳过")
+        drain(-1)
+
+    return file_count, total_bytes
+
+
+def _replace_member(dest_path, data, mode):
+    """线程池任务: 先写临时文件再rename，不会改动已有文件的内容(可能是ingest的硬链接)"""
+    tmp_path = f"{dest_path}.tmp-{os.getpid()}-{id(data)}"
+    _write_member(tmp_path, data, mode)
+    os.replace(tmp_path, dest_path)
+    return len(data)
+
+
+def _read_block(archive_path, block):
+    """读取并解压分块格式中的一块，block为 [压缩偏移, 压缩大小, 解压后大小]"""
+    offset, length, raw_size = block
+    with open(archive_path, 'rb') as f:
+        f.seek(offset)
+        raw = zlib.decompress(f.read(length), 16 + zlib.MAX_WBITS)
+    if len(raw) != raw_size:
+        raise ValueError(f"{archive_path}: 偏移 {offset} 处的块解压后为 {len(raw)} 字节，索引中为 {raw_size}")
+    return raw
+
+
+def _extract_indexed(archive_path, index, dest_dir, jobs, select=None):
+    """按索引并行解压: 每个线程解压一块并写出块中被选中的成员，返回(文件数, 解压后字节数, 没能解压的成员)
+
+    select(相对路径)返回False的成员跳过；目录和软链接在主线程中创建，已存在的软链接会被替换。
+    硬链接在目标写完后用os.link创建；目标没有被解压时直接把目标的数据写到链接路径。
+    不能安全写出的成员(见_unsafe_member)跳过，和未解析的硬链接一起返回。
+    """
+    files = {}
+    for member in index['members']:
+        rel_path = _strip_member_path(member['name'])
+        if member['type'] == 'file' and rel_path is not None:
+            files[rel_path] = member
+
+    by_block = {}
+    links = []                # (目标路径, 链接路径)
+    extracted = set()         # 已安排写出的普通文件，硬链接可以直接链接到它们
+    real_dirs = set()
+    unresolved = []
+    file_count = 0
+    for member in index['members']:
+        rel_path = _strip_member_path(member['name'])
+        if rel_path is None or (select is not None and not select(rel_path)):
+            continue
+        dest_path = os.path.join(dest_dir, rel_path)
+        reason = _unsafe_member(dest_dir, rel_path, real_dirs,
+                                member['linkname'] if member['type'] == 'symlink' else None)
+        if reason:
+            print(f"警告: {member['name']}: {reason}，已跳过")
+            unresolved.append(rel_path)
+            continue
+        if member['type'] == 'dir':
+            os.makedirs(dest_path, exist_ok=True)
+        elif member['type'] == 'symlink':
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            if os.path.lexists(dest_path):
+                os.remove(dest_path)
+            os.symlink(member['linkname'], dest_path)
+        elif member['type'] == 'file':
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            by_block.setdefault(member['block'], []).append((member, dest_path))
+            extracted.add(rel_path)
+            file_count += 1
+        elif member['type'] == 'hardlink':
+            target_rel = _strip_member_path(member['linkname'])
+            if target_rel not in files:
+                print(f"警告: 硬链接 {member['name']} 的目标 {member['linkname']} 不在压缩包中，已跳过")
+                unresolved.append(rel_path)
+                continue
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            if target_rel in extracted:
+                links.append((os.path.join(dest_dir, target_rel), dest_path))
+            else:
+                source = files[target_rel]
+                by_block.setdefault(source['block'], []).append((dict(source, mode=member['mode']), dest_path))
+            file_count += 1
+
+    def extract_block(item):
+        block_no, members = item
+        raw = _read_block(archive_path, index['blocks'][block_no])
+        return sum(_replace_member(dest_path, raw[m['offset']:m['offset'] + m['size']], m['mode'])
+                   for m, dest_path in members)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        total_bytes = sum(pool.map(extract_block, sorted(by_block.items())))
+    for target_path, dest_path in links:
+        if os.path.lexists(dest_path):
+            os.remove(dest_path)
+        os.link(target_path, dest_path)
+    return file_count, total_bytes, unresolved
+
+
+def extract_archive(archive_path, extract_name=None, jobs=None):
+    """解压tar.gz文件到指定目录
+
+    在进程内流式解压并去掉顶级目录，先写入同级临时目录，完成后再通过rename
+    替换目标目录，保证不会出现解压到一半的目录。有成员索引时各块由线程池并行解压。
+    """
     if not os.path.exists(archive_path):
         print(f"错误: 文件 {archive_path} 不存在")
         return False
@@ -35,50 +279,267 @@ def extract_archive(archive_path, extract_name=None):
         # 使用tar.gz文件名作为默认解压目录名
         extract_name = os.path.basename(archive_path).replace('.tar.gz', '')
     
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+
     # 使用相对路径
     extract_path = f"./{extract_name}"
+    parent_dir = os.path.dirname(os.path.abspath(extract_path))
+    tmp_path = tempfile.mkdtemp(prefix=f".{os.path.basename(extract_name)}.tmp-", dir=parent_dir)
     
     try:
-        # 如果目标目录已存在，先删除
-        if os.path.exists(extract_path):
-            print(f"删除现有目录: {extract_path}")
-            ret = os.system(f"rm -rf {extract_path}")
-            if ret != 0:
-                print(f"删除目录失败")
-                return False
-        
-        # 使用mkdir命令创建目录
-        print(f"创建目录: {extract_path}")
-        ret = os.system(f"mkdir -p {extract_path}")
-        if ret != 0:
-            print(f"创建目录失败")
-            return False
-        
-        # 使用tar命令解压，去掉顶级目录
-        print(f"开始解压...")
-        cmd = f"tar --strip-components=1 -xzf {archive_path} -C {extract_path}"
-        ret = os.system(cmd)
-        
-        if ret == 0:
-            print(f"成功解压 {archive_path} 到 {extract_path}")
-            return True
+        index = load_archive_index(archive_path)
+        print(f"开始解压 {archive_path} (线程数: {jobs}{', 按块并行' if index else ''})...")
+        start_time = time.time()
+        if index is not None:
+            file_count, total_bytes, _ = _extract_indexed(archive_path, index, tmp_path, jobs)
         else:
-            print(f"解压失败，返回码: {ret}")
-            # 清理失败时创建的目录
-            if os.path.exists(extract_path):
-                os.system(f"rm -rf {extract_path}")
-            return False
+            file_count, total_bytes = _extract_to_dir(archive_path, tmp_path, jobs)
+        elapsed = time.time() - start_time
+
+        # 原子替换: 旧目录先移走，再把临时目录rename为目标目录
+        old_path = None
+        if os.path.lexists(extract_path):
+            print(f"替换现有目录: {extract_path}")
+            old_path = tempfile.mkdtemp(prefix=f".{os.path.basename(extract_name)}.old-", dir=parent_dir)
+            os.rename(extract_path, os.path.join(old_path, 'tree'))
+        try:
+            os.rename(tmp_path, extract_path)
+        except OSError:
+            # 新目录没能就位时把旧目录放回原处
+            if old_path is not None:
+                os.rename(os.path.join(old_path, 'tree'), extract_path)
+                os.rmdir(old_path)
+            raise
+        if old_path is not None:
+            shutil.rmtree(old_path, ignore_errors=True)
+
+        archive_mb = os.path.getsize(archive_path) / (1024 * 1024)
+        total_mb = total_bytes / (1024 * 1024)
+        speed = total_mb / elapsed if elapsed > 0 else float('inf')
+        print(f"成功解压 {archive_path} 到 {extract_path}")
+        print(f"  文件数: {file_count}, 压缩包: {archive_mb:.2f} MB, 解压后: {total_mb:.2f} MB")
+        print(f"  用时: {elapsed:.2f} s, 吞吐量: {speed:.2f} MB/s")
+        return True
             
     except Exception as e:
         print(f"解压失败: {e}")
-        # 清理失败时创建的目录
-        if os.path.exists(extract_path):
-            os.system(f"rm -rf {extract_path}")
+        # 清理失败时创建的临时目录
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return False
+
+
+def member_selector(patterns):
+    """--only 参数 → (选择函数, 各参数匹配到的文件数)
+
+    每个参数可以是逗号分隔的列表: 含 *?[ 的按glob匹配相对路径或文件名，其它的按相对路径、
+    文件名或模块名(文件名去掉扩展名，生成代码中每个模块一个文件)匹配；@文件 从文件中按行读取。
+    """
+    tokens = []
+    for pattern in patterns:
+        for token in pattern.split(','):
+            token = token.strip()
+            if token.startswith('@'):
+                with open(token[1:], 'r') as f:
+                    tokens.extend(line.strip() for line in f if line.strip() and not line.startswith('#'))
+            elif token:
+                tokens.append(token)
+    hits = dict.fromkeys(tokens, 0)
+
+    def select(rel_path):
+        rel_path = rel_path.replace(os.sep, '/')
+        base = os.path.basename(rel_path)
+        stem = os.path.splitext(base)[0]
+        matched = False
+        for token in tokens:
+            if any(c in token for c in '*?['):
+                ok = fnmatch.fnmatchcase(rel_path, token) or fnmatch.fnmatchcase(base, token)
+            else:
+                ok = token in (rel_path, base, stem)
+            if ok:
+                hits[token] += 1
+                matched = True
+        return matched
+
+    return select, hits
+
+
+def _extract_selected_stream(archive_path, dest_dir, select):
+    """没有索引时只能顺序解压整个tar.gz，只写出被选中的文件，返回(文件数, 解压后字节数, 没能解压的成员)
+
+    流式读取无法回头取数据，硬链接的目标也被选中时才能创建。
+    """
+    file_count = 0
+    total_bytes = 0
+    written = set()
+    real_dirs = set()
+    unresolved = []
+    with gzip.open(archive_path, 'rb') as gz, tarfile.open(fileobj=gz, mode='r|') as tar:
+        for member in tar:
+            rel_path = _strip_member_path(member.name)
+            if rel_path is None or member.isdir() or not select(rel_path):
+                continue
+            dest_path = os.path.join(dest_dir, rel_path)
+            reason = _unsafe_member(dest_dir, rel_path, real_dirs, member.linkname if member.issym() else None)
+            if reason:
+                print(f"警告: {member.name}: {reason}，已跳过")
+                unresolved.append(rel_path)
+                continue
+            os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+            if member.issym():
+                if os.path.lexists(dest_path):
+                    os.remove(dest_path)
+                os.symlink(member.linkname, dest_path)
+            elif member.isfile():
+                total_bytes += _replace_member(dest_path, tar.extractfile(member).read(), member.mode)
+                written.add(rel_path)
+                file_count += 1
+            elif member.islnk():
+                target_rel = _strip_member_path(member.linkname)
+                if target_rel not in written:
+                    print(f"警告: 硬链接 {member.name} 的目标 {member.linkname} 没有被解压 "
+                          f"(可一并选中目标，或先执行 convert)，已跳过")
+                    unresolved.append(rel_path)
+                    continue
+                if os.path.lexists(dest_path):
+                    os.remove(dest_path)
+                os.link(os.path.join(dest_dir, target_rel), dest_path)
+                written.add(rel_path)
+                file_count += 1
+    return file_count, total_bytes, unresolved
+
+
+def extract_members(archive_path, patterns, extract_name=None, jobs=None):
+    """只解压与patterns匹配的成员到目录中(目录不存在时创建)，已有文件逐个原子替换"""
+    if not os.path.exists(archive_path):
+        print(f"错误: 文件 {archive_path} 不存在")
+        return False
+    if extract_name is None:
+        extract_name = os.path.basename(archive_path).replace('.tar.gz', '')
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    extract_path = f"./{extract_name}"
+    select, hits = member_selector(patterns)
+    if not hits:
+        print("错误: --only 没有给出任何成员")
         return False
 
+    index = load_archive_index(archive_path)
+    start_time = time.time()
+    if index is not None:
+        print(f"按索引解压 {archive_path} 中的 {len(hits)} 项到 {extract_path} (线程数: {jobs})...")
+        file_count, total_bytes, unresolved = _extract_indexed(archive_path, index, extract_path, jobs, select)
+    else:
+        print(f"{archive_path} 没有成员索引，需要顺序解压整个文件 "
+              f"(可先执行 convert --archive {archive_path})...")
+        file_count, total_bytes, unresolved = _extract_selected_stream(archive_path, extract_path, select)
+    elapsed = time.time() - start_time
+
+    missing = [token for token, count in hits.items() if count == 0]
+    for token in missing:
+        print(f"警告: {token} 没有匹配到任何成员")
+    print(f"解压 {file_count} 个文件 ({total_bytes / (1024 * 1024):.2f} MB) 到 {extract_path}, 用时: {elapsed:.2f} s")
+    return not missing and not unresolved
+
+
+def convert_archive(archive_path, output_path=None, block_size=DEFAULT_BLOCK_SIZE):
+    """把tar.gz转换为分块格式: tar流按成员边界切成约block_size的块，每块单独gzip压缩后依次拼接
+
+    结果仍是合法的tar.gz(gzip允许多个成员拼接)，可以用tar直接解压；旁边的 <文件>.idx.json 记录
+    每块的压缩偏移/大小和每个成员所在的块及块内偏移，用于只解压部分成员。默认原地替换。
+    """
+    if output_path is None:
+        output_path = archive_path
+    index = {'version': INDEX_VERSION, 'block_size': block_size, 'blocks': [], 'members': []}
+    tmp_path = f"{output_path}.tmp-{os.getpid()}"
+    buf = bytearray()
+    raw_total = 0
+
+    def flush(out):
+        nonlocal raw_total
+        if not buf:
+            return
+        data = gzip.compress(bytes(buf), mtime=0)
+        index['blocks'].append([out.tell(), len(data), len(buf)])
+        out.write(data)
+        raw_total += len(buf)
+        buf.clear()
+
+    try:
+        with open(tmp_path, 'wb') as out, gzip.open(archive_path, 'rb') as gz, \
+                tarfile.open(fileobj=gz, mode='r|') as tar:
+            for member in tar:
+                data = tar.extractfile(member).read() if member.isfile() else b""
+                header = member.tobuf(tarfile.PAX_FORMAT, tar.encoding, tar.errors)
+                padding = -len(data) % tarfile.BLOCKSIZE
+                # 成员不跨块: 放不下时先结束当前块，超过块大小的成员单独成块
+                if buf and len(buf) + len(header) + len(data) + padding > block_size:
+                    flush(out)
+                entry = {'name': member.name, 'mode': member.mode, 'size': len(data)}
+                if member.isfile():
+                    entry.update(type='file', block=len(index['blocks']), offset=len(buf) + len(header))
+                elif member.isdir():
+                    entry['type'] = 'dir'
+                elif member.issym():
+                    entry.update(type='symlink', linkname=member.linkname)
+                elif member.islnk():
+                    entry.update(type='hardlink', linkname=member.linkname)
+                else:
+                    entry['type'] = 'other'
+                index['members'].append(entry)
+                buf.extend(header)
+                buf.extend(data)
+                buf.extend(b"\0" * padding)
+            # tar结束标记: 两个空块，总长度补齐到RECORDSIZE
+            buf.extend(b"\0" * (2 * tarfile.BLOCKSIZE))
+            buf.extend(b"\0" * (-(raw_total + len(buf)) % tarfile.RECORDSIZE))
+            flush(out)
+        index['archive_size'] = os.path.getsize(tmp_path)
+        index_tmp = f"{output_path}{INDEX_SUFFIX}.tmp-{os.getpid()}"
+        with open(index_tmp, 'w') as f:
+            json.dump(index, f, separators=(',', ':'))
+        # 先替换压缩包再替换索引；中途失败时索引的archive_size对不上，会被当作没有索引
+        os.replace(tmp_path, output_path)
+        os.replace(index_tmp, output_path + INDEX_SUFFIX)
+    except BaseException:
+        for path in (tmp_path, f"{output_path}{INDEX_SUFFIX}.tmp-{os.getpid()}"):
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+
+    files = sum(1 for m in index['members'] if m['type'] == 'file')
+    print(f"转换 {archive_path} -> {output_path}: {files} 个文件, {len(index['blocks'])} 块, "
+          f"解压后 {raw_total / (1024 * 1024):.2f} MB, 压缩后 {index['archive_size'] / (1024 * 1024):.2f} MB")
+    return index
+
+
+def convert_command(archive_path=None, output_path=None, block_size=DEFAULT_BLOCK_SIZE):
+    """执行convert命令 - 不指定archive_path时转换/tmp下所有还没有索引的ventus tar.gz"""
+    if archive_path is not None:
+        if not os.path.exists(archive_path):
+            print(f"错误: 文件 {archive_path} 不存在")
+            return False
+        convert_archive(archive_path, output_path, block_size)
+        return True
+    archives = [a for a in list_ventus_archives() if not os.path.exists(a + INDEX_SUFFIX)]
+    if not archives:
+        print("/tmp目录下没有需要转换的ventus tar.gz文件")
+        return True
+    for archive in archives:
+        convert_archive(archive, block_size=block_size)
+    return True
+
+
+def get_command(archive_path=None, extract_name=None, jobs=None, only=None):
+    """执行get命令 - 列出并解压tar.gz文件
+
+    指定archive_path时以非交互方式直接解压，指定only时只解压匹配的成员。
+    """
+    if archive_path is not None:
+        if only:
+            return extract_members(archive_path, only, extract_name, jobs)
+        return extract_archive(archive_path, extract_name, jobs)
 
-def get_command():
-    """执行get命令 - 列出并解压tar.gz文件"""
     archives = list_ventus_archives()
     
     if not archives:
@@ -87,7 +548,8 @@ def get_command():
     
     print("找到以下ventus tar.gz文件:")
     for i, archive in enumerate(archives, 1):
-        print(f"{i}. {archive}")
+        seekable = " [有成员索引]" if os.path.exists(archive + INDEX_SUFFIX) else ""
+        print(f"{i}. {archive}{seekable}")
     
     try:
         choice = input("\n请选择要解压的文件编号 (或按Enter退出): ").strip()
@@ -109,7 +571,10 @@ def get_command():
         if not extract_name:
             extract_name = default_name
         
-        extract_archive(selected_archive, extract_name)
+        if only:
+            extract_members(selected_archive, only, extract_name, jobs)
+        else:
+            extract_archive(selected_archive, extract_name, jobs)
         
     except ValueError:
         print("请输入有效的数字")
@@ -174,35 +639,158 @@ def replace_with_axi_files(verilog_files, selected_dir):
     return updated_files
 
 
-def create_filelist(selected_dir):
-    """为选定目录创建filelist.f文件"""
+TESTBENCH_DIR = "../testcase/test_gpgpu_axi_top/common"
+
+
+def _index_inputs(gen_dirs):
+    """返回建立模块索引所需的 (各生成目录文件, axi_replace文件, testbench文件)"""
+    axi_replace_dir = "./axi_replace"
+    gen_paths = {d: [os.path.join(d, vfile) for vfile in find_verilog_files(d)] for d in gen_dirs}
+    axi_paths = []
+    if os.path.isdir(axi_replace_dir):
+        axi_paths = [os.path.join(axi_replace_dir, f) for f in sorted(os.listdir(axi_replace_dir))
+                     if f.endswith(('.v', '.sv'))]
+    tb_paths = []
+    if os.path.isdir(TESTBENCH_DIR):
+        tb_paths = [os.path.join(TESTBENCH_DIR, f) for f in find_verilog_files(TESTBENCH_DIR)]
+    return gen_paths, axi_paths, tb_paths
+
+
+def prune_by_top(verilog_files, selected_dir, top, jobs=None, index=None):
+    """只保留从顶层模块可达的文件，axi_replace按模块名替换
+
+    testbench目录只参与依赖解析(顶层通常在其中)，不会写入filelist。
+    index可传入预先建好的索引(需覆盖本目录、axi_replace和testbench文件)。
+    返回与replace_with_axi_files相同格式的列表，顶层模块找不到时返回None。
+    """
+    gen_paths, axi_paths, tb_paths = _index_inputs([selected_dir])
+    gen_paths = gen_paths[selected_dir]
+    if index is None:
+        index = verilog_module_index.build_index(gen_paths + axi_paths + tb_paths, jobs=jobs)
+    else:
+        index = {path: index[path] for path in gen_paths + axi_paths + tb_paths}
+    needed = verilog_module_index.resolve_reachable(index, top, overrides=set(axi_paths))
+    if needed is None:
+        print(f"错误: 找不到顶层模块 {top} 的定义")
+        return None
+
+    pruned = [vfile for vfile, path in zip(verilog_files, gen_paths) if path in needed]
+    pruned += [f"AXI_REPLACE:{os.path.basename(path)}" for path in axi_paths if path in needed]
+    print(f"顶层 {top}: 保留 {len(pruned)} 个文件, 裁剪 {len(verilog_files) - len(pruned) + len(axi_paths)} 个"
+          f" (原 {len(verilog_files)} + axi_replace {len(axi_paths)})")
+    return pruned
+
+
+def create_filelist(selected_dir, top=None, jobs=None, config=None, index=None):
+    """为选定目录创建filelist.f文件
+
+    指定top时只写入从顶层模块可达的文件。
+    指定config时生成filelist.<config>.f，直接引用该目录而不经过gen_fpga_verilog软链接。
+    """
     verilog_files = find_verilog_files(selected_dir)
     
     if not verilog_files:
         print(f"在目录 {selected_dir} 中没有找到.v或.sv文件")
         return False
     
-    # 用axi_replace中的文件替换同名文件
-    verilog_files = replace_with_axi_files(verilog_files, selected_dir)
+    if top is not None:
+        # 按模块依赖裁剪，axi_replace在模块级替换
+        verilog_files = prune_by_top(verilog_files, selected_dir, top, jobs, index)
+        if verilog_files is None:
+            return False
+    else:
+        # 用axi_replace中的文件替换同名文件
+        verilog_files = replace_with_axi_files(verilog_files, selected_dir)
     
     # 获取当前脚本的目录，filelist.f放在和脚本相同的目录下
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    filelist_path = os.path.join(script_dir, "filelist.f")
+    if config is None:
+        filelist_path = os.path.join(script_dir, "filelist.f")
+        tree_prefix = "../../../src/gen_fpga_verilog"
+    else:
+        filelist_path = os.path.join(script_dir, f"filelist.{config}.f")
+        tree_prefix = f"../../../src/{os.path.basename(os.path.normpath(selected_dir))}"
     
-    with open(filelist_path, 'w') as f:
+    # 先写临时文件再rename，正在编译的VCS不会读到写了一半的filelist
+    tmp_path = f"{filelist_path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
         for vfile in verilog_files:
             if vfile.startswith("AXI_REPLACE:"):
                 # 处理axi_replace文件
                 filename = vfile.replace("AXI_REPLACE:", "")
                 f.write(f"../../../src/axi_replace/{filename}\n")
             else:
-                # 处理普通文件，添加前缀 "../../../src/gen_fpga_verilog/"
-                f.write(f"../../../src/gen_fpga_verilog/{vfile}\n")
+                # 处理普通文件，添加前缀 "../../../src/gen_fpga_verilog/" 或配置目录
+                f.write(f"{tree_prefix}/{vfile}\n")
+    os.replace(tmp_path, filelist_path)
     
     print(f"成功创建 {filelist_path}，包含 {len(verilog_files)} 个文件")
     return True
 
 
+def config_name(directory):
+    """由目录名得到配置名，例如 gen_fpga_verilog_1sm8w32t -> 1sm8w32t"""
+    name = os.path.basename(os.path.normpath(directory))
+    for prefix in ("gen_fpga_verilog_", "gen_fpga_"):
+        if name.startswith(prefix) and len(name) > len(prefix):
+            return name[len(prefix):]
+    return name
+
+
+def create_run_files(config):
+    """为testcase/*/common/run.f生成引用filelist.<config>.f的run.<config>.f"""
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    pattern = os.path.join(script_dir, "..", "testcase", "*", "common", "run.f")
+    created = []
+    for run_f in sorted(glob.glob(pattern)):
+        # 保留原文件的换行符
+        with open(run_f, 'r', newline='') as f:
+            lines = f.read().splitlines(keepends=True)
+        new_lines = [line.replace("src/filelist.f", f"src/filelist.{config}.f")
+                     if not line.lstrip().startswith("//") else line for line in lines]
+        if new_lines == lines:
+            continue
+        run_cfg_f = os.path.join(os.path.dirname(run_f), f"run.{config}.f")
+        with open(run_cfg_f, 'w', newline='') as f:
+            f.write("".join(new_lines))
+        created.append(os.path.relpath(run_cfg_f, script_dir))
+    return created
+
+
+def run_all_command(top=None, jobs=None):
+    """执行run --all - 为每个gen_fpga目录并行生成独立的filelist和run文件
+
+    各配置的文件互不共享，也不修改gen_fpga_verilog软链接，可同时编译多个配置。
+    """
+    dirs = [d for d in list_directories() if not os.path.islink(d)]
+    if not dirs:
+        print("当前目录下没有找到以'gen_fpga'开头的子目录")
+        return
+
+    index = None
+    if top is not None:
+        # 所有配置共用一次索引，避免并行任务重复解析和竞争写缓存
+        gen_paths, axi_paths, tb_paths = _index_inputs(dirs)
+        all_paths = [p for d in dirs for p in gen_paths[d]] + axi_paths + tb_paths
+        index = verilog_module_index.build_index(all_paths, jobs=jobs)
+
+    def build_one(directory):
+        config = config_name(directory)
+        if not create_filelist(directory, top, jobs, config=config, index=index):
+            return config, None
+        return config, create_run_files(config)
+
+    with ThreadPoolExecutor(max_workers=jobs or os.cpu_count() or 1) as pool:
+        results = list(pool.map(build_one, dirs))
+
+    print("生成结果:")
+    for config, run_files in results:
+        if run_files is None:
+            print(f"  {config}: 失败")
+        else:
+            print(f"  {config}: filelist.{config}.f, " + ", ".join(run_files))
+
+
 def create_symlink(target_dir):
     """创建软链接到gen_fpga_verilog"""
     symlink_name = "gen_fpga_verilog"
@@ -221,8 +809,16 @@ def create_symlink(target_dir):
         return False
 
 
-def run_command():
+def run_command(selected_dir=None, top=None, jobs=None):
     """执行run命令 - 选择gen_fpga目录并生成filelist"""
+    if selected_dir is not None:
+        if not os.path.isdir(selected_dir):
+            print(f"错误: 目录 {selected_dir} 不存在")
+            return
+        if create_filelist(selected_dir, top, jobs):
+            create_symlink(selected_dir)
+        return
+
     dirs = list_directories()
     
     if not dirs:
@@ -248,7 +844,7 @@ def run_command():
         print(f"选择的目录: {selected_dir}")
         
         # 创建filelist.f文件
-        if create_filelist(selected_dir):
+        if create_filelist(selected_dir, top, jobs):
             # 创建软链接
             create_symlink(selected_dir)
         
@@ -291,6 +887,178 @@ def show_command():
             print(f"软链接 {symlink_name} 不存在")
 
 
+STORE_DIR = ".verilog_store"
+
+
+def _store_paths(store_dir=STORE_DIR):
+    """返回blob目录和tree清单目录，不存在时创建"""
+    objects_dir = os.path.join(store_dir, "objects")
+    trees_dir = os.path.join(store_dir, "trees")
+    os.makedirs(objects_dir, exist_ok=True)
+    os.makedirs(trees_dir, exist_ok=True)
+    return objects_dir, trees_dir
+
+
+def _blob_path(objects_dir, digest):
+    """按哈希前两位分目录存放blob"""
+    return os.path.join(objects_dir, digest[:2], digest[2:])
+
+
+def _hash_file(path):
+    """计算文件内容的sha256"""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _load_tree_manifest(trees_dir, tree_name):
+    """读取某个tree的清单，不存在时返回空字典"""
+    manifest_path = os.path.join(trees_dir, f"{tree_name}.json")
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, 'r') as f:
+        return json.load(f)
+
+
+def _save_tree_manifest(trees_dir, tree_name, manifest):
+    """原子地写入tree清单"""
+    manifest_path = os.path.join(trees_dir, f"{tree_name}.json")
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def ingest_tree(tree_dir, store_dir=STORE_DIR, jobs=None):
+    """将目录中的文件存入内容寻址存储，并把原文件替换为指向blob的硬链接
+
+    只有stat信息(inode/大小/mtime)与上次清单不一致的文件才重新计算哈希。
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    objects_dir, trees_dir = _store_paths(store_dir)
+    tree_name = os.path.basename(os.path.normpath(tree_dir))
+    old_manifest = _load_tree_manifest(trees_dir, tree_name)
+
+    rel_paths = []
+    for root, dirs, files in os.walk(tree_dir):
+        for file in files:
+            full_path = os.path.join(root, file)
+            if os.path.islink(full_path):
+                continue
+            rel_paths.append(os.path.relpath(full_path, tree_dir))
+    rel_paths.sort()
+
+    # 增量: 复用stat未变化且blob仍存在的条目
+    manifest = {}
+    to_hash = []
+    for rel_path in rel_paths:
+        st = os.stat(os.path.join(tree_dir, rel_path))
+        entry = old_manifest.get(rel_path)
+        if (entry and entry['ino'] == st.st_ino and entry['size'] == st.st_size
+                and entry['mtime_ns'] == st.st_mtime_ns
+                and os.path.exists(_blob_path(objects_dir, entry['hash']))):
+            manifest[rel_path] = entry
+        else:
+            to_hash.append(rel_path)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        digests = list(pool.map(lambda p: _hash_file(os.path.join(tree_dir, p)), to_hash))
+
+    new_blobs = 0
+    new_bytes = 0
+    linked = 0
+    for rel_path, digest in zip(to_hash, digests):
+        full_path = os.path.join(tree_dir, rel_path)
+        blob = _blob_path(objects_dir, digest)
+        if not os.path.exists(blob):
+            # 新内容: 直接把文件本身硬链接进存储，无需拷贝
+            os.makedirs(os.path.dirname(blob), exist_ok=True)
+            os.chmod(full_path, 0o444)
+            os.link(full_path, blob)
+            new_blobs += 1
+            new_bytes += os.path.getsize(blob)
+        elif os.stat(blob).st_ino != os.stat(full_path).st_ino:
+            # 已有相同内容: 用指向blob的硬链接替换原文件
+            tmp_link = full_path + ".lnk-tmp"
+            os.link(blob, tmp_link)
+            os.replace(tmp_link, full_path)
+            linked += 1
+        st = os.stat(full_path)
+        manifest[rel_path] = {
+            'hash': digest,
+            'ino': st.st_ino,
+            'size': st.st_size,
+            'mtime_ns': st.st_mtime_ns,
+        }
+
+    _save_tree_manifest(trees_dir, tree_name, manifest)
+    print(f"入库 {tree_name}: {len(rel_paths)} 个文件, 重新哈希 {len(to_hash)} 个, "
+          f"新增blob {new_blobs} 个 ({new_bytes / (1024 * 1024):.2f} MB), 硬链接去重 {linked} 个")
+    return manifest
+
+
+def ingest_command(tree_name=None, jobs=None):
+    """执行ingest命令 - 将gen_fpga目录存入内容寻址存储"""
+    if tree_name is not None:
+        dirs = [tree_name]
+    else:
+        dirs = [d for d in list_directories() if not os.path.islink(d)]
+    if not dirs:
+        print("当前目录下没有找到以'gen_fpga'开头的子目录")
+        return
+
+    for directory in dirs:
+        if not os.path.isdir(directory):
+            print(f"错误: 目录 {directory} 不存在")
+            continue
+        ingest_tree(directory, jobs=jobs)
+
+    objects_dir, trees_dir = _store_paths()
+    logical_bytes = 0
+    for manifest_file in glob.glob(os.path.join(trees_dir, "*.json")):
+        with open(manifest_file, 'r') as f:
+            logical_bytes += sum(e['size'] for e in json.load(f).values())
+    store_bytes = sum(os.path.getsize(p) for p in glob.glob(os.path.join(objects_dir, "*", "*")))
+    print(f"存储统计: 逻辑大小 {logical_bytes / (1024 * 1024):.2f} MB, "
+          f"实际占用 {store_bytes / (1024 * 1024):.2f} MB")
+
+
+def gc_command(store_dir=STORE_DIR):
+    """执行gc命令 - 删除没有任何tree引用的blob"""
+    objects_dir, trees_dir = _store_paths(store_dir)
+    referenced = set()
+    for manifest_file in glob.glob(os.path.join(trees_dir, "*.json")):
+        tree_name = os.path.basename(manifest_file)[:-len(".json")]
+        if not os.path.isdir(tree_name):
+            # tree目录已被删除，清单随之失效
+            os.remove(manifest_file)
+            print(f"删除失效清单: {tree_name}")
+            continue
+        with open(manifest_file, 'r') as f:
+            referenced.update(e['hash'] for e in json.load(f).values())
+
+    removed = 0
+    removed_bytes = 0
+    for blob in glob.glob(os.path.join(objects_dir, "*", "*")):
+        digest = os.path.basename(os.path.dirname(blob)) + os.path.basename(blob)
+        if digest not in referenced:
+            removed_bytes += os.path.getsize(blob)
+            os.remove(blob)
+            removed += 1
+    print(f"gc完成: 删除 {removed} 个blob, 释放 {removed_bytes / (1024 * 1024):.2f} MB")
+
+
+def positive_int(value):
+    """argparse类型: 正整数"""
+    number = int(value)
+    if number <= 0:
+        raise argparse.ArgumentTypeError(f"必须是正整数: {value}")
+    return number
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -299,13 +1067,33 @@ def main():
         epilog="""
 使用示例:
   python verilog_data_process.py get   # 列出并解压tar.gz文件
+  python verilog_data_process.py get --archive /tmp/ventus.tar.gz --name gen_fpga_verilog_xxx
+  python verilog_data_process.py get --archive /tmp/ventus.tar.gz --name gen_fpga_verilog_xxx --only 'sm_wrapper,*Arbiter*'
+  python verilog_data_process.py convert [--archive /tmp/ventus.tar.gz]  # 转换为分块格式并生成成员索引
   python verilog_data_process.py run   # 选择目录并生成filelist
+  python verilog_data_process.py run --name gen_fpga_verilog_1sm4w8t --top test_gpu_axi_top
+  python verilog_data_process.py run --all [--top test_gpu_axi_top]  # 每个配置独立的filelist
   python verilog_data_process.py show  # 显示软链接状态
+  python verilog_data_process.py ingest [--name DIR]  # 存入内容寻址存储并硬链接去重
+  python verilog_data_process.py gc    # 清理无引用的blob
         """
     )
     
-    parser.add_argument('command', choices=['get', 'run', 'show'],
+    parser.add_argument('command', choices=['get', 'run', 'show', 'ingest', 'gc', 'convert'],
                        help='要执行的命令')
+    parser.add_argument('--archive', help='get: 直接解压指定的tar.gz文件(非交互); convert: 要转换的tar.gz')
+    parser.add_argument('--name', help='get: 解压目录名，默认使用tar.gz文件名; run/ingest: 直接使用该目录')
+    parser.add_argument('--all', action='store_true',
+                       help='run: 为每个gen_fpga目录并行生成filelist.<cfg>.f和run.<cfg>.f')
+    parser.add_argument('--top', help='run: 只保留从该顶层模块可达的文件，例如 test_gpu_axi_top')
+    parser.add_argument('--only', nargs='+',
+                       help='get: 只解压匹配的成员(glob、相对路径、文件名或模块名，逗号分隔，@文件 按行读取)，'
+                            '写入已有目录时逐个替换')
+    parser.add_argument('--output', help='convert: 输出文件，默认原地替换')
+    parser.add_argument('--block-size', type=positive_int, default=DEFAULT_BLOCK_SIZE // 1024,
+                       help=f'convert: 每块解压后的大小(KB)，默认 {DEFAULT_BLOCK_SIZE // 1024}')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                       help='并行工作线程数，默认为CPU核数')
     
     if len(sys.argv) == 1:
         parser.print_help()
@@ -315,11 +1103,22 @@ def main():
     
     try:
         if args.command == 'get':
-            get_command()
+            # 非交互解压失败或 --only 有成员没能解压时返回非0
+            if get_command(args.archive, args.name, args.jobs, args.only) is False:
+                return 1
         elif args.command == 'run':
-            run_command()
+            if args.all:
+                run_all_command(args.top, args.jobs)
+            else:
+                run_command(args.name, args.top, args.jobs)
         elif args.command == 'show':
             show_command()
+        elif args.command == 'ingest':
+            ingest_command(args.name, args.jobs)
+        elif args.command == 'gc':
+            gc_command()
+        elif args.command == 'convert':
+            convert_command(args.archive, args.output, args.block_size * 1024)
     except KeyboardInterrupt:
         print("\n程序被用户中断")
     except Exception as e:
@@ -327,4 +1126,4 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    sys.exit(main())
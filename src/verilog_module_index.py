@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Verilog Module Index
+扫描Verilog源文件，记录每个文件声明和例化的模块，用于按顶层模块裁剪filelist
+
+索引按文件内容哈希缓存在磁盘上，内容未变化的文件不会重新解析。
+"""
+
+import os
+import re
+import mmap
+import json
+import hashlib
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+INDEX_CACHE = ".verilog_index.json"
+
+# 模块声明: module <name>
+MODULE_DECL_RE = re.compile(rb'^\s*(?:macro)?module\s+([A-Za-z_]\w*)', re.M)
+# 可能的模块例化: <type> #(...) 或 <type> <inst> (
+# 会匹配到一些非例化语句，结果再与已知模块名取交集
+MODULE_INST_RE = re.compile(rb'\b([A-Za-z_]\w*)\s*(?:#\s*\(|[A-Za-z_]\w*\s*\()')
+COMMENT_RE = re.compile(rb'//[^\n]*|/\*.*?\*/', re.S)
+
+
+def _map_file(path):
+    """以只读mmap打开文件，空文件返回b''"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b''
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def hash_file(path):
+    """计算文件内容的sha256"""
+    data = _map_file(path)
+    try:
+        return hashlib.sha256(data).hexdigest()
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+
+
+def scan_file(path):
+    """进程池任务: 解析单个文件声明和例化的模块名"""
+    data = _map_file(path)
+    try:
+        declares = sorted({m.decode() for m in MODULE_DECL_RE.findall(data)})
+        # 只在含有注释的文件上做一次去注释拷贝，避免注释里的文字被当作例化
+        text = COMMENT_RE.sub(b' ', data) if (b'//' in data or b'/*' in data) else data
+        candidates = {m.decode() for m in MODULE_INST_RE.findall(text)}
+    finally:
+        if isinstance(data, mmap.mmap):
+            data.close()
+    return {'declares': declares, 'instantiates': sorted(candidates - set(declares))}
+
+
+def load_cache(cache_path=INDEX_CACHE):
+    """读取磁盘上的索引缓存 {内容哈希: {declares, instantiates}}"""
+    if not os.path.exists(cache_path):
+        return {}
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, cache_path=INDEX_CACHE):
+    """原子地写入索引缓存"""
+    tmp_path = cache_path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, sort_keys=True)
+    os.replace(tmp_path, cache_path)
+
+
+def build_index(paths, cache_path=INDEX_CACHE, jobs=None):
+    """为一组文件建立模块索引，返回 {路径: {declares, instantiates}}
+
+    先用线程池计算内容哈希，缓存未命中的文件再交给进程池解析。
+    """
+    if jobs is None:
+        jobs = os.cpu_count() or 1
+    cache = load_cache(cache_path)
+
+    with ThreadPoolExecutor(max_workers=jobs) as pool:
+        digests = list(pool.map(hash_file, paths))
+
+    # 内容相同的文件只解析一次
+    misses = {}
+    for path, digest in zip(paths, digests):
+        if digest not in cache:
+            misses.setdefault(digest, path)
+    if misses:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for digest, entry in zip(misses, pool.map(scan_file, misses.values(), chunksize=16)):
+                cache[digest] = entry
+        save_cache(cache, cache_path)
+
+    print(f"模块索引: {len(paths)} 个文件, 缓存命中 {len(paths) - len(misses)} 个, "
+          f"重新解析 {len(misses)} 个")
+    return {path: cache[digest] for path, digest in zip(paths, digests)}
+
+
+def resolve_reachable(index, top, overrides=()):
+    """从顶层模块出发，按例化关系求出需要的文件集合
+
+    overrides中的文件声明的模块优先于index中其他文件的同名模块(模块级替换)。
+    顶层模块没有定义时返回None。
+    """
+    module_to_file = {}
+    for path, entry in index.items():
+        if path in overrides:
+            continue
+        for module in entry['declares']:
+            module_to_file.setdefault(module, path)
+    for path in overrides:
+        for module in index[path]['declares']:
+            module_to_file[module] = path
+
+    if top not in module_to_file:
+        return None
+
+    needed_files = set()
+    visited = {top}
+    stack = [top]
+    while stack:
+        path = module_to_file[stack.pop()]
+        needed_files.add(path)
+        for child in index[path]['instantiates']:
+            if child in module_to_file and child not in visited:
+                visited.add(child)
+                stack.append(child)
+    return needed_files
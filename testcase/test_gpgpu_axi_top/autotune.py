@@ -0,0 +1,500 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+kernel启动配置自动调优
+在硬件约束(每个SM的warp数、每个warp的线程数、寄存器数)下改写.metadata的 wf_size/wg_size/kernel_size_x
+以及.data中kernel元数据块的local size，生成覆盖相同global size的候选配置，逐个仿真并读取
+"Single kernel need : N cycles"，输出周期数与每个CTA占用warp数的Pareto最优配置。
+
+候选配置的要求:
+  wf_size(每个warp的线程数)为2的幂且不超过硬件线程数，wg_size(每个CTA的warp数)不超过硬件warp数，
+  wg_size*vgprUsage/sgprUsage 不超过硬件寄存器数，local size 整除 global size(只改变x维)，
+  私有内存 pdsSize*线程总数 不超过 pdsBaseAddr 处buffer的分配大小。
+硬件约束默认从硬件代码目录名(如 gen_fpga_verilog_1c8w16t_halfreg → 8 warp, 16 线程, 每warp 128个寄存器)
+或 src/define/define.v 中读取，可以用 --warps/--threads 覆盖。
+
+每个候选在用例目录同一层的 .tune.<用例>.<配置> 中运行: 被改写的.metadata/.data为实际文件，
+其它文件链接到用例目录(需要先编译好simv)。结果按 硬件代码哈希 + 候选文件内容 + 仿真命令 缓存，
+换了硬件版本或改变了约束后重新调优时，只有新出现的候选需要重新仿真。
+
+tc.v传给exe_finish的CTA数是写死的，候选改变kernel_size后仿真命令会追加 +CTA_FROM_META，
+让host_inter.sv按metadata的 kernel_size_x*y*z 启动CTA；日志中 "Kernel CTAs" 记录的启动数
+与候选不一致时该候选判为失败。有 ref_model.py 参考模型的kernel，每个候选被调优kernel期间的
+lsu.w 写入要覆盖并匹配参考模型的输出(--ulp 放宽浮点比较)，否则周期数不被采用。
+
+用法:
+  python autotune.py tc_vecadd softdata/8w4t/vecadd_0.metadata --list        # 只列出候选
+  python autotune.py tc_vecadd softdata/8w4t/vecadd_0.metadata -j 4
+  python autotune.py tc_gaussian softdata/4x8/Fan2_0.metadata --kernel 1 --hw ../../src/gen_fpga_verilog_1sm8w32t
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import shutil
+import hashlib
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import numpy as np
+
+from metadata2md import Metadata, HEADER_FIELDS
+from mem_image import read_hex_words, word_count, kernel_files
+from ref_model import DeviceMemory, Launch, KERNELS, kernel_name, launch_order, run_sequence
+from cta_shard import parse_shard_log, write_bytes, merge_image
+from check_result import compare
+import bench_db
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+TUNE_PREFIX = ".tune."
+GENERATED_RE = re.compile(r'^(csrc|verdiLog|ucli.*|DVEfiles|AN\.DB|novas.*|.*\.fsdb|.*\.log|.*\.key|tune\.out)$')
+DEFAULT_SIM_CMD = "./simv -l simv.log"
+# 让exe_finish按metadata的kernel_size启动CTA，而不是tc.v中写死的数量
+CTA_PLUSARG = "+CTA_FROM_META"
+LAUNCHED_RE = re.compile(rb"Kernel CTAs: (\d+) launched, metadata (\d+)")
+DEFAULT_CACHE = os.path.expanduser("~/.cache/ventus_bench/autotune.json")
+DEFINE_FILE = os.path.join(SCRIPT_DIR, "..", "..", "src", "define", "define.v")
+HW_NAME_RE = re.compile(r'(\d+)(?:sm|c)(\d+)w(\d+)t', re.I)
+DEFINE_RE = re.compile(r'^\s*`define\s+(NUM_WARP|NUM_THREAD)\s+(?:\d+\'d)?(\d+)', re.M)
+REGS_PER_WARP = 256          # define.v: NUM_VGPR = NUM_SGPR = 256*NUM_WARP，halfreg版本减半
+# 需要改写的字在.metadata和kernel元数据块中的位置
+META_WORD = {name: 2 * i for i, name in enumerate(HEADER_FIELDS)}
+GLOBAL_SIZE_WORD = 3
+LOCAL_SIZE_WORD = 6
+
+
+# ──────────────────────────────
+# 硬件约束
+# ──────────────────────────────
+def hw_limits(hw_dir):
+    """硬件代码目录 → {'warps', 'threads', 'regs', 'source'}，目录名中没有配置时读取define.v"""
+    name = os.path.basename(os.path.realpath(hw_dir))
+    regs = REGS_PER_WARP // 2 if "halfreg" in name else REGS_PER_WARP
+    m = HW_NAME_RE.search(name)
+    if m:
+        return {'warps': int(m.group(2)), 'threads': int(m.group(3)), 'regs': regs, 'source': name}
+    with open(DEFINE_FILE, 'r') as f:
+        defines = dict(DEFINE_RE.findall(f.read()))
+    if "NUM_WARP" not in defines or "NUM_THREAD" not in defines:
+        raise ValueError(f"无法从 {name} 或 {DEFINE_FILE} 确定warp数和线程数，请用 --warps/--threads 指定")
+    return {'warps': int(defines["NUM_WARP"]), 'threads': int(defines["NUM_THREAD"]), 'regs': regs,
+            'source': os.path.relpath(DEFINE_FILE, SCRIPT_DIR)}
+
+
+# ──────────────────────────────
+# 候选配置
+# ──────────────────────────────
+def block_offset(meta, base):
+    """基址为base的buffer在.data中的起始字序号"""
+    offset = 0
+    for buffer_base, size, _ in meta.buffers:
+        if buffer_base == base:
+            return offset
+        offset += word_count(size)
+    raise ValueError(f"找不到buffer 0x{base:x}")
+
+
+def launch_shape(meta, data):
+    """kernel元数据块中的 (global size, local size)，各为3维"""
+    offset = block_offset(meta, meta.metaDataBaseAddr)
+    block = [int(w) for w in data[offset:offset + LOCAL_SIZE_WORD + 3]]
+    if len(block) < LOCAL_SIZE_WORD + 3:
+        raise ValueError("kernel元数据块不足9个字")
+    return block[GLOBAL_SIZE_WORD:GLOBAL_SIZE_WORD + 3], block[LOCAL_SIZE_WORD:LOCAL_SIZE_WORD + 3]
+
+
+def private_allocsize(meta):
+    for base, _, allocsize in meta.buffers:
+        if base == meta.pdsBaseAddr:
+            return allocsize
+    return None
+
+
+def enumerate_candidates(meta, data, limits, exact_threads=False):
+    """列出满足约束的 (wf_size, wg_size) 候选，返回 (候选列表, 被排除的 [(配置, 原因)])
+    exact_threads 时 wf_size 只取硬件线程数(tc.v 中 NUM_THREAD 需要与 wf_size 一致的用例)"""
+    global_size, local_size = launch_shape(meta, data)
+    rest = local_size[1] * local_size[2]
+    threads_total = global_size[0] * global_size[1] * global_size[2]
+    private = private_allocsize(meta)
+    candidates, rejected = [], []
+    wf = limits['threads'] if exact_threads else 1
+    while wf <= limits['threads']:
+        for wg in range(1, limits['warps'] + 1):
+            label = f"{wg}w{wf}t"
+            per_cta = wf * wg
+            if per_cta % rest or global_size[0] % (per_cta // rest):
+                rejected.append((label, f"local size {per_cta} 不整除 global size {global_size}"))
+                continue
+            if wg * meta.vgprUsage > limits['regs'] * limits['warps'] or \
+                    wg * meta.sgprUsage > limits['regs'] * limits['warps']:
+                rejected.append((label, "寄存器不足"))
+                continue
+            if meta.pdsSize and private is not None and meta.pdsSize * threads_total > private:
+                rejected.append((label, "私有内存不足"))
+                continue
+            local_x = per_cta // rest
+            candidates.append({
+                'config': label, 'wf_size': wf, 'wg_size': wg,
+                'kernel_size': [global_size[0] // local_x, meta.kernel_size_y, meta.kernel_size_z],
+                'local_size': [local_x, local_size[1], local_size[2]],
+                'original': wf == meta.wf_size and wg == meta.wg_size,
+            })
+        wf *= 2
+    return candidates, rejected
+
+
+def set_uint64(words, index, value):
+    words[index] = value & 0xFFFFFFFF
+    words[index + 1] = value >> 32
+
+
+def rewrite(meta, data, candidate):
+    """生成候选的 (.metadata文本, .data文本)"""
+    words = list(meta.words)
+    set_uint64(words, META_WORD["wf_size"], candidate['wf_size'])
+    set_uint64(words, META_WORD["wg_size"], candidate['wg_size'])
+    for axis, size in zip("xyz", candidate['kernel_size']):
+        set_uint64(words, META_WORD[f"kernel_size_{axis}"], size)
+    new_data = [int(w) for w in data]
+    offset = block_offset(meta, meta.metaDataBaseAddr) + LOCAL_SIZE_WORD
+    new_data[offset:offset + 3] = candidate['local_size']
+    return ("".join(f"{w:08x}\n" for w in words), "".join(f"{w:08x}\n" for w in new_data))
+
+
+def candidate_key(hw_hash, sim_cmd, kernel, files):
+    h = hashlib.sha256(f"{hw_hash}\n{sim_cmd}\n{kernel}\n".encode())
+    for text in files:
+        h.update(text.encode())
+    return h.hexdigest()[:20]
+
+
+# ──────────────────────────────
+# 运行
+# ──────────────────────────────
+def overlay(src_dir, workdir, files):
+    """在workdir中链接src_dir的内容，files中的相对路径({路径: 文本})写成实际文件"""
+    os.makedirs(workdir)
+    heads = {}
+    for rel, text in files.items():
+        head, _, tail = rel.partition(os.sep)
+        heads.setdefault(head, {})
+        if tail:
+            heads[head][tail] = text
+        else:
+            heads[head] = text
+    for name in os.listdir(src_dir):
+        if name not in heads and not GENERATED_RE.match(name):
+            os.symlink(os.path.join(os.path.abspath(src_dir), name), os.path.join(workdir, name))
+    for name, content in heads.items():
+        if isinstance(content, dict):
+            overlay(os.path.join(src_dir, name), os.path.join(workdir, name), content)
+        else:
+            with open(os.path.join(workdir, name), 'w') as f:
+                f.write(content)
+
+
+def prepare_candidate_dir(testcase, candidate, files):
+    workdir = os.path.join(SCRIPT_DIR, f"{TUNE_PREFIX}{testcase}.{candidate['config']}")
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    overlay(os.path.join(SCRIPT_DIR, testcase), workdir, files)
+    return workdir
+
+
+def reference_output(testcase_dir, meta_rel):
+    """用ref_model.py计算被调优kernel的期望输出
+
+    同一目录中排在它前面的kernel先在同一份设备内存上执行。local size不影响这些kernel的结果，
+    所以所有候选共用一份期望输出。返回 (期望输出SpikeDump, kernel执行前的设备内存)，没有参考模型时返回None。
+    """
+    meta_path = os.path.normpath(os.path.join(testcase_dir, meta_rel))
+    name = kernel_name(meta_path)[0]
+    if name not in KERNELS:
+        return None
+    pairs = launch_order(kernel_files([os.path.dirname(meta_path)]))
+    index = [os.path.normpath(m) for m, _ in pairs].index(meta_path)
+    mem = run_sequence(pairs[:index], per_kernel=False)[0] if index else DeviceMemory()
+    launch = Launch(*pairs[index])
+    mem.load(launch.buffers, launch.segments)
+    before = DeviceMemory()
+    before.buffers = {base: data.copy() for base, data in mem.buffers.items()}
+    bases = sorted({mem.find(ptr)[0] for ptr in KERNELS[name](mem, launch)})
+    return mem.dump(bases), before
+
+
+def check_output(log_path, kernel, reference, ulp=0):
+    """候选在第kernel个kernel期间的写入与参考输出比较，返回错误信息，一致时返回None"""
+    golden, before = reference
+    writes = parse_shard_log(log_path, kernel)[0]
+    addrs, expected = golden.items()
+    if not len(writes[0]):
+        return f"结果与参考模型不一致: 日志中没有写入，{len(addrs)} 个字中缺少 {len(addrs)} 个"
+    written = merge_image([{'index': 0, 'bytes': write_bytes(writes)}], before)
+    actual, found = written.lookup(addrs)
+    ok = compare(expected, actual, "float", ulp)[0] & found
+    if ok.all():
+        return None
+    first = int(addrs[np.flatnonzero(~ok)[0]])
+    return (f"结果与参考模型不一致: {len(addrs)} 个字中缺少 {int((~found).sum())} 个, "
+            f"错误 {int((found & ~ok).sum())} 个, 第一个 0x{first:08x}")
+
+
+def launched_ctas(log_path, kernel):
+    """日志中第kernel个exe_finish实际启动的CTA数，没有记录时返回None"""
+    with open(log_path, 'rb') as f:
+        launched = LAUNCHED_RE.findall(f.read())
+    return int(launched[kernel][0]) if kernel < len(launched) else None
+
+
+def run_candidate(workdir, sim_cmd, kernel, timeout=None):
+    """运行一个候选，返回 (返回码, 周期数, 日志路径, 用时)"""
+    out_path = os.path.join(workdir, "tune.out")
+    start_time = time.time()
+    with open(out_path, 'w') as f:
+        f.write(f"$ {sim_cmd}\n")
+        f.flush()
+        try:
+            ret = subprocess.run(shlex.split(sim_cmd), cwd=workdir, stdout=f, stderr=subprocess.STDOUT,
+                                 timeout=timeout).returncode
+        except subprocess.TimeoutExpired:
+            ret = -1
+            f.write(f"\n超时: {timeout} s\n")
+    sim_log = os.path.join(workdir, "simv.log")
+    log_path = sim_log if os.path.exists(sim_log) else out_path
+    kernels = bench_db.parse_log(log_path)[0]
+    cycles = kernels[kernel][2] if kernel < len(kernels) else None
+    return ret, cycles, log_path, time.time() - start_time
+
+
+def load_cache(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_cache(cache, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(cache, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+# ──────────────────────────────
+# 报告
+# ──────────────────────────────
+def pareto(candidates):
+    """周期数和每个CTA的warp数都不被其它候选同时超过(且至少一项严格更好)的候选"""
+    done = [c for c in candidates if c.get('cycles') is not None]
+    front = []
+    for c in done:
+        if not any(o['cycles'] <= c['cycles'] and o['wg_size'] <= c['wg_size'] and
+                   (o['cycles'] < c['cycles'] or o['wg_size'] < c['wg_size']) for o in done):
+            front.append(c)
+    return sorted(front, key=lambda c: (c['cycles'], c['wg_size']))
+
+
+def print_table(candidates, front):
+    names = {c['config'] for c in front}
+    print(f"{'配置':<10}{'wf':>5}{'wg':>5}{'CTA数':>10}{'周期数':>12}  备注")
+    for c in sorted(candidates, key=lambda c: (c.get('cycles') is None, c.get('cycles') or 0, c['config'])):
+        ctas = c['kernel_size'][0] * c['kernel_size'][1] * c['kernel_size'][2]
+        notes = [n for n, flag in (("Pareto", c['config'] in names), ("原始", c['original']),
+                                   ("缓存", c.get('cached')),
+                                   ("未校验", c.get('cycles') is not None and not c.get('checked'))) if flag]
+        if c.get('message'):
+            notes.append(c['message'])
+        cycles = c.get('cycles')
+        print(f"{c['config']:<10}{c['wf_size']:>5}{c['wg_size']:>5}{ctas:>10}"
+              f"{cycles if cycles is not None else '-':>12}  {', '.join(notes)}")
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="在硬件约束下枚举kernel的wf_size/wg_size/kernel_size，仿真并找出周期数最优的启动配置",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python autotune.py tc_vecadd softdata/8w4t/vecadd_0.metadata --list
+  python autotune.py tc_vecadd softdata/8w4t/vecadd_0.metadata -j 4
+  python autotune.py tc_vecadd softdata/8w4t/vecadd_0.metadata --warps 8 --threads 16 --bench-db ~/.cache/ventus_bench/bench.db
+  python autotune.py tc_vecadd softdata/8w4t/vecadd_0.metadata --sim-cmd "python3 /tmp/stub_simv.py"
+  python autotune.py --clean
+用例目录中需要先编译好与硬件代码一致的simv (例如 make run-8w4t 或 simv_cache.py)。
+        """
+    )
+    parser.add_argument('testcase', nargs='?', help='用例目录名(与本脚本同一层，如 tc_vecadd)')
+    parser.add_argument('metadata', nargs='?', help='被调优kernel的.metadata(相对用例目录，需要与tc.v中的路径一致)')
+    parser.add_argument('--kernel', type=int, default=0, help='被调优的是tc.v中第几次exe_finish(从0开始，默认0)')
+    parser.add_argument('--hw', default=bench_db.DEFAULT_HW, help='硬件代码目录(默认 src/gen_fpga_verilog)')
+    parser.add_argument('--warps', type=int, help='每个SM的warp数(默认从硬件代码目录名或define.v读取)')
+    parser.add_argument('--threads', type=int, help='每个warp的线程数(默认同上)')
+    parser.add_argument('--regs', type=int, help='每个warp的寄存器数(默认256，halfreg为128)')
+    parser.add_argument('--exact-threads', action='store_true', help='wf_size只取硬件线程数，只调整wg_size和CTA数')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='同时运行的simv数，默认CPU核数')
+    parser.add_argument('--sim-cmd', default=DEFAULT_SIM_CMD, help=f'在候选目录中运行的命令(默认 "{DEFAULT_SIM_CMD}")')
+    parser.add_argument('--timeout', type=float, help='每个候选的超时时间(秒)')
+    parser.add_argument('--ulp', type=int, default=0, help='与参考模型比较时允许的最大ULP距离(默认0)')
+    parser.add_argument('--no-check', action='store_true', help='不与ref_model.py的参考输出比较')
+    parser.add_argument('--cache', default=DEFAULT_CACHE, help=f'结果缓存(默认 {DEFAULT_CACHE})')
+    parser.add_argument('--force', action='store_true', help='忽略缓存，全部重新仿真')
+    parser.add_argument('--bench-db', help='把每个候选的仿真结果记录到 bench_db.py 的数据库')
+    parser.add_argument('--list', action='store_true', help='只列出候选和被排除的配置')
+    parser.add_argument('--keep', action='store_true', help='保留候选目录(默认成功后删除)')
+    parser.add_argument('--report', help='JSON报告，默认 <用例>/autotune.json')
+    parser.add_argument('--clean', action='store_true', help='删除所有候选目录后退出')
+
+    args = parser.parse_args()
+    if args.clean:
+        for name in os.listdir(SCRIPT_DIR):
+            if name.startswith(TUNE_PREFIX):
+                shutil.rmtree(os.path.join(SCRIPT_DIR, name))
+                print(f"已删除: {name}")
+        return 0
+    if not args.testcase or not args.metadata:
+        parser.error("需要用例目录和.metadata")
+
+    testcase_dir = os.path.join(SCRIPT_DIR, args.testcase)
+    meta_rel = os.path.normpath(args.metadata)
+    data_rel = meta_rel[:-len(".metadata")] + ".data"
+    try:
+        meta = Metadata.from_file(os.path.join(testcase_dir, meta_rel))
+        data = read_hex_words(os.path.join(testcase_dir, data_rel))
+        limits = {} if args.warps and args.threads else hw_limits(args.hw)
+        for name in ("warps", "threads", "regs"):
+            if getattr(args, name):
+                limits[name] = getattr(args, name)
+        limits.setdefault('regs', REGS_PER_WARP)
+        limits.setdefault('source', "命令行")
+        candidates, rejected = enumerate_candidates(meta, data, limits, args.exact_threads)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+
+    global_size, local_size = launch_shape(meta, data)
+    print(f"{args.testcase}/{meta_rel}: global {global_size}, local {local_size}, "
+          f"原始配置 {meta.wg_size}w{meta.wf_size}t x {meta.kernel_size_x}x{meta.kernel_size_y}x{meta.kernel_size_z}")
+    print(f"硬件约束({limits['source']}): {limits['warps']} warp, {limits['threads']} 线程, "
+          f"每warp {limits['regs']} 个寄存器; {len(candidates)} 个候选, 排除 {len(rejected)} 个")
+    if args.list:
+        for c in candidates:
+            print(f"  {c['config']:<8} kernel_size {c['kernel_size']}, local {c['local_size']}"
+                  + (" (原始)" if c['original'] else ""))
+        for label, reason in rejected:
+            print(f"  {label:<8} 排除: {reason}")
+        return 0
+    if not candidates:
+        print("错误: 没有满足约束的候选")
+        return 2
+    if args.sim_cmd == DEFAULT_SIM_CMD and not os.path.exists(os.path.join(testcase_dir, "simv")):
+        print(f"警告: {testcase_dir} 中没有simv，请先编译对应配置")
+
+    reference = None
+    if not args.no_check:
+        try:
+            reference = reference_output(testcase_dir, meta_rel)
+        except (OSError, ValueError) as e:
+            print(f"错误: 参考模型执行失败: {e}")
+            return 2
+        if reference is None:
+            print(f"警告: {kernel_name(meta_rel)[0]} 没有参考模型，候选结果不做校验")
+        else:
+            print(f"参考输出: {reference[0].word_count} 个字，每个候选的结果必须全部一致")
+
+    sim_cmd = f"{args.sim_cmd} {CTA_PLUSARG}"
+    hw = bench_db.hw_tree_hash(args.hw)
+    cache = load_cache(args.cache)
+    pending = []
+    for c in candidates:
+        files = dict(zip((meta_rel, data_rel), rewrite(meta, data, c)))
+        c['key'] = candidate_key(hw[1], sim_cmd, args.kernel, files.values())
+        hit = None if args.force else cache.get(c['key'])
+        # 没校验过的缓存结果在有参考模型时不能直接采用
+        if hit and (reference is None or hit.get('checked')):
+            c.update(cycles=hit['cycles'], cached=True, checked=hit.get('checked', False))
+        else:
+            pending.append((c, files))
+    print(f"硬件 {hw[0]} ({hw[1]}): 缓存命中 {len(candidates) - len(pending)} 个, 需要仿真 {len(pending)} 个, "
+          f"并发 {max(1, args.jobs)}")
+
+    def work(item):
+        c, files = item
+        workdir = prepare_candidate_dir(args.testcase, c, files)
+        ret, cycles, log_path, elapsed = run_candidate(workdir, sim_cmd, args.kernel, args.timeout)
+        c.update(returncode=ret, cycles=cycles, seconds=round(elapsed, 2), workdir=workdir, log=log_path,
+                 checked=False)
+        ctas = c['kernel_size'][0] * c['kernel_size'][1] * c['kernel_size'][2]
+        launched = launched_ctas(log_path, args.kernel) if ret == 0 else None
+        if ret != 0:
+            c['message'] = f"返回码 {ret}"
+        elif cycles is None:
+            c['message'] = f"日志中没有第 {args.kernel} 个kernel的周期数"
+        elif launched is None:
+            c['message'] = "日志中没有启动的CTA数(simv需要包含支持 +CTA_FROM_META 的host_inter.sv)"
+        elif launched != ctas:
+            c['message'] = f"启动了 {launched} 个CTA，候选需要 {ctas} 个"
+        elif reference is not None:
+            c['message'] = check_output(log_path, args.kernel, reference, args.ulp)
+            if c['message'] is None:
+                del c['message']
+                c['checked'] = True
+        if 'message' in c:
+            c['cycles'] = None
+        return c
+
+    start_time = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            for future in as_completed([pool.submit(work, item) for item in pending]):
+                c = future.result()
+                status = "失败" if 'message' in c else "完成"
+                print(f"[{status}] {c['config']}: {c['cycles']} 周期, {c['seconds']:.1f} s"
+                      + (f" ({c['message']})" if 'message' in c else ""), flush=True)
+                if 'message' in c:
+                    continue
+                cache[c['key']] = {'cycles': c['cycles'], 'testcase': args.testcase, 'metadata': meta_rel,
+                                   'config': c['config'], 'hw': hw[0], 'hw_hash': hw[1],
+                                   'checked': c['checked'], 'recorded': time.time()}
+                save_cache(cache, args.cache)
+                if args.bench_db:
+                    bench_db.record(args.bench_db, c['log'], testcase=args.testcase, config=c['config'], hw=hw)
+                if not args.keep:
+                    shutil.rmtree(c['workdir'])
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+    wall_time = time.time() - start_time
+
+    front = pareto(candidates)
+    failed = [c for c in candidates if 'message' in c]
+    report = {
+        'testcase': args.testcase, 'metadata': meta_rel, 'kernel': args.kernel,
+        'hw': hw[0], 'hw_hash': hw[1], 'limits': limits, 'wall_time': round(wall_time, 2),
+        'checked': reference is not None, 'sim_cmd': sim_cmd,
+        'best': front[0]['config'] if front else None,
+        'pareto': [c['config'] for c in front],
+        'candidates': candidates,
+        'rejected': [{'config': label, 'reason': reason} for label, reason in rejected],
+    }
+    report_path = args.report or os.path.join(testcase_dir, "autotune.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\n" + "=" * 60)
+    print_table(candidates, front)
+    print(f"\nPareto最优(周期数/每个CTA的warp数): {', '.join(report['pareto']) or '-'}")
+    print(f"总用时 {wall_time:.1f} s, 仿真 {len(pending)} 个, 失败 {len(failed)} 个, 报告: {report_path}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
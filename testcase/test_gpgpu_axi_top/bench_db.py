@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+仿真周期数的历史数据库
+每次仿真后从simv.log中提取 "Config finish!  time"、"exe finish!     time" 和 "Single kernel need : N cycles"，
+连同测试用例、配置、硬件代码(gen_fpga_verilog)的哈希和随机种子一起写入本地SQLite数据库，
+可以比较两次硬件版本之间的周期数是否显著变差，并按 用例/配置/内核 输出趋势表。
+
+用法:
+  python bench_db.py record tc_vecadd/simv.log -c 8w4t
+  python bench_db.py compare                       # 每个用例/配置最近两个硬件版本
+  python bench_db.py trend -t mnist
+  python regression.py --bench-db ~/.cache/ventus_bench/bench.db   # 回归测试通过的任务自动记录
+"""
+
+import os
+import re
+import sys
+import math
+import time
+import sqlite3
+import hashlib
+import argparse
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_DB = os.path.expanduser("~/.cache/ventus_bench/bench.db")
+DEFAULT_HW = os.path.join(SCRIPT_DIR, "..", "..", "src", "gen_fpga_verilog")
+HW_SUFFIXES = (".v", ".sv", ".vh", ".svh")
+SCRATCH_PREFIX = ".regress."
+CONFIG_RE = re.compile(rb"Config finish!\s+time:\s*(\d+(?:\.\d+)?)")
+EXE_RE = re.compile(rb"exe finish!\s+time:\s*(\d+(?:\.\d+)?)")
+CYCLES_RE = re.compile(rb"Single kernel need\s*:\s*(\d+)\s*cycles")
+# +ntb_random_seed_automatic 时VCS打印实际使用的种子
+SEED_RE = re.compile(rb"(?:automatic random seed used|ntb_random_seed)\s*[:=]\s*(\d+)", re.I)
+CASE_RE = re.compile(rb"CASE_(\d+W\d+T)\b", re.I)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY, recorded REAL, testcase TEXT, config TEXT,
+    hw TEXT, hw_hash TEXT, seed INTEGER, log TEXT);
+CREATE INDEX IF NOT EXISTS runs_case ON runs (testcase, config, hw_hash);
+CREATE TABLE IF NOT EXISTS kernels (
+    run INTEGER REFERENCES runs (id) ON DELETE CASCADE, kernel INTEGER,
+    config_ns REAL, exe_ns REAL, cycles INTEGER, PRIMARY KEY (run, kernel));
+"""
+
+
+# ──────────────────────────────
+# 记录
+# ──────────────────────────────
+def parse_log(path):
+    """simv.log → ([(config_ns, exe_ns, cycles)], 种子, 配置)，每个内核一项"""
+    with open(path, 'rb') as f:
+        text = f.read()
+    config = [float(t) for t in CONFIG_RE.findall(text)]
+    exe = [float(t) for t in EXE_RE.findall(text)]
+    cycles = [int(c) for c in CYCLES_RE.findall(text)]
+    kernels = []
+    for i, n in enumerate(cycles):
+        kernels.append((config[i] if i < len(config) else None, exe[i] if i < len(exe) else None, n))
+    seed = SEED_RE.search(text)
+    case = CASE_RE.search(text)
+    return kernels, (int(seed.group(1)) if seed else None), (case.group(1).decode().lower() if case else None)
+
+
+def hw_tree_hash(hw_dir):
+    """硬件代码目录的内容哈希: 按相对路径排序后哈希每个Verilog文件的路径和内容"""
+    root = os.path.realpath(hw_dir)
+    h = hashlib.sha256()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if not name.endswith(HW_SUFFIXES):
+                continue
+            path = os.path.join(dirpath, name)
+            with open(path, 'rb') as f:
+                data = f.read()
+            h.update(f"{os.path.relpath(path, root)}:{len(data)}\n".encode())
+            h.update(data)
+    return os.path.basename(root), h.hexdigest()[:16]
+
+
+def testcase_of(log_path):
+    """simv.log所在目录 → 用例名(regression.py的临时目录 .regress.<用例>.<目标> 取用例名)"""
+    name = os.path.basename(os.path.dirname(os.path.abspath(log_path)))
+    if name.startswith(SCRATCH_PREFIX):
+        name = name[len(SCRATCH_PREFIX):].split(".")[0]
+    return name
+
+
+def connect(db_path):
+    os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+    db = sqlite3.connect(db_path)
+    db.execute("PRAGMA foreign_keys=ON")
+    db.executescript(SCHEMA)
+    return db
+
+
+def record(db_path, log_path, testcase=None, config=None, hw_dir=DEFAULT_HW, seed=None, hw=None):
+    """把一次仿真的结果写入数据库，返回 (run id, 内核数)；hw 为已计算好的 (名字, 哈希)"""
+    kernels, log_seed, log_config = parse_log(log_path)
+    if not kernels:
+        raise ValueError(f"{log_path} 中没有 'Single kernel need : N cycles'")
+    config = config or log_config
+    if not config:
+        raise ValueError(f"{log_path}: 无法确定配置，请用 -c 指定(如 8w4t)")
+    hw_name, hw_hash = hw or hw_tree_hash(hw_dir)
+    db = connect(db_path)
+    with db:
+        cur = db.execute("INSERT INTO runs (recorded, testcase, config, hw, hw_hash, seed, log) "
+                         "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                         (time.time(), testcase or testcase_of(log_path), config, hw_name, hw_hash,
+                          seed if seed is not None else log_seed, os.path.abspath(log_path)))
+        run_id = cur.lastrowid
+        db.executemany("INSERT INTO kernels VALUES (?, ?, ?, ?, ?)",
+                       [(run_id, i, c, e, n) for i, (c, e, n) in enumerate(kernels)])
+    db.close()
+    return run_id, len(kernels)
+
+
+# ──────────────────────────────
+# 统计
+# ──────────────────────────────
+def betacf(a, b, x):
+    """不完全Beta函数的连分式(Lentz方法)"""
+    tiny = 1e-300
+    c, d = 1.0, 1.0 - (a + b) * x / (a + 1.0)
+    d = 1.0 / (d if abs(d) > tiny else tiny)
+    result = d
+    for m in range(1, 300):
+        m2 = 2 * m
+        for num in (m * (b - m) * x / ((a + m2 - 1) * (a + m2)),
+                    -(a + m) * (a + b + m) * x / ((a + m2) * (a + m2 + 1))):
+            d = 1.0 + num * d
+            d = 1.0 / (d if abs(d) > tiny else tiny)
+            c = 1.0 + num / c
+            c = c if abs(c) > tiny else tiny
+            result *= c * d
+        if abs(c * d - 1.0) < 1e-12:
+            break
+    return result
+
+
+def betai(a, b, x):
+    """正则化不完全Beta函数 I_x(a, b)"""
+    if x <= 0.0:
+        return 0.0
+    if x >= 1.0:
+        return 1.0
+    front = math.exp(math.lgamma(a + b) - math.lgamma(a) - math.lgamma(b) + a * math.log(x) + b * math.log(1.0 - x))
+    if x < (a + 1.0) / (a + b + 2.0):
+        return front * betacf(a, b, x) / a
+    return 1.0 - front * betacf(b, a, 1.0 - x) / b
+
+
+def mean_var(values):
+    n = len(values)
+    mean = sum(values) / n
+    var = sum((v - mean) ** 2 for v in values) / (n - 1) if n > 1 else 0.0
+    return mean, var
+
+
+def welch_slower(base, new):
+    """Welch t检验，新版本周期数更多的单侧p值；样本不足时返回None"""
+    if len(base) < 2 or len(new) < 2:
+        return None
+    m1, v1 = mean_var(base)
+    m2, v2 = mean_var(new)
+    se2 = v1 / len(base) + v2 / len(new)
+    if se2 == 0:
+        # 仿真是确定的(方差为0)，均值不同即为显著
+        return 0.0 if m2 > m1 else 1.0
+    t = (m2 - m1) / math.sqrt(se2)
+    df = se2 ** 2 / ((v1 / len(base)) ** 2 / (len(base) - 1) + (v2 / len(new)) ** 2 / (len(new) - 1))
+    tail = 0.5 * betai(df / 2.0, 0.5, df / (df + t * t))
+    return tail if t > 0 else 1.0 - tail
+
+
+def samples(db, testcase=None, config=None):
+    """{(用例, 配置, 内核): {硬件哈希: [周期数]}} 和 硬件版本按首次出现排序的列表"""
+    sql = ("SELECT r.testcase, r.config, k.kernel, r.hw_hash, r.hw, k.cycles, r.recorded "
+           "FROM runs r JOIN kernels k ON k.run = r.id")
+    where, params = [], []
+    if testcase:
+        where.append("r.testcase = ?")
+        params.append(testcase)
+    if config:
+        where.append("r.config = ?")
+        params.append(config)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    groups, first_seen, names = {}, {}, {}
+    for tc, cfg, kernel, hw_hash, hw, cycles, recorded in db.execute(sql + " ORDER BY r.recorded", params):
+        groups.setdefault((tc, cfg, kernel), {}).setdefault(hw_hash, []).append(cycles)
+        first_seen.setdefault(hw_hash, recorded)
+        names[hw_hash] = hw
+    drops = sorted(first_seen, key=first_seen.get)
+    return groups, drops, names
+
+
+def resolve_hw(drops, prefix):
+    """哈希前缀 → 完整哈希"""
+    if not prefix:
+        return None
+    matches = [h for h in drops if h.startswith(prefix)]
+    if len(matches) != 1:
+        raise ValueError(f"硬件哈希 {prefix} " + ("不存在" if not matches else "不唯一"))
+    return matches[0]
+
+
+def compare(db, base=None, new=None, testcase=None, config=None, threshold=0.01, alpha=0.05):
+    """比较两个硬件版本，返回每个 用例/配置/内核 的结果行"""
+    groups, drops, _ = samples(db, testcase, config)
+    base, new = resolve_hw(drops, base), resolve_hw(drops, new)
+    rows = []
+    for key, by_hw in sorted(groups.items()):
+        present = [h for h in drops if h in by_hw]
+        new_hw = new or (present[-1] if present else None)
+        base_hw = base or (present[-2] if len(present) > 1 else None)
+        if new_hw not in by_hw or base_hw not in by_hw or base_hw == new_hw:
+            continue
+        b, n = by_hw[base_hw], by_hw[new_hw]
+        mb, mn = sum(b) / len(b), sum(n) / len(n)
+        delta = (mn - mb) / mb if mb else 0.0
+        p = welch_slower(b, n)
+        # 样本不足时只看变化幅度
+        significant = p is None or p < alpha
+        rows.append({"testcase": key[0], "config": key[1], "kernel": key[2], "base": base_hw, "new": new_hw,
+                     "n_base": len(b), "n_new": len(n), "base_cycles": mb, "new_cycles": mn, "delta": delta,
+                     "p": p, "regression": delta > threshold and significant,
+                     "improvement": delta < -threshold and (p is None or p > 1 - alpha)})
+    return rows
+
+
+# ──────────────────────────────
+# 命令行
+# ──────────────────────────────
+def print_rows(header, rows):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) if rows else len(str(h))
+              for i, h in enumerate(header)]
+    print("  ".join(str(h).ljust(w) for h, w in zip(header, widths)))
+    for r in rows:
+        print("  ".join(str(v).ljust(w) for v, w in zip(r, widths)))
+
+
+def write_csv(path, header, rows):
+    with open(path, 'w') as f:
+        f.write(",".join(header) + "\n")
+        for r in rows:
+            f.write(",".join(str(v) for v in r) + "\n")
+
+
+def cmd_record(args):
+    for log_path in args.logs:
+        run_id, kernels = record(args.db, log_path, args.testcase, args.config, args.hw, args.seed)
+        print(f"{log_path}: 记录 #{run_id}, {kernels} 个内核")
+    return 0
+
+
+def cmd_runs(args):
+    db = connect(args.db)
+    sql = ("SELECT r.id, r.recorded, r.testcase, r.config, r.hw, r.hw_hash, r.seed, "
+           "GROUP_CONCAT(k.cycles, '/') FROM runs r LEFT JOIN kernels k ON k.run = r.id")
+    where, params = [], []
+    if args.testcase:
+        where.append("r.testcase = ?")
+        params.append(args.testcase)
+    if args.config:
+        where.append("r.config = ?")
+        params.append(args.config)
+    if where:
+        sql += " WHERE " + " AND ".join(where)
+    sql += " GROUP BY r.id ORDER BY r.recorded DESC LIMIT ?"
+    rows = [(i, time.strftime("%Y-%m-%d %H:%M", time.localtime(t)), tc, cfg, hw, h, "" if s is None else s, c)
+            for i, t, tc, cfg, hw, h, s, c in db.execute(sql, params + [args.limit])]
+    print_rows(["id", "时间", "用例", "配置", "硬件", "哈希", "种子", "周期数"], rows)
+    return 0
+
+
+def cmd_compare(args):
+    db = connect(args.db)
+    rows = compare(db, args.base, args.new, args.testcase, args.config, args.threshold, args.alpha)
+    if not rows:
+        print("没有可比较的数据: 每个用例/配置至少需要两个硬件版本的记录")
+        return 0
+    _, _, names = samples(db)
+    table = []
+    for r in rows:
+        mark = "变差" if r["regression"] else "变好" if r["improvement"] else ""
+        table.append((r["testcase"], r["config"], r["kernel"],
+                      f"{names.get(r['base'], '')}@{r['base'][:8]}", f"{names.get(r['new'], '')}@{r['new'][:8]}",
+                      f"{r['base_cycles']:.0f} (n={r['n_base']})", f"{r['new_cycles']:.0f} (n={r['n_new']})",
+                      f"{r['delta'] * 100:+.2f}%", "-" if r["p"] is None else f"{r['p']:.3g}", mark))
+    print_rows(["用例", "配置", "内核", "基准", "新版本", "基准周期", "新周期", "变化", "p", ""], table)
+    regressions = [r for r in rows if r["regression"]]
+    print(f"\n{len(rows)} 项比较, {len(regressions)} 项变差 (阈值 {args.threshold * 100:g}%, alpha {args.alpha})")
+    return 1 if regressions else 0
+
+
+def cmd_trend(args):
+    db = connect(args.db)
+    groups, drops, names = samples(db, args.testcase, args.config)
+    if not groups:
+        print("数据库中没有记录")
+        return 0
+    drops = drops[-args.last:]
+    header = ["用例", "配置", "内核"] + [f"{names[h]}@{h[:8]}" for h in drops]
+    table = []
+    for key, by_hw in sorted(groups.items()):
+        row, prev = list(key), None
+        for h in drops:
+            if h not in by_hw:
+                row.append("")
+                continue
+            mean = sum(by_hw[h]) / len(by_hw[h])
+            cell = f"{mean:.0f}"
+            if prev:
+                cell += f" ({(mean - prev) / prev * 100:+.1f}%)"
+            row.append(cell)
+            prev = mean
+        table.append(row)
+    print_rows(header, table)
+    if args.csv:
+        write_csv(args.csv, header, table)
+        print(f"已写入: {args.csv}")
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="记录simv.log中的周期数，比较不同硬件版本之间的性能变化",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python bench_db.py record tc_vecadd/simv.log -c 8w4t
+  python bench_db.py record mnist/simv.log -t mnist -c mnist_tiny --hw ../../src/gen_fpga_verilog_1sm8w32t
+  python bench_db.py runs -t tc_vecadd
+  python bench_db.py compare --threshold 0.02        # 有显著变差时返回1
+  python bench_db.py trend -t mnist --csv trend.csv
+数据库默认位于 ~/.cache/ventus_bench/bench.db，可用 VENTUS_BENCH_DB 或 --db 修改
+        """
+    )
+    parser.add_argument('--db', default=os.environ.get("VENTUS_BENCH_DB", DEFAULT_DB), help='数据库文件')
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("record", help="记录simv.log中的结果")
+    p.add_argument("logs", nargs="+", help="simv.log")
+    p.add_argument("-t", "--testcase", help="用例名(默认取日志所在目录名)")
+    p.add_argument("-c", "--config", help="配置名(如 8w4t，默认从日志中的 CASE_xxx 推断)")
+    p.add_argument("--hw", default=DEFAULT_HW, help="硬件代码目录(默认 src/gen_fpga_verilog)")
+    p.add_argument("--seed", type=int, help="随机种子(默认从日志中读取)")
+    p.set_defaults(func=cmd_record)
+
+    p = sub.add_parser("runs", help="列出记录")
+    p.add_argument("-t", "--testcase", help="只显示该用例")
+    p.add_argument("-c", "--config", help="只显示该配置")
+    p.add_argument("--limit", type=int, default=50, help="最多显示的条数(默认50)")
+    p.set_defaults(func=cmd_runs)
+
+    p = sub.add_parser("compare", help="比较两个硬件版本")
+    p.add_argument("--base", help="基准硬件哈希(默认每组的倒数第二个版本)")
+    p.add_argument("--new", help="新硬件哈希(默认每组的最新版本)")
+    p.add_argument("-t", "--testcase", help="只比较该用例")
+    p.add_argument("-c", "--config", help="只比较该配置")
+    p.add_argument("--threshold", type=float, default=0.01, help="周期数增加超过该比例才算变差(默认0.01)")
+    p.add_argument("--alpha", type=float, default=0.05, help="显著性水平(默认0.05)")
+    p.set_defaults(func=cmd_compare)
+
+    p = sub.add_parser("trend", help="按硬件版本输出趋势表")
+    p.add_argument("-t", "--testcase", help="只显示该用例")
+    p.add_argument("-c", "--config", help="只显示该配置")
+    p.add_argument("--last", type=int, default=8, help="最多显示的硬件版本数(默认8)")
+    p.add_argument("--csv", help="同时写出CSV")
+    p.set_defaults(func=cmd_trend)
+
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except (OSError, ValueError, sqlite3.Error) as e:
+        print(f"错误: {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
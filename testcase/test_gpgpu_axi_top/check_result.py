@@ -0,0 +1,233 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+比较simv.log中print_result输出的结果内存与golden数据
+simv.log按块流式读取，只解析 display_mem 打印的 "0x<地址> <数据>" 行，
+结果按golden的地址表用NumPy批量放入数组后统一比较，内存占用只与golden大小和块大小有关。
+
+golden来源:
+  xxx.spike.json / .bin     spike导出的 [{"address", "size", "data": {地址: 数据}}] 或 spike_dump.py 转换后的二进制
+  test_output.txt@0x90007000  save_array_as_hex 导出的 hXXXXXXXX 文件(或每行一个十六进制字)，@后为起始地址
+
+用法:
+  python check_result.py mnist/simv.log mnist/softdata/mnist_tiny/mnist_tiny.spike.json
+  python check_result.py simv.log test_output.txt@0x90007000 --ulp 4
+  python check_result.py simv.log golden.json --rtol 1e-5 --allow-missing
+返回值: 0 一致, 1 不一致或有缺失, 2 参数或文件错误
+"""
+
+import re
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from spike_dump import SpikeDump, BINARY_SUFFIX
+
+
+CHUNK_SIZE = 16 << 20        # 每次读取的字节数
+# display_mem: $display("          0x%h %h", addr, mem[...][31:0])，未初始化的位打印为x/z
+LINE_RE = re.compile(rb"0x([0-9a-fA-FxXzZ]{8}) ([0-9a-fA-FxXzZ]{8})(?![0-9a-zA-Z])")
+UNKNOWN = 16                 # 十六进制位为x/z时的标记值
+
+HEX_VALUES = np.full(256, 255, dtype=np.uint8)
+for _i, _c in enumerate(b"0123456789abcdef"):
+    HEX_VALUES[_c] = _i
+    HEX_VALUES[ord(chr(_c).upper())] = _i
+for _c in b"xXzZ":
+    HEX_VALUES[_c] = UNKNOWN
+NIBBLE_SHIFTS = np.arange(28, -1, -4, dtype=np.uint32)
+
+
+def parse_hex_fields(blob):
+    """定长8位十六进制字段拼成的bytes → (uint32数组, 是否含x/z)"""
+    digits = HEX_VALUES[np.frombuffer(blob, dtype=np.uint8)].reshape(-1, 8)
+    unknown = (digits == UNKNOWN).any(axis=1)
+    digits = np.where(digits == UNKNOWN, 0, digits).astype(np.uint32)
+    return (digits << NIBBLE_SHIFTS).sum(axis=1, dtype=np.uint32), unknown
+
+
+# ──────────────────────────────
+# golden
+# ──────────────────────────────
+def load_hex_txt(path, base):
+    """hXXXXXXXX / 0xXXXXXXXX / XXXXXXXX 空白分隔的十六进制文件，从base起每个字占4字节"""
+    with open(path, 'r') as f:
+        tokens = f.read().split()
+    words = []
+    for token in tokens:
+        token = token.lower()
+        if token.startswith("h"):
+            token = token[1:]
+        elif token.startswith("0x"):
+            token = token[2:]
+        words.append(int(token, 16))
+    addrs = base + 4 * np.arange(len(words), dtype=np.uint64)
+    return addrs, np.array(words, dtype=np.uint32)
+
+
+def load_golden(specs):
+    """合并所有golden来源，返回按地址排序的 (地址数组, 数据数组)，同一地址以后出现的为准"""
+    addr_parts, word_parts = [], []
+    for spec in specs:
+        path, _, base = spec.partition("@")
+        if base:
+            addrs, words = load_hex_txt(path, np.uint64(int(base, 0)))
+        elif path.endswith(".json") or path.endswith(BINARY_SUFFIX):
+            addrs, words = SpikeDump.open(path).items()
+        else:
+            raise ValueError(f"{spec}: hex文本需要用 @<起始地址> 指定地址，例如 {path}@0x90007000")
+        addr_parts.append(addrs)
+        word_parts.append(words)
+    addrs = np.concatenate(addr_parts)
+    words = np.concatenate(word_parts)
+    # 反转后 np.unique 取到的是每个地址最后一次出现的位置
+    addrs, index = np.unique(addrs[::-1], return_index=True)
+    return addrs, words[::-1][index]
+
+
+# ──────────────────────────────
+# simv.log
+# ──────────────────────────────
+def scan_log(path, golden_addrs, chunk_size=CHUNK_SIZE):
+    """流式解析simv.log，返回 (结果数组, 是否出现, 是否含x/z, 统计)
+
+    只保留golden地址表中的地址，日志大小不影响内存占用；同一地址多次打印时以最后一次为准。
+    """
+    result = np.zeros(len(golden_addrs), dtype=np.uint32)
+    seen = np.zeros(len(golden_addrs), dtype=bool)
+    unknown = np.zeros(len(golden_addrs), dtype=bool)
+    stats = {"bytes": 0, "lines": 0, "matched": 0}
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                block, tail = tail, b""
+            else:
+                block = tail + chunk
+                cut = block.rfind(b"\n") + 1
+                block, tail = block[:cut], block[cut:]
+            stats["bytes"] += len(block)
+            stats["lines"] += block.count(b"\n")
+            pairs = LINE_RE.findall(block)
+            if pairs:
+                addrs, addr_unknown = parse_hex_fields(b"".join(a for a, _ in pairs))
+                words, word_unknown = parse_hex_fields(b"".join(w for _, w in pairs))
+                index = np.searchsorted(golden_addrs, addrs.astype(np.uint64))
+                index[index >= len(golden_addrs)] = 0
+                hit = (golden_addrs[index] == addrs) & ~addr_unknown if len(golden_addrs) else \
+                    np.zeros(len(addrs), dtype=bool)
+                stats["matched"] += int(hit.sum())
+                result[index[hit]] = words[hit]
+                unknown[index[hit]] = word_unknown[hit]
+                seen[index[hit]] = True
+            if not chunk:
+                break
+    return result, seen, unknown, stats
+
+
+# ──────────────────────────────
+# 比较
+# ──────────────────────────────
+def ordered_bits(words):
+    """float32位模式 → 按数值大小单调的整数，两者之差即ULP距离(+0与-0相同)"""
+    bits = words.astype(np.int64)
+    return np.where(bits >= 1 << 31, (1 << 31) - bits, bits)
+
+
+def compare(expected, actual, dtype="float", ulp=0, rtol=0.0, atol=0.0):
+    """返回 (是否一致数组, ULP距离, 相对误差)"""
+    if dtype == "int":
+        diff = np.abs(expected.view(np.int32).astype(np.int64) - actual.view(np.int32).astype(np.int64))
+        return diff <= atol, diff, np.zeros(len(expected))
+
+    exp_f = expected.view(np.float32).astype(np.float64)
+    act_f = actual.view(np.float32).astype(np.float64)
+    ulps = np.abs(ordered_bits(expected) - ordered_bits(actual))
+    with np.errstate(invalid="ignore", divide="ignore"):
+        abs_err = np.abs(exp_f - act_f)
+        rel_err = np.where(exp_f != 0, abs_err / np.abs(exp_f), abs_err)
+    ok = (expected == actual) | (ulps <= ulp) | (abs_err <= atol + rtol * np.abs(exp_f))
+    ok |= np.isnan(exp_f) & np.isnan(act_f)
+    ok &= np.isnan(exp_f) == np.isnan(act_f)
+    return ok, ulps, np.nan_to_num(rel_err, nan=np.inf)
+
+
+def format_value(word, dtype):
+    if dtype == "int":
+        return f"{int(np.uint32(word).view(np.int32))}"
+    return f"{float(np.uint32(word).view(np.float32)):.7g}"
+
+
+def report(addrs, expected, actual, seen, unknown, ok, ulps, rel_err, args):
+    """打印汇总和前若干个不一致的地址，返回是否通过"""
+    checked = seen & ~unknown
+    bad = checked & ~ok
+    missing = ~seen
+    total = len(addrs)
+    print(f"golden: {total} 个字, 日志中找到 {int(seen.sum())} 个, "
+          f"不一致 {int(bad.sum())} 个, 缺失 {int(missing.sum())} 个, 含x/z {int(unknown.sum())} 个")
+    if checked.any() and args.dtype == "float":
+        print(f"最大ULP距离 {int(ulps[checked].max())}, 最大相对误差 {float(rel_err[checked].max()):.3g}")
+
+    rows = np.flatnonzero(bad | (seen & unknown))
+    for i in rows[:args.max_report]:
+        got = "x/z" if unknown[i] else f"{int(actual[i]):08x} ({format_value(actual[i], args.dtype)})"
+        extra = f"  ulp={int(ulps[i])}" if args.dtype == "float" and not unknown[i] else ""
+        print(f"  0x{int(addrs[i]):08x}: 期望 {int(expected[i]):08x} ({format_value(expected[i], args.dtype)}) "
+              f"实际 {got}{extra}")
+    if len(rows) > args.max_report:
+        print(f"  ... 另有 {len(rows) - args.max_report} 个")
+    if missing.any() and not args.allow_missing:
+        first = np.flatnonzero(missing)[:args.max_report]
+        print("  缺失: " + " ".join(f"0x{int(addrs[i]):08x}" for i in first)
+              + (" ..." if missing.sum() > len(first) else ""))
+
+    passed = not bad.any() and not (seen & unknown).any() and (args.allow_missing or not missing.any())
+    print("PASS" if passed else "FAILED")
+    return passed
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="用NumPy批量比较simv.log中打印的结果内存与golden数据",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python check_result.py mnist/simv.log mnist/softdata/mnist_tiny/mnist_tiny.spike.json
+  python check_result.py simv.log mnist/softdata/mnist_tiny/data_gen/test_output.txt@0x90007000 --ulp 4
+  python check_result.py simv.log golden.json --dtype int
+返回值: 0 一致, 1 不一致或有缺失, 2 参数或文件错误
+        """
+    )
+    parser.add_argument('log', help='仿真日志 (simv.log)')
+    parser.add_argument('golden', nargs='+', help='golden: *.json / *.bin (spike) 或 <hex文本>@<起始地址>')
+    parser.add_argument('--dtype', choices=['float', 'int'], default='float', help='按float32或int32比较(默认float)')
+    parser.add_argument('--ulp', type=int, default=0, help='允许的最大ULP距离(默认0，即逐位一致)')
+    parser.add_argument('--rtol', type=float, default=0.0, help='允许的相对误差')
+    parser.add_argument('--atol', type=float, default=0.0, help='允许的绝对误差(int模式为整数差)')
+    parser.add_argument('--allow-missing', action='store_true', help='日志中没有打印的golden地址不算失败')
+    parser.add_argument('--max-report', type=int, default=10, help='最多列出的不一致地址数(默认10)')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE, help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    try:
+        addrs, expected = load_golden(args.golden)
+        start_time = time.time()
+        actual, seen, unknown, stats = scan_log(args.log, addrs, args.chunk_size)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"{args.log}: {stats['lines']} 行, {stats['matched']} 条结果, "
+          f"{stats['bytes'] / elapsed / (1 << 20):.1f} MB/s")
+
+    ok, ulps, rel_err = compare(expected, actual, args.dtype, args.ulp, args.rtol, args.atol)
+    return 0 if report(addrs, expected, actual, seen, unknown, ok, ulps, rel_err, args) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
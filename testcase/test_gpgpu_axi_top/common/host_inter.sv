@@ -81,6 +81,9 @@ module host_inter(
   reg [31:0] cycle_count  [0:2-1];
   reg [31:0] kernel_cycles       ;
 
+  // CTA分片仿真(cta_shard.py): +CTA_KERNEL=k 的第k次exe_finish只启动 +CTA_FIRST 起的 +CTA_COUNT 个CTA
+  integer    exe_count = 0       ;
+
   task drv_gpu;
     input [META_FNAME_SIZE*8-1:0] fn_metadata;
     input [DATA_FNAME_SIZE*8-1:0] fn_data;
@@ -224,6 +227,7 @@ module host_inter(
     reg [`AXILITE_DATA_WIDTH-1:0] r_data;
     integer i;
     integer block_count,host_req_cnt;
+    integer shard_kernel,cta_first,cta_count;
     reg [31:0] cta_id_x, cta_id_y, cta_id_z,wg_id;
     reg[63:0] kernal_size_x, kernal_size_y, kernal_size_z;
     
@@ -240,11 +244,29 @@ module host_inter(
       kernal_size_x = {metadata[ 5], metadata[ 4]};
       kernal_size_y = {metadata[ 7], metadata[ 6]};
       kernal_size_z = {metadata[ 9], metadata[ 8]};
-        while(block_count < n) begin
+      // +CTA_FROM_META: CTA数取metadata的 kernel_size_x*y*z，不用tc.v传入的n(autotune.py改写kernel_size时使用)
+      if ($test$plusargs("CTA_FROM_META"))
+        n = kernal_size_x * kernal_size_y * kernal_size_z;
+      $display("Kernel CTAs: %0d launched, metadata %0d", n, kernal_size_x * kernal_size_y * kernal_size_z);
+      shard_kernel = 0;
+      cta_first = 0;
+      cta_count = n;
+      void'($value$plusargs("CTA_KERNEL=%d", shard_kernel));
+      if (exe_count == shard_kernel && $value$plusargs("CTA_FIRST=%d", cta_first)) begin
+        if (!$value$plusargs("CTA_COUNT=%d", cta_count) || cta_first + cta_count > n)
+          cta_count = n - cta_first;
+        // x 是最快变化的维度
+        cta_id_x = cta_first % kernal_size_x;
+        cta_id_y = (cta_first / kernal_size_x) % kernal_size_y;
+        cta_id_z = cta_first / (kernal_size_x * kernal_size_y);
+        wg_id = wg_id_base + cta_first;
+        $display("CTA shard: kernel %0d, CTA %0d..%0d of %0d", exe_count, cta_first, cta_first + cta_count - 1, n);
+      end
+        while(block_count < cta_count) begin
           @(posedge clk);
           // 使用更安全的显示方式，只显示前64个字符
           // $display("Processing block %d/%d for current kernel", block_count+1, n);
-          if (host_req_cnt < n) begin
+          if (host_req_cnt < cta_count) begin
           $display("Launching CTA with ID: x=%d, y=%d, z=%d,wg_id=%d,wgid_inkernel=%d", cta_id_x, cta_id_y, cta_id_z,wg_id,wg_id-wg_id_base);
           // drv_gpu(fn_metadata, fn_data, 32'd0, 32'd0, 32'd0); 
           drv_gpu(fn_metadata, fn_data, cta_id_x, cta_id_y, cta_id_z,wg_id,wg_id-wg_id_base); 
@@ -266,7 +288,7 @@ module host_inter(
         @(posedge clk);
         if(r_data) begin
           block_count = block_count + 1;
-          $display("Block %d finished, total %d/%d", block_count, block_count, n);
+          $display("Block %d finished, total %d/%d", block_count, block_count, cta_count);
           @(posedge clk);
         end
       end
@@ -277,6 +299,7 @@ module host_inter(
       $display("*********");
       $display("");
       kernel_cycles = (cycle_count[1]-cycle_count[0])/10;
+      exe_count = exe_count + 1;
       $display("*********");
       $display("Single kernel need : %t cycles",kernel_cycles);
       $display("*********");
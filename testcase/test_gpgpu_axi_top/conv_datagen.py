@@ -0,0 +1,897 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+按层配置(layers.json)训练/导出卷积网络，并直接生成各kernel的 conv_N.data
+buffer的顺序和大小取自同名.metadata: 通过kernel元数据块找到参数buffer，
+参数buffer的前4个字依次是 输入/权重/偏置/输出 buffer的基址，其余是conv.cl的整数参数。
+权重、偏置、输入按基址填入对应buffer(输出buffer清零)，代码段、参数等其它buffer保留原.data中的内容。
+
+用法:
+  python conv_datagen.py                                            # 所有 mnist/softdata/*/data_gen/layers.json
+  python conv_datagen.py mnist/softdata/mnist_tiny/data_gen/layers.json
+  python conv_datagen.py --from-txt                                 # 不训练，用现有 conv*_weight.txt 等重新打包
+  python conv_datagen.py --from-txt --check                         # 只比较，不写文件
+  python conv_datagen.py --from-txt --precision fp16 int8           # 另外生成 conv_N.fp16/int8.data/.metadata
+
+低精度模式(fp16 / 每个张量一个缩放系数的对称int8)把输入、权重和输出按2个/4个一组打包进32位字(低地址在低位)，
+.metadata中这些buffer的大小相应缩小(基址和分配大小不变)，写到 conv_N.<精度>.data/.metadata，供低带宽kernel使用。
+int8的偏置按 输入缩放*权重缩放 量化为int32，每个字一个。同精度的参考输出写到 data_gen/conv<i>_out.<精度>.txt，
+与fp32模型逐层比较的误差和各张量的缩放系数写到 data_gen/precision_<精度>.json。
+
+int8 kernel 读取的缩放系数写在 .data 旁边的 conv_N.int8.scales ($readmemh格式，4个float32位模式):
+  字0 输入缩放, 字1 权重缩放, 字2 输出缩放, 字3 重量化系数 requant = float32(输入缩放*权重缩放/输出缩放)
+kernel 对每个输出: acc = Σ x*w + bias (int32)，y = clamp(rint(float32(acc) * requant), ±127)，有ReLU时先取 max(·, 0)。
+生成时按这个约定用 .scales 中的系数重算每层输出，必须与参考输出逐元素一致。
+
+int8 的激活(输入和各层输出)缩放系数按一批校准样本(默认训练集前 --calib-samples 个，没有训练集图片时取
+测试集末尾并在评估中排除)的fp32推理标定，取 |x| 的 --calib-percentile 百分位数作为峰值。
+测试集可用时(MNIST IDX 文件)，用这些缩放系数对测试集(或 --eval-samples 个样本)做同精度推理，
+报告与fp32的top-1准确率和分类一致率。
+"""
+
+import os
+import sys
+import glob
+import gzip
+import json
+import time
+import random
+import shutil
+import struct
+import hashlib
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import torch
+    import torch.nn as nn
+    import torch.optim as optim
+except ImportError:           # --from-txt 只重新打包现有数据，不需要 torch
+    torch = None
+
+from metadata2md import Metadata, HEADER_FIELDS
+from mem_image import read_hex_words, word_count, split_buffers, kernel_arg_words
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SPEC_NAME = "layers.json"
+SPEC_GLOB = os.path.join(SCRIPT_DIR, "mnist", "softdata", "*", "data_gen", SPEC_NAME)
+LEARNING_RATE = 0.01
+BATCH_SIZE = 64
+SEED = 0
+CACHE_SUBDIR = "model_cache"  # 相对layers.json所在目录
+CACHE_KEEP = 4                # 最多保留的缓存条目数，按最近使用时间淘汰
+EVAL_BATCH_SIZE = 1000
+
+# conv.cl 的参数顺序: 4个buffer地址之后是整数参数，老版本kernel没有 stride_h/stride_w
+BUFFER_ARGS = ("input", "weight", "bias", "output")
+SCALAR_ARGS = ("in_channels", "in_h", "in_w", "kernel_h", "kernel_w",
+               "out_h", "out_w", "do_relu", "stride_h", "stride_w")
+PRECISIONS = ("fp32", "fp16", "int8")
+INT8_MAX = 127
+SCALE_FIELDS = ("input", "weight", "output", "requant")   # conv_N.int8.scales 中的字顺序
+SCALE_SUFFIX = ".scales"
+PREDICT_BATCH = 100           # numpy推理每批样本数，限制滑窗展开占用的内存
+CALIB_SAMPLES = 1000          # int8激活缩放系数的校准样本数
+CALIB_PERCENTILE = 99.99      # 校准取 |x| 的百分位数作为峰值，100 即最大值
+
+
+# ──────────────────────────────
+# hex 导出
+# ──────────────────────────────
+HEX_DIGITS = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+CHUNK_SIZE = 1 << 20          # 流式写出时每块的元素数
+
+
+def float_to_hex(f: float) -> str:
+    """单个 float → 'hXXXXXXXX' 大端 16 进制字符串"""
+    return "h{:08x}".format(struct.unpack("!I", struct.pack("!f", f))[0])
+
+
+def floats_to_hex_bytes(flat: np.ndarray) -> bytes:
+    """1-D 数组 → b'hXXXXXXXX ' 拼接（每个元素后带一个空格），整体向量化"""
+    raw = np.asarray(flat, dtype=">f4").view(np.uint8).reshape(-1, 4)
+    out = np.empty((len(raw), 10), dtype=np.uint8)
+    out[:, 0] = ord("h")
+    out[:, 1:9:2] = HEX_DIGITS[raw >> 4]
+    out[:, 2:9:2] = HEX_DIGITS[raw & 0x0F]
+    out[:, 9] = ord(" ")
+    return out.tobytes()
+
+
+def words_to_hex_bytes(words: np.ndarray) -> bytes:
+    """uint32 数组 → b'XXXXXXXX\\n' 拼接，即 .data 文件的格式"""
+    raw = np.asarray(words, dtype=">u4").view(np.uint8).reshape(-1, 4)
+    out = np.empty((len(raw), 9), dtype=np.uint8)
+    out[:, 0:8:2] = HEX_DIGITS[raw >> 4]
+    out[:, 1:8:2] = HEX_DIGITS[raw & 0x0F]
+    out[:, 8] = ord("\n")
+    return out.tobytes()
+
+
+class HexWriter:
+    """流式写 hex 文件：数组按块格式化后追加，内存占用只与块大小有关"""
+
+    def __init__(self, filename: str, chunk_size: int = CHUNK_SIZE):
+        self.file = open(filename, "wb")
+        self.chunk_size = chunk_size
+        self.count = 0
+
+    def write(self, array):
+        flat = np.asarray(array, dtype=np.float32).reshape(-1)
+        for start in range(0, len(flat), self.chunk_size):
+            chunk = floats_to_hex_bytes(flat[start:start + self.chunk_size])
+            if self.count:
+                self.file.write(b" ")
+            self.file.write(chunk[:-1])
+            self.count += len(chunk) // 10
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def save_array_as_hex(filename: str, array, chunk_size: int = CHUNK_SIZE):
+    """numpy / tensor 展平成 1-D → 空格分隔 hex 字符串写文件"""
+    with HexWriter(filename, chunk_size) as writer:
+        writer.write(array)
+    print(f"Saved {filename} ({writer.count} numbers)")
+
+
+def load_hex_txt(filename: str) -> np.ndarray:
+    """读取 save_array_as_hex 写出的 'hXXXXXXXX ...' 文件，返回 uint32 数组"""
+    with open(filename, "r") as f:
+        return np.array([int(token[1:], 16) for token in f.read().split()], dtype=np.uint32)
+
+
+def benchmark_hex_export(n: int = 10 * 32 * 20 * 20):
+    """逐元素 struct 与向量化导出的速度对比（默认 mnist conv3 权重规模），并校验输出一致"""
+    special = np.array([0.0, -0.0, np.inf, -np.inf, np.nan, 1e-45, 3.4e38], dtype=np.float32)
+    data = np.concatenate([np.random.default_rng(0).standard_normal(n).astype(np.float32), special])
+
+    start = time.perf_counter()
+    legacy = " ".join(float_to_hex(x) for x in data)
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    fast = floats_to_hex_bytes(data)[:-1].decode()
+    fast_time = time.perf_counter() - start
+
+    assert fast == legacy, "向量化输出与逐元素输出不一致"
+    print(f"元素数: {len(data)}")
+    print(f"逐元素 struct: {len(data) / legacy_time:,.0f} 元素/秒")
+    print(f"向量化:        {len(data) / fast_time:,.0f} 元素/秒 ({legacy_time / fast_time:.1f}x)")
+
+
+# ──────────────────────────────
+# 层配置
+# ──────────────────────────────
+def load_spec(path: str) -> dict:
+    """读取 layers.json，补全默认值并逐层推导输入/输出尺寸
+
+    格式: {"name", "input": [C,H,W], "layers": [{"out_channels", "kernel", "stride"=1, "relu"=true}],
+          "epochs", "lr", "seed", "data_root"="data", "targets": [含 conv_N.metadata 的目录]}
+    相对路径都以 layers.json 所在目录为基准。
+    """
+    with open(path, "r") as f:
+        spec = json.load(f)
+    spec["path"] = os.path.abspath(path)
+    spec["dir"] = os.path.dirname(spec["path"])
+    spec.setdefault("name", os.path.basename(os.path.dirname(spec["dir"])))
+    spec.setdefault("lr", LEARNING_RATE)
+    spec.setdefault("seed", SEED)
+    spec.setdefault("kernel_prefix", "conv")
+    spec["data_root"] = os.path.join(spec["dir"], spec.get("data_root", "data"))
+    spec["targets"] = [os.path.normpath(os.path.join(spec["dir"], t)) for t in spec.get("targets", [".."])]
+
+    channels, height, width = spec["input"]
+    for i, layer in enumerate(spec["layers"], 1):
+        kernel = layer["kernel"]
+        stride = layer.setdefault("stride", 1)
+        layer.setdefault("relu", True)
+        layer["in_channels"], layer["in_h"], layer["in_w"] = channels, height, width
+        channels = layer["out_channels"]
+        height = (height - kernel) // stride + 1
+        width = (width - kernel) // stride + 1
+        if height <= 0 or width <= 0:
+            raise ValueError(f"{path}: 第 {i} 层卷积核大于输入")
+        layer["out_h"], layer["out_w"] = height, width
+    return spec
+
+
+def layer_args(layer: dict) -> dict:
+    """该层在参数buffer中应有的整数参数"""
+    return {"in_channels": layer["in_channels"], "in_h": layer["in_h"], "in_w": layer["in_w"],
+            "kernel_h": layer["kernel"], "kernel_w": layer["kernel"],
+            "out_h": layer["out_h"], "out_w": layer["out_w"], "do_relu": int(layer["relu"]),
+            "stride_h": layer["stride"], "stride_w": layer["stride"]}
+
+
+# ──────────────────────────────
+# 网络定义
+# ──────────────────────────────
+def build_model(spec: dict) -> "nn.Module":
+    """按层配置构造网络，层名 conv1..convN 与导出的 conv*_weight.txt 一一对应"""
+    layers = OrderedDict()
+    for i, layer in enumerate(spec["layers"], 1):
+        layers[f"conv{i}"] = nn.Conv2d(layer["in_channels"], layer["out_channels"],
+                                       kernel_size=layer["kernel"], stride=layer["stride"])
+        if layer["relu"]:
+            layers[f"relu{i}"] = nn.ReLU()
+    layers["flatten"] = nn.Flatten()  # [B,10,1,1] -> [B,10]
+    return nn.Sequential(layers)
+
+
+def require_torch():
+    if torch is None:
+        raise SystemExit("错误: 训练/推理需要 torch，只重新打包现有 txt 时请加 --from-txt")
+
+
+# ──────────────────────────────
+# 数据加载（离线，内存映射 IDX 文件）
+# ──────────────────────────────
+IDX_DTYPES = {0x08: np.uint8, 0x09: np.int8, 0x0B: ">i2", 0x0C: ">i4", 0x0D: ">f4", 0x0E: ">f8"}
+
+
+def idx_path(root: str, name: str) -> str:
+    """在 root/MNIST/raw 或 root 下查找 IDX 文件，只有 .gz 时解压一次放在旁边"""
+    for directory in (os.path.join(root, "MNIST", "raw"), root):
+        path = os.path.join(directory, name)
+        if os.path.exists(path):
+            return path
+        if os.path.exists(path + ".gz"):
+            tmp_path = f"{path}.tmp.{os.getpid()}"
+            with gzip.open(path + ".gz", "rb") as src, open(tmp_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, 1 << 20)
+            os.replace(tmp_path, path)
+            return path
+    raise FileNotFoundError(f"找不到 {name}(.gz)，请把 MNIST 原始 IDX 文件放到 "
+                            f"{os.path.join(root, 'MNIST', 'raw')} 下，或用 --data-root 指定目录")
+
+
+def load_idx(path: str) -> np.ndarray:
+    """内存映射 IDX 文件（copy-on-write，不读入内存也不拷贝）"""
+    with open(path, "rb") as f:
+        _, dtype_code, ndim = struct.unpack(">HBB", f.read(4))
+        shape = struct.unpack(f">{ndim}I", f.read(4 * ndim))
+    return np.memmap(path, dtype=np.dtype(IDX_DTYPES[dtype_code]), mode="c",
+                     offset=4 + 4 * ndim, shape=shape)
+
+
+def load_mnist(root: str, train: bool = True):
+    """返回 (images [N,28,28] uint8, labels [N] int64) 两个 tensor，images 直接共享 mmap 内存"""
+    prefix = "train" if train else "t10k"
+    images = torch.from_numpy(load_idx(idx_path(root, f"{prefix}-images-idx3-ubyte")))
+    labels = torch.from_numpy(load_idx(idx_path(root, f"{prefix}-labels-idx1-ubyte"))).long()
+    return images, labels
+
+
+def to_input(images: "torch.Tensor") -> "torch.Tensor":
+    """uint8 [B,28,28] → float [B,1,28,28]，与 transforms.ToTensor() 的结果一致"""
+    return images.float().div_(255).unsqueeze(1)
+
+
+# ──────────────────────────────
+# 训练与缓存
+# ──────────────────────────────
+def set_seed(seed: int):
+    """固定所有随机源，保证缓存的权重、conv*_weight.txt 和 .data 可复现"""
+    random.seed(seed)
+    np.random.seed(seed)
+    torch.manual_seed(seed)
+
+
+def train_model(spec: dict, num_epochs: int, lr: float, seed: int, data_root: str) -> "nn.Module":
+    set_seed(seed)
+    images, labels = load_mnist(data_root, train=True)
+    generator = torch.Generator().manual_seed(seed)
+
+    model = build_model(spec)
+    criterion = nn.CrossEntropyLoss()
+    optimizer = optim.SGD(model.parameters(), lr=lr)
+
+    model.train()
+    for epoch in range(num_epochs):
+        order = torch.randperm(len(labels), generator=generator)
+        for batch_idx, start in enumerate(range(0, len(labels), BATCH_SIZE)):
+            index = order[start:start + BATCH_SIZE]
+            optimizer.zero_grad()
+            loss = criterion(model(to_input(images[index])), labels[index])
+            loss.backward()
+            optimizer.step()
+            if batch_idx % 100 == 0:
+                print(f"[{spec['name']}] Epoch {epoch} [{start}/{len(labels)}] "
+                      f"Loss: {loss.item():.6f}")
+    return model
+
+
+def cache_key(spec: dict, num_epochs: int, lr: float, seed: int) -> str:
+    """由网络结构、训练轮数、学习率、随机种子和 batch 大小计算缓存 key"""
+    desc = f"{build_model(spec)!r}|epochs={num_epochs}|lr={lr}|seed={seed}|batch={BATCH_SIZE}"
+    return hashlib.sha256(desc.encode()).hexdigest()[:16]
+
+
+def evict_stale(cache_dir: str, keep_path: str):
+    """只保留最近使用的 CACHE_KEEP 个缓存条目"""
+    entries = sorted(glob.glob(os.path.join(cache_dir, "*.pt")),
+                     key=os.path.getmtime, reverse=True)
+    for path in entries[CACHE_KEEP:]:
+        if path != keep_path:
+            os.remove(path)
+            print(f"删除过期的模型缓存: {path}")
+
+
+def load_or_train(spec: dict, num_epochs: int, lr: float, seed: int,
+                  retrain: bool, data_root: str) -> "nn.Module":
+    """命中缓存时直接加载权重，否则训练并写入缓存"""
+    cache_dir = os.path.join(spec["dir"], CACHE_SUBDIR)
+    os.makedirs(cache_dir, exist_ok=True)
+    path = os.path.join(cache_dir, f"convnn-{cache_key(spec, num_epochs, lr, seed)}.pt")
+    if os.path.exists(path) and not retrain:
+        model = build_model(spec)
+        model.load_state_dict(torch.load(path, map_location="cpu"))
+        os.utime(path)                # 更新最近使用时间
+        print(f"使用缓存的模型权重: {path}")
+    else:
+        model = train_model(spec, num_epochs, lr, seed, data_root)
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        torch.save(model.state_dict(), tmp_path)
+        os.replace(tmp_path, path)
+        print(f"模型权重已缓存: {path}")
+    evict_stale(cache_dir, path)
+    return model
+
+
+def evaluate_model(model: "nn.Module", data_root: str):
+    images, labels = load_mnist(data_root, train=False)
+    with torch.no_grad():
+        correct = sum((model(to_input(images[i:i + EVAL_BATCH_SIZE])).argmax(1)
+                       == labels[i:i + EVAL_BATCH_SIZE]).sum().item()
+                      for i in range(0, len(labels), EVAL_BATCH_SIZE))
+    total = len(labels)
+    acc = 100.0 * correct / total
+    print(f"模型在测试集上的准确率: {acc:.2f}%")
+    return acc
+
+
+# ──────────────────────────────
+# 各层数据（float32 按 uint32 位模式保存）
+# ──────────────────────────────
+def as_words(array) -> np.ndarray:
+    """tensor / ndarray → 展平的 float32 位模式(uint32)"""
+    if torch is not None and isinstance(array, torch.Tensor):
+        array = array.detach().cpu().numpy()
+    return np.ascontiguousarray(array, dtype=np.float32).reshape(-1).view(np.uint32)
+
+
+def model_arrays(spec: dict, model: "nn.Module", data_root: str, export_txt: bool = True) -> dict:
+    """取 1 个测试样本逐层推理，返回 {"input": 网络输入, "layers": [{weight, bias, input, output}]}"""
+    test_images, _ = load_mnist(data_root, train=False)
+    x = to_input(test_images[:1])        # [1,C,H,W]
+    arrays = {"input": as_words(x), "layers": []}
+    outputs = []
+    with torch.no_grad():
+        for i, layer in enumerate(spec["layers"], 1):
+            conv = getattr(model, f"conv{i}")
+            entry = {"weight": as_words(conv.weight), "bias": as_words(conv.bias), "input": as_words(x)}
+            x = conv(x)
+            if layer["relu"]:
+                x = torch.relu(x)
+            entry["output"] = as_words(x)
+            arrays["layers"].append(entry)
+            outputs.append(x)
+
+    if export_txt:
+        directory = spec["dir"]
+        for i in range(1, len(spec["layers"]) + 1):
+            conv = getattr(model, f"conv{i}")
+            save_array_as_hex(os.path.join(directory, f"conv{i}_weight.txt"), conv.weight.detach())
+            save_array_as_hex(os.path.join(directory, f"conv{i}_bias.txt"), conv.bias.detach())
+        save_array_as_hex(os.path.join(directory, "test_input.txt"), to_input(test_images[:1]))
+        for i, out in enumerate(outputs, 1):
+            save_array_as_hex(os.path.join(directory, f"conv{i}_out.txt"), out)
+        save_array_as_hex(os.path.join(directory, "test_output.txt"), outputs[-1].reshape(-1))
+    return arrays
+
+
+def txt_arrays(spec: dict) -> dict:
+    """从 data_gen 目录下已导出的 txt 读取各层数据（不需要 torch）"""
+    directory = spec["dir"]
+    arrays = {"input": load_hex_txt(os.path.join(directory, "test_input.txt")), "layers": []}
+    x = arrays["input"]
+    for i in range(1, len(spec["layers"]) + 1):
+        out_path = os.path.join(directory, f"conv{i}_out.txt")
+        entry = {"weight": load_hex_txt(os.path.join(directory, f"conv{i}_weight.txt")),
+                 "bias": load_hex_txt(os.path.join(directory, f"conv{i}_bias.txt")),
+                 "input": x,
+                 "output": load_hex_txt(out_path) if os.path.exists(out_path) else None}
+        arrays["layers"].append(entry)
+        x = entry["output"]
+    return arrays
+
+
+# ──────────────────────────────
+# 低精度导出
+# ──────────────────────────────
+def as_float(words) -> np.ndarray:
+    """float32 位模式(uint32) → float32"""
+    return np.ascontiguousarray(words, dtype=np.uint32).view(np.float32)
+
+
+def conv2d(x: np.ndarray, weight: np.ndarray, bias: np.ndarray, stride: int, relu: bool) -> np.ndarray:
+    """numpy参考卷积: x [...,C,H,W], weight [O,C,K,K] → [...,O,OH,OW]，整数输入按int64累加，浮点按float32累加"""
+    kernel = weight.shape[-1]
+    windows = np.lib.stride_tricks.sliding_window_view(x, (kernel, kernel), axis=(-2, -1))
+    windows = windows[..., ::stride, ::stride, :, :]
+    acc = np.int64 if np.issubdtype(x.dtype, np.integer) else np.float32
+    out = np.einsum("...chwij,ocij->...ohw", windows.astype(acc), weight.astype(acc)) \
+        + bias.astype(acc)[:, None, None]
+    return np.maximum(out, 0) if relu else out
+
+
+def tensor_scale(values: np.ndarray, percentile: float = 100.0) -> float:
+    """对称int8的每张量缩放系数: |x|的峰值 / 127，取float32可表示的值以便kernel按同样的系数计算
+
+    峰值默认取最大值，percentile<100 时取该百分位数(更大的值量化时饱和)。
+    """
+    if not values.size:
+        peak = 0.0
+    elif percentile >= 100:
+        peak = float(np.max(np.abs(values)))
+    else:
+        peak = float(np.percentile(np.abs(values), percentile))
+    return float(np.float32(peak / INT8_MAX)) if peak > 0 else 1.0
+
+
+def requantize(acc: np.ndarray, requant: float, relu: bool) -> np.ndarray:
+    """int8 kernel的输出约定: clamp(rint(float32(acc) * requant), ±127)，有ReLU时先取 max(·, 0)"""
+    y = acc.astype(np.float32) * np.float32(requant)
+    if relu:
+        y = np.maximum(y, np.float32(0))
+    return np.clip(np.rint(y), -INT8_MAX, INT8_MAX).astype(np.int8)
+
+
+def quantize_int8(values: np.ndarray, scale: float) -> np.ndarray:
+    return np.clip(np.rint(values / scale), -INT8_MAX, INT8_MAX).astype(np.int8)
+
+
+def pack_words(values: np.ndarray) -> np.ndarray:
+    """按小端字节序把元素依次打包进32位字，不足一个字的部分补0"""
+    raw = np.ascontiguousarray(values, dtype=np.dtype(values.dtype).newbyteorder("<")).view(np.uint8)
+    pad = -len(raw) % 4
+    if pad:
+        raw = np.concatenate([raw, np.zeros(pad, dtype=np.uint8)])
+    return raw.view("<u4").astype(np.uint32)
+
+
+def error_stats(value: np.ndarray, reference: np.ndarray) -> dict:
+    """与fp32参考结果比较: 最大绝对误差和相对均方根误差"""
+    diff = value.astype(np.float64) - reference.astype(np.float64)
+    ref_rms = float(np.sqrt(np.mean(reference.astype(np.float64) ** 2))) if reference.size else 0.0
+    rms = float(np.sqrt(np.mean(diff ** 2))) if diff.size else 0.0
+    return {"max_abs_err": float(np.max(np.abs(diff))) if diff.size else 0.0,
+            "rel_rms_err": rms / ref_rms if ref_rms else rms}
+
+
+def calibrate_scales(spec: dict, arrays: dict, images: np.ndarray, percentile: float) -> list:
+    """对一批校准输入 [N,C,H,W] 做fp32推理，返回输入和各层输出的int8缩放系数 [输入, conv1输出, ...]"""
+    values = [[] for _ in range(len(spec["layers"]) + 1)]
+    for start in range(0, len(images), PREDICT_BATCH):
+        x = images[start:start + PREDICT_BATCH]
+        values[0].append(x.reshape(-1))
+        for k, (layer, entry) in enumerate(zip(spec["layers"], arrays["layers"]), 1):
+            shape = (layer["out_channels"], layer["in_channels"], layer["kernel"], layer["kernel"])
+            x = conv2d(x, as_float(entry["weight"]).reshape(shape), as_float(entry["bias"]),
+                       layer["stride"], layer["relu"])
+            values[k].append(x.reshape(-1))
+    return [tensor_scale(np.concatenate(v), percentile) for v in values]
+
+
+def lowp_arrays(spec: dict, arrays: dict, precision: str, act_scales: list = None):
+    """fp32各层数据 → 低精度数据和同精度逐层推理的参考输出，返回 (arrays, 误差报告)
+
+    每层的输入是上一层的低精度输出。fp16 按float32累加后舍入到fp16；int8 按int64累加、加int32偏置后
+    乘以 输入缩放*权重缩放，ReLU后按该层输出的缩放系数重新量化。激活(输入和各层输出)的缩放系数取
+    act_scales(calibrate_scales的结果)，没有时只按导出样本的fp32数据计算。
+    """
+    x32 = as_float(arrays["input"]).reshape(spec["input"])
+    if act_scales is None and precision == "int8":
+        act_scales = [tensor_scale(x32)] + [None] * len(spec["layers"])
+    if precision == "fp16":
+        x = x32.astype(np.float16)
+    else:
+        x_scale = act_scales[0]
+        x = quantize_int8(x32, x_scale)
+    result = {"input": x.reshape(-1), "layers": []}
+    report = {"precision": precision, "layers": []}
+    for i, (layer, entry) in enumerate(zip(spec["layers"], arrays["layers"]), 1):
+        shape = (layer["out_channels"], layer["in_channels"], layer["kernel"], layer["kernel"])
+        w32 = as_float(entry["weight"]).reshape(shape)
+        b32 = as_float(entry["bias"])
+        # fp32参考: 优先用模型导出的输出，没有时用numpy按fp32推理
+        y32 = (as_float(entry["output"]).reshape(layer["out_channels"], layer["out_h"], layer["out_w"])
+               if entry["output"] is not None else conv2d(x32, w32, b32, layer["stride"], layer["relu"]))
+        stats = {"layer": i}
+        if precision == "fp16":
+            w, b = w32.astype(np.float16), b32.astype(np.float16)
+            y = conv2d(x.astype(np.float32), w.astype(np.float32), b.astype(np.float32),
+                       layer["stride"], layer["relu"]).astype(np.float16)
+            value = y.astype(np.float32)
+        else:
+            w_scale = tensor_scale(w32)
+            y_scale = act_scales[i] if act_scales[i] is not None else tensor_scale(y32)
+            w = quantize_int8(w32, w_scale)
+            b = np.rint(b32 / (x_scale * w_scale)).astype(np.int32)
+            requant = float(np.float32(x_scale * w_scale / y_scale))
+            y = requantize(conv2d(x, w, b, layer["stride"], False), requant, layer["relu"])
+            value = y.astype(np.float32) * y_scale
+            stats["scales"] = {"input": x_scale, "weight": w_scale, "output": y_scale, "requant": requant}
+            x_scale = y_scale
+        stats.update(error_stats(value, y32))
+        report["layers"].append(stats)
+        result["layers"].append({"weight": w.reshape(-1), "bias": b.reshape(-1), "input": x.reshape(-1),
+                                 "output": y.reshape(-1), "scales": stats.get("scales")})
+        x, x32 = y, y32
+    report["top1_match"] = bool(np.argmax(value) == np.argmax(y32))
+    return result, report
+
+
+def predict(spec: dict, arrays: dict, images: np.ndarray, precision: str) -> np.ndarray:
+    """按导出的各层数据对一批输入 [N,C,H,W] (float32) 推理，返回最终输出 [N,类别数]
+
+    fp32的arrays为uint32位模式；低精度为lowp_arrays的结果，int8使用其中记录的缩放系数。
+    """
+    layers = arrays["layers"]
+    if precision == "int8":
+        x = quantize_int8(images, layers[0]["scales"]["input"])
+    elif precision == "fp16":
+        x = images.astype(np.float16)
+    else:
+        x = images
+    for layer, entry in zip(spec["layers"], layers):
+        shape = (layer["out_channels"], layer["in_channels"], layer["kernel"], layer["kernel"])
+        if precision == "int8":
+            acc = conv2d(x, entry["weight"].reshape(shape), entry["bias"], layer["stride"], False)
+            x = requantize(acc, entry["scales"]["requant"], layer["relu"])
+        elif precision == "fp16":
+            x = conv2d(x.astype(np.float32), entry["weight"].reshape(shape).astype(np.float32),
+                       entry["bias"].astype(np.float32), layer["stride"], layer["relu"]).astype(np.float16)
+        else:
+            x = conv2d(x, as_float(entry["weight"]).reshape(shape), as_float(entry["bias"]),
+                       layer["stride"], layer["relu"])
+    x = x.astype(np.float32)
+    if precision == "int8":
+        x *= np.float32(layers[-1]["scales"]["output"])
+    return x.reshape(len(images), -1)
+
+
+def load_test_images(spec: dict, data_root: str, limit: int = None, exclude_tail: int = 0):
+    """测试集 → (images [N,C,H,W] float32, labels)，与 to_input 的归一化一致；找不到IDX文件时返回None
+
+    exclude_tail 个末尾样本(用于校准)不参与评估。
+    """
+    try:
+        images = load_idx(idx_path(data_root, "t10k-images-idx3-ubyte"))
+        labels = load_idx(idx_path(data_root, "t10k-labels-idx1-ubyte"))
+    except FileNotFoundError:
+        return None
+    available = max(len(labels) - exclude_tail, 0)
+    count = available if limit is None else min(limit, available)
+    images = np.asarray(images[:count], dtype=np.float32) / np.float32(255)
+    return images.reshape(count, *spec["input"]), np.asarray(labels[:count], dtype=np.int64)
+
+
+def load_calib_images(spec: dict, data_root: str, count: int):
+    """int8校准输入 → (images [N,C,H,W] float32, 说明)，找不到IDX文件时返回None
+
+    优先取训练集的前count个样本；没有训练集图片时取测试集的最后count个，评估时排除这些样本。
+    """
+    for name, from_tail in (("train", False), ("t10k", True)):
+        try:
+            images = load_idx(idx_path(data_root, f"{name}-images-idx3-ubyte"))
+        except FileNotFoundError:
+            continue
+        count = min(count, len(images))
+        first = len(images) - count if from_tail else 0
+        batch = np.asarray(images[first:first + count], dtype=np.float32) / np.float32(255)
+        return batch.reshape(count, *spec["input"]), {"set": name, "first": first, "samples": count}
+    return None
+
+
+def evaluate_lowp(spec: dict, arrays: dict, lowp: dict, report: dict, test_set) -> dict:
+    """在测试样本上比较低精度与fp32的top-1准确率，结果记入 report["accuracy"]"""
+    images, labels = test_set
+    fp32_pred, lowp_pred = [], []
+    for start in range(0, len(labels), PREDICT_BATCH):
+        batch = images[start:start + PREDICT_BATCH]
+        fp32_pred.append(predict(spec, arrays, batch, "fp32").argmax(1))
+        lowp_pred.append(predict(spec, lowp, batch, report["precision"]).argmax(1))
+    fp32_pred, lowp_pred = np.concatenate(fp32_pred), np.concatenate(lowp_pred)
+    report["accuracy"] = {"samples": int(len(labels)),
+                          "fp32": float(np.mean(fp32_pred == labels)),
+                          report["precision"]: float(np.mean(lowp_pred == labels)),
+                          "agreement": float(np.mean(fp32_pred == lowp_pred))}
+    return report["accuracy"]
+
+
+def scale_words(scales: dict) -> np.ndarray:
+    """int8缩放系数 → conv_N.int8.scales 的32位字(float32位模式，按SCALE_FIELDS顺序)"""
+    return np.array([scales[name] for name in SCALE_FIELDS], dtype=np.float32).view(np.uint32)
+
+
+def check_scale_contract(layer: dict, entry: dict, words: np.ndarray) -> bool:
+    """按 .scales 中的系数和kernel的输出约定重算该层int8输出，是否与参考输出逐元素一致"""
+    scales = dict(zip(SCALE_FIELDS, as_float(words).tolist()))
+    shape = (layer["out_channels"], layer["in_channels"], layer["kernel"], layer["kernel"])
+    x = entry["input"].reshape(layer["in_channels"], layer["in_h"], layer["in_w"])
+    acc = conv2d(x, entry["weight"].reshape(shape), entry["bias"], layer["stride"], False)
+    return np.array_equal(requantize(acc, scales["requant"], layer["relu"]).reshape(-1), entry["output"])
+
+
+def save_lowp_outputs(spec: dict, arrays: dict, report: dict):
+    """写出同精度参考输出(打包后的32位字)和误差报告"""
+    precision = report["precision"]
+    for i, entry in enumerate(arrays["layers"], 1):
+        path = os.path.join(spec["dir"], f"conv{i}_out.{precision}.txt")
+        save_array_as_hex(path, as_float(pack_words(entry["output"])))
+    path = os.path.join(spec["dir"], f"precision_{precision}.json")
+    with open(path, "w") as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+    print(f"Saved {path}")
+
+
+def print_lowp_report(report: dict):
+    for stats in report["layers"]:
+        print(f"  [{report['precision']}] conv{stats['layer']}: 最大绝对误差 {stats['max_abs_err']:.3g}, "
+              f"相对RMS误差 {stats['rel_rms_err']:.3%}")
+    print(f"  [{report['precision']}] 样本0的最终分类与fp32 {'一致' if report['top1_match'] else '不一致'}")
+    calib = report.get("calibration")
+    if calib:
+        source = ("导出样本" if calib["set"] == "sample0" else
+                  f"{calib['set']} 第 {calib['first']}..{calib['first'] + calib['samples'] - 1} 个样本")
+        print(f"  [{report['precision']}] 激活缩放系数校准: {source}, |x|的 {calib['percentile']:g} 百分位")
+    accuracy = report.get("accuracy")
+    if accuracy:
+        print(f"  [{report['precision']}] 测试集 {accuracy['samples']} 个样本: top-1准确率 "
+              f"{accuracy[report['precision']]:.2%} (fp32 {accuracy['fp32']:.2%})，分类一致率 {accuracy['agreement']:.2%}")
+
+
+# ──────────────────────────────
+# 生成 conv_N.data
+# ──────────────────────────────
+def build_kernel_data(meta_path: str, data_path: str, layer: dict, arrays: dict):
+    """用该层的数据替换.data中对应的buffer，返回 (新数据, 各buffer的大小, [(buffer序号, 角色, 是否改变)])
+
+    arrays 中每个元素一项(fp32为uint32位模式)，按元素的字节数打包，元素小于4字节的buffer大小相应缩小。
+    """
+    meta = Metadata.from_file(meta_path)
+    buffers = meta.buffers
+    segments = split_buffers(buffers, read_hex_words(data_path), data_path)
+    args = kernel_arg_words(meta, segments)
+    if len(args) < len(BUFFER_ARGS) + 8:
+        raise ValueError(f"{meta_path}: 参数buffer只有 {len(args)} 个字，不是conv kernel")
+
+    expected = layer_args(layer)
+    mismatch = [f"{name}={int(value)}(应为{expected[name]})"
+                for name, value in zip(SCALAR_ARGS, args[len(BUFFER_ARGS):]) if int(value) != expected[name]]
+    if mismatch:
+        raise ValueError(f"{meta_path}: kernel参数与层配置不一致: {', '.join(mismatch)}")
+
+    roles = {int(addr): role for addr, role in zip(args[:len(BUFFER_ARGS)], BUFFER_ARGS)}
+    sizes = [size for _, size, _ in buffers]
+    filled = []
+    for i, (base, size, _) in enumerate(buffers):
+        role = roles.get(base)
+        if role is None:
+            continue
+        count = word_count(size)
+        if role == "output":
+            template = arrays["output"]
+            values = np.zeros(count, dtype=template.dtype if template is not None else np.uint32)
+        else:
+            values = arrays[role]
+            if values is None:        # 没有导出上一层输出时保留原内容
+                continue
+            if len(values) != count:
+                raise ValueError(f"{meta_path}: buffer {i} ({role}, 0x{base:x}) 大小 {size} 字节，"
+                                 f"层配置对应 {len(values)} 个数")
+        packed = pack_words(values)
+        if values.dtype.itemsize != 4:
+            sizes[i] = values.nbytes
+        filled.append((i, role, not np.array_equal(segments[i], packed)))
+        segments[i] = packed
+    missing = [role for role in ("weight", "bias") if role not in [r for _, r, _ in filled]]
+    if missing:
+        raise ValueError(f"{meta_path}: .data 中没有 {'/'.join(missing)} buffer")
+    return np.concatenate(segments) if segments else np.zeros(0, dtype=np.uint32), sizes, filled
+
+
+def write_data(path: str, words: np.ndarray):
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, "wb") as f:
+        for start in range(0, len(words), CHUNK_SIZE):
+            f.write(words_to_hex_bytes(words[start:start + CHUNK_SIZE]))
+    os.replace(tmp_path, path)
+
+
+def write_scales(path: str, layer: dict, entry: dict, check: bool = False) -> int:
+    """写出(或检查)int8缩放系数文件，并按kernel的输出约定校验，返回出错数"""
+    words = scale_words(entry["scales"])
+    if check:
+        same = os.path.exists(path) and np.array_equal(read_hex_words(path), words)
+        print(f"{path}: {'一致' if same else '不一致'}")
+        return int(not same)
+    write_data(path, words)
+    if not check_scale_contract(layer, entry, read_hex_words(path)):
+        print(f"错误: {path}: 按缩放系数重算的输出与参考输出不一致")
+        return 1
+    scales = ", ".join(f"{name}={value:.6g}" for name, value in zip(SCALE_FIELDS, as_float(words).tolist()))
+    print(f"{path}: {scales} 已写入，重算输出一致")
+    return 0
+
+
+def metadata_words(meta_path: str, sizes: list) -> np.ndarray:
+    """把.metadata中buffer大小数组换成sizes后的32位字"""
+    meta = Metadata.from_file(meta_path)
+    words = np.array(meta.words, dtype=np.uint32)
+    start = 2 * len(HEADER_FIELDS) + 2 * meta.num_buffer
+    for i, size in enumerate(sizes):
+        words[start + 2 * i] = size & 0xFFFFFFFF
+        words[start + 2 * i + 1] = size >> 32
+    return words
+
+
+def generate_targets(spec: dict, arrays: dict, check: bool = False, precision: str = "fp32") -> int:
+    """为层配置中的每个目标目录、每一层生成 <prefix>_N.data，返回出错/不一致的kernel数
+    低精度时写到 <prefix>_N.<精度>.data/.metadata，原来的文件不变"""
+    suffix = "" if precision == "fp32" else f".{precision}"
+    failures = 0
+    for target in spec["targets"]:
+        for index, layer in enumerate(spec["layers"]):
+            stem = os.path.join(target, f"{spec['kernel_prefix']}_{index}")
+            meta_path, data_path = stem + ".metadata", stem + ".data"
+            if not os.path.exists(meta_path) or not os.path.exists(data_path):
+                print(f"错误: 缺少 {meta_path} 或 {data_path}（代码段和参数buffer取自编译生成的.data）")
+                failures += 1
+                continue
+            try:
+                words, sizes, filled = build_kernel_data(meta_path, data_path, layer, arrays["layers"][index])
+            except ValueError as e:
+                print(f"错误: {e}")
+                failures += 1
+                continue
+            changed = [f"{i}:{role}" for i, role, diff in filled if diff]
+            summary = ", ".join(f"{i}:{role}" for i, role, _ in filled)
+            if suffix:
+                out_meta, out_data = stem + suffix + ".metadata", stem + suffix + ".data"
+                meta_words = metadata_words(meta_path, sizes)
+                if check:
+                    same = (os.path.exists(out_meta) and os.path.exists(out_data)
+                            and np.array_equal(read_hex_words(out_meta), meta_words)
+                            and np.array_equal(read_hex_words(out_data), words))
+                    state = "一致" if same else "不一致"
+                    failures += not same
+                else:
+                    write_data(out_data, words)
+                    write_data(out_meta, meta_words)
+                    state = "已写入"
+                old_bytes = sum(Metadata.from_file(meta_path).buffer_size[i] for i, _, _ in filled)
+                new_bytes = sum(sizes[i] for i, _, _ in filled)
+                print(f"{out_data}: {len(words)} 个字, 填充 [{summary}] {old_bytes} -> {new_bytes} 字节 {state}")
+                if precision == "int8":
+                    failures += write_scales(stem + suffix + SCALE_SUFFIX, layer, arrays["layers"][index], check)
+                continue
+            if check:
+                state = f"不一致 ({', '.join(changed)})" if changed else "一致"
+                failures += bool(changed)
+            else:
+                write_data(data_path, words)
+                state = f"已写入, 变化的buffer: {', '.join(changed) or '无'}"
+            print(f"{data_path}: {len(words)} 个字, 填充 [{summary}] {state}")
+    return failures
+
+
+# ──────────────────────────────
+# 主流程
+# ──────────────────────────────
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="按 layers.json 训练/导出卷积网络并生成 conv_N.data",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python conv_datagen.py                                       # 所有网络、所有目标配置
+  python conv_datagen.py mnist/softdata/mnist_small/data_gen/layers.json --retrain
+  python conv_datagen.py --from-txt --check                    # 检查 .data 是否与 txt 一致
+  python conv_datagen.py --from-txt --precision fp16 int8      # 生成 conv_N.fp16/int8.data 和同精度参考输出
+        """
+    )
+    parser.add_argument("specs", nargs="*", help=f"层配置文件，默认 {os.path.relpath(SPEC_GLOB, SCRIPT_DIR)}")
+    parser.add_argument("--epochs", type=int, help="训练轮数（默认取层配置中的 epochs）")
+    parser.add_argument("--lr", type=float, help="学习率（默认取层配置）")
+    parser.add_argument("--seed", type=int, help="随机种子（默认取层配置）")
+    parser.add_argument("--data-root",
+                        help="MNIST 原始 IDX 文件所在目录（默认 $MNIST_DATA_ROOT 或层配置中的 data_root）")
+    parser.add_argument("--retrain", action="store_true", help="忽略缓存，重新训练并覆盖缓存")
+    parser.add_argument("--from-txt", action="store_true",
+                        help="不训练，直接用 data_gen 下已有的 conv*_weight.txt / test_input.txt 生成")
+    parser.add_argument("--no-txt", action="store_true", help="不导出 conv*_weight.txt 等文本文件")
+    parser.add_argument("--check", action="store_true", help="只与现有 .data 比较，不一致时返回非零")
+    parser.add_argument("--precision", nargs="+", choices=PRECISIONS, default=["fp32"],
+                        help="导出精度，可以同时指定多个（默认 fp32；fp16/int8 写到 conv_N.<精度>.data/.metadata）")
+    parser.add_argument("--eval-samples", type=int,
+                        help="低精度准确率评估使用的测试样本数（默认整个测试集；0 表示不评估）")
+    parser.add_argument("--calib-samples", type=int, default=CALIB_SAMPLES,
+                        help=f"int8激活缩放系数的校准样本数（默认 {CALIB_SAMPLES}，取自训练集，没有时取测试集末尾"
+                             "并在评估中排除；0 表示只按导出样本计算）")
+    parser.add_argument("--calib-percentile", type=float, default=CALIB_PERCENTILE,
+                        help=f"校准时取 |x| 的百分位数作为峰值（默认 {CALIB_PERCENTILE}，100 为最大值）")
+    parser.add_argument("--benchmark", action="store_true", help="只运行 hex 导出的速度对比")
+    args = parser.parse_args(argv)
+
+    if args.benchmark:
+        benchmark_hex_export()
+        return 0
+
+    spec_paths = args.specs or sorted(glob.glob(SPEC_GLOB))
+    if not spec_paths:
+        print(f"错误: 没有找到层配置 {SPEC_GLOB}")
+        return 1
+
+    start_time = time.time()
+    failures = 0
+    for spec_path in spec_paths:
+        spec = load_spec(spec_path)
+        shapes = " -> ".join(f"{l['out_channels']}x{l['out_h']}x{l['out_w']}" for l in spec["layers"])
+        print(f"== {spec['name']}: {'x'.join(map(str, spec['input']))} -> {shapes}")
+        data_root = args.data_root or os.environ.get("MNIST_DATA_ROOT") or spec["data_root"]
+        if args.from_txt:
+            arrays = txt_arrays(spec)
+        else:
+            require_torch()
+            model = load_or_train(spec, args.epochs or spec["epochs"], args.lr or spec["lr"],
+                                  spec["seed"] if args.seed is None else args.seed,
+                                  args.retrain, data_root).eval()
+            evaluate_model(model, data_root)
+            arrays = model_arrays(spec, model, data_root, export_txt=not args.no_txt)
+        for precision in args.precision:
+            if precision == "fp32":
+                failures += generate_targets(spec, arrays, args.check)
+                continue
+            act_scales, calib = None, {"set": "sample0", "samples": 1, "percentile": 100.0}
+            calib_set = None
+            if precision == "int8" and args.calib_samples > 0:
+                calib_set = load_calib_images(spec, data_root, args.calib_samples)
+                if calib_set is None:
+                    print(f"  [{precision}] 找不到校准数据 {data_root}，只按导出样本计算激活缩放系数")
+                else:
+                    calib = dict(calib_set[1], percentile=args.calib_percentile)
+                    act_scales = calibrate_scales(spec, arrays, calib_set[0], args.calib_percentile)
+            lowp, report = lowp_arrays(spec, arrays, precision, act_scales)
+            if precision == "int8":
+                report["calibration"] = calib
+            if args.eval_samples != 0:
+                exclude = calib["samples"] if calib["set"] == "t10k" else 0
+                test_set = load_test_images(spec, data_root, args.eval_samples, exclude)
+                if test_set is None:
+                    print(f"  [{precision}] 找不到测试集 {data_root}，只比较样本0")
+                else:
+                    evaluate_lowp(spec, arrays, lowp, report, test_set)
+            print_lowp_report(report)
+            if not args.check:
+                save_lowp_outputs(spec, lowp, report)
+            failures += generate_targets(spec, lowp, args.check, precision)
+
+    print(f"用时 {time.time() - start_time:.2f} s")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
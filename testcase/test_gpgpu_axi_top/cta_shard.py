@@ -0,0 +1,351 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把一个kernel的CTA按编号切成多段，每段在独立的simv进程中并行仿真，再合并结果
+CTA总数取自.metadata的 kernel_size_x*y*z，第k段通过 +CTA_KERNEL/+CTA_FIRST/+CTA_COUNT 传给
+host_inter.sv 的 exe_finish，只启动该段的CTA(编号按x最快变化，wg_id与完整运行时相同)。
+
+每段的结果取自日志中被分片kernel(第k个 "exe finish!" 之前)的 lsu.w 记录:
+  标量 "lsu.w x N op M <数据> @ <基址>+<偏移>"，向量 "lsu.w vN op M mask <位> <数据...> @ <地址...>"
+op 为访存宽度(0/1/2 → 1/2/4字节)。各段写过的字节必须互不相交，否则报告冲突并返回1；
+合并后的写入以spike json格式输出(未写的字节取自.data的初始内容)，可以用 --golden 与 ref_model.py 的结果比较。
+周期数取各段的 "Single kernel need"，报告各段之和(单进程等效)与最大值(并行关键路径)。
+host_inter打印的CTA总数("of N")必须与这里的CTA总数一致，否则说明tc.v启动的CTA数与metadata不符，该段判为失败。
+
+每段都会完整仿真 --kernel 之前的所有kernel(用于建立内存状态)，只有被分片的kernel按CTA切分，
+因此加速只作用于被分片的kernel，前面kernel的仿真时间在每段中重复出现。
+
+每段在用例目录同一层的 .shard.<用例>.<段号> 中运行，链接用例目录中已编译的simv和输入文件。
+
+用法:
+  python cta_shard.py mnist softdata/mnist/conv_0.metadata -n 8            # 先在mnist下编译好simv
+  python cta_shard.py mnist softdata/mnist/conv_1.metadata --kernel 1 -n 4 -o /tmp/conv_1.shard.json
+  python cta_shard.py tc_vecadd softdata/4x8/vecadd_0.metadata -n 2 --sim-cmd "python3 /tmp/stub_simv.py"
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shlex
+import shutil
+import argparse
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metadata2md import Metadata
+from ref_model import DeviceMemory, Launch
+from spike_dump import SpikeDump, ENTRY_DTYPE, RANGE_DTYPE, BINARY_SUFFIX, split_runs
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+SHARD_PREFIX = ".shard."
+# 每段运行时生成的文件，不链接到分片目录(simv和simv.daidir需要链接)
+GENERATED_RE = re.compile(r'^(csrc|verdiLog|ucli.*|DVEfiles|AN\.DB|novas.*|.*\.fsdb|.*\.log|.*\.key|shard\.out)$')
+DEFAULT_SIM_CMD = "./simv -l simv.log"
+CHUNK_SIZE = 16 << 20
+STORE_WIDTHS = {0: 1, 1: 2, 2: 4}
+RECORD_RE = re.compile(
+    rb"lsu\.w x\s*\d+ op\s*(?P<op>\d+) (?P<data>[0-9a-fA-F]+) @ (?P<base>[0-9a-fA-F]+)\+(?P<offset>[0-9a-fA-F]+)"
+    rb"|lsu\.w v\s*\d+ op\s*(?P<vop>\d+) mask (?P<mask>[01]+) (?P<vdata>[0-9a-fA-F ]+?) @(?P<vaddr>[0-9a-fA-F ]+)"
+    rb"|(?P<exe>exe finish!)"
+    rb"|Single kernel need :\s*(?P<cycles>\d+) cycles"
+    rb"|CTA shard: kernel (?P<skernel>\d+), CTA (?P<sfirst>\d+)\.\.(?P<slast>-?\d+) of (?P<stotal>\d+)")
+
+
+# ──────────────────────────────
+# 分片
+# ──────────────────────────────
+def plan_shards(total, shards):
+    """[0, total) 均匀切成最多shards段，返回 [(起始CTA, CTA数)]"""
+    shards = max(1, min(shards, total))
+    bounds = [total * i // shards for i in range(shards + 1)]
+    return [(bounds[i], bounds[i + 1] - bounds[i]) for i in range(shards)]
+
+
+def prepare_shard_dir(testcase, index):
+    """创建分片目录，链接用例目录中的simv和输入文件"""
+    src_dir = os.path.join(SCRIPT_DIR, testcase)
+    workdir = os.path.join(SCRIPT_DIR, f"{SHARD_PREFIX}{testcase}.{index}")
+    if os.path.exists(workdir):
+        shutil.rmtree(workdir)
+    os.makedirs(workdir)
+    for name in os.listdir(src_dir):
+        if not GENERATED_RE.match(name):
+            os.symlink(os.path.join("..", testcase, name), os.path.join(workdir, name))
+    return workdir
+
+
+def run_shard(shard, sim_cmd, kernel, timeout=None):
+    """运行一段，返回 (返回码, 日志路径, 用时)"""
+    cmd = shlex.split(sim_cmd) + [f"+CTA_KERNEL={kernel}", f"+CTA_FIRST={shard['first']}",
+                                  f"+CTA_COUNT={shard['count']}"]
+    out_path = os.path.join(shard['workdir'], "shard.out")
+    start_time = time.time()
+    with open(out_path, 'w') as f:
+        f.write(f"$ {' '.join(cmd)}\n")
+        f.flush()
+        try:
+            ret = subprocess.run(cmd, cwd=shard['workdir'], stdout=f, stderr=subprocess.STDOUT,
+                                 timeout=timeout).returncode
+        except subprocess.TimeoutExpired:
+            ret = -1
+            f.write(f"\n超时: {timeout} s\n")
+    sim_log = os.path.join(shard['workdir'], "simv.log")
+    return ret, sim_log if os.path.exists(sim_log) else out_path, time.time() - start_time
+
+
+# ──────────────────────────────
+# 日志
+# ──────────────────────────────
+def scan_records(path, chunk_size=CHUNK_SIZE):
+    """按块读取日志，按顺序产生匹配的记录"""
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                block, tail = tail, b""
+            else:
+                block = tail + chunk
+                cut = block.rfind(b"\n") + 1
+                block, tail = block[:cut], block[cut:]
+            yield from RECORD_RE.finditer(block)
+            if not chunk:
+                break
+
+
+def parse_shard_log(path, kernel):
+    """第kernel个kernel期间的写入 (地址, 宽度, 数据) 数组、该kernel的周期数和日志中的分片范围
+
+    分片范围为 (kernel, 起始CTA, CTA数, CTA总数)，日志中没有时为None。
+    """
+    addrs, widths, values = [], [], []
+    exe_count = 0
+    cycles = []
+    shard_range = None
+    for m in scan_records(path):
+        if m.group("exe") is not None:
+            exe_count += 1
+        elif m.group("cycles") is not None:
+            cycles.append(int(m.group("cycles")))
+        elif m.group("skernel") is not None:
+            shard_range = (int(m.group("skernel")), int(m.group("sfirst")),
+                           int(m.group("slast")) - int(m.group("sfirst")) + 1, int(m.group("stotal")))
+        elif exe_count != kernel:
+            continue
+        elif m.group("op") is not None:
+            addrs.append((int(m.group("base"), 16) + int(m.group("offset"), 16)) & 0xFFFFFFFF)
+            widths.append(STORE_WIDTHS.get(int(m.group("op")), 4))
+            values.append(int(m.group("data"), 16) & 0xFFFFFFFF)
+        else:
+            # 掩码、数据、地址都按高lane在前打印
+            width = STORE_WIDTHS.get(int(m.group("vop")), 4)
+            lanes = zip(m.group("mask").decode(), m.group("vdata").split(), m.group("vaddr").split())
+            for bit, data, addr in lanes:
+                if bit == "1":
+                    addrs.append(int(addr, 16))
+                    widths.append(width)
+                    values.append(int(data, 16) & 0xFFFFFFFF)
+    writes = (np.array(addrs, dtype=np.int64), np.array(widths, dtype=np.int64), np.array(values, dtype=np.uint32))
+    return writes, (cycles[kernel] if kernel < len(cycles) else None), shard_range
+
+
+def write_bytes(writes):
+    """(地址, 宽度, 数据) → 按地址排序的 (字节地址, 字节值)，同一字节以最后一次写入为准"""
+    addrs, widths, values = writes
+    if not len(addrs):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.uint8)
+    lane = np.concatenate([np.arange(w) for w in widths])
+    byte_addrs = np.repeat(addrs, widths) + lane
+    byte_values = ((np.repeat(values, widths) >> (8 * lane).astype(np.uint32)) & 0xFF).astype(np.uint8)
+    # 反转后 np.unique 取到的是每个地址最后一次写入
+    byte_addrs, index = np.unique(byte_addrs[::-1], return_index=True)
+    return byte_addrs, byte_values[::-1][index]
+
+
+def find_overlaps(shards, limit=10):
+    """各段写过的字节两两相交的情况，返回 [(段a, 段b, 相交字节数, 第一个地址)]"""
+    owners = np.concatenate([np.full(len(s['bytes'][0]), s['index']) for s in shards])
+    addrs = np.concatenate([s['bytes'][0] for s in shards])
+    order = np.argsort(addrs, kind="stable")
+    addrs, owners = addrs[order], owners[order]
+    same = np.flatnonzero((addrs[1:] == addrs[:-1]) & (owners[1:] != owners[:-1]))
+    pairs = {}
+    for i in same.tolist():
+        key = (int(min(owners[i], owners[i + 1])), int(max(owners[i], owners[i + 1])))
+        count, first = pairs.get(key, (0, int(addrs[i])))
+        pairs[key] = (count + 1, first)
+    return sorted((a, b, count, first) for (a, b), (count, first) in pairs.items())[:limit]
+
+
+def merge_image(shards, initial=None):
+    """所有段写过的字节合并为32位字的SpikeDump，字内未写的字节取初始内存(没有时为0)"""
+    addrs = np.concatenate([s['bytes'][0] for s in shards])
+    values = np.concatenate([s['bytes'][1] for s in shards])
+    words = np.unique(addrs & ~3)
+    image = np.zeros((len(words), 4), dtype=np.uint8)
+    if initial is not None:
+        for i, word in enumerate(words.tolist()):
+            try:
+                image[i] = initial.array(word, np.uint8, 4)
+            except ValueError:
+                pass
+    image[np.searchsorted(words, addrs & ~3), addrs & 3] = values
+    payload = image.reshape(-1).view("<u4")
+    starts = split_runs(words.astype(np.uint64))
+    stops = np.append(starts[1:], len(words))
+    entries = np.zeros(len(starts), dtype=ENTRY_DTYPE)
+    ranges = np.zeros(len(starts), dtype=RANGE_DTYPE)
+    for i, (start, stop) in enumerate(zip(starts.tolist(), stops.tolist())):
+        entries[i] = (int(words[start]), 4 * (stop - start))
+        ranges[i] = (int(words[start]), stop - start, i)
+    return SpikeDump(entries, ranges, payload)
+
+
+def compare_golden(merged, golden_path):
+    """合并结果与golden逐字比较，返回 (比较字数, 不一致字数, 第一个不一致地址)"""
+    addrs, expected = merged.items()
+    golden, found = SpikeDump.open(golden_path).lookup(addrs)
+    bad = np.flatnonzero(found & (golden != expected))
+    return int(found.sum()), len(bad), (int(addrs[bad[0]]) if len(bad) else None)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="按CTA编号把一个kernel切成多段并行仿真，合并各段的写入和周期数",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python cta_shard.py mnist softdata/mnist/conv_0.metadata -n 8 -j 4
+  python cta_shard.py mnist softdata/mnist/conv_1.metadata --kernel 1 -n 4 -o /tmp/conv_1.shard.json
+  python cta_shard.py tc_vecadd softdata/4x8/vecadd_0.metadata -n 2 --golden softdata/4x8/vecadd_0.ref.json
+  python cta_shard.py tc_vecadd softdata/4x8/vecadd_0.metadata -n 2 --sim-cmd "python3 /tmp/stub_simv.py"
+  python cta_shard.py --clean
+用例目录中需要先编译好对应配置的simv (例如 make run-mnist 或 simv_cache.py)。
+每段都会完整仿真 --kernel 之前的所有kernel，加速只作用于被分片的kernel。
+        """
+    )
+    parser.add_argument('testcase', nargs='?', help='用例目录名(与本脚本同一层，如 mnist、tc_vecadd)')
+    parser.add_argument('metadata', nargs='?', help='被分片kernel的.metadata(相对用例目录)')
+    parser.add_argument('-n', '--shards', type=int, default=os.cpu_count() or 1, help='分片数，默认CPU核数')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='同时运行的simv数，默认CPU核数')
+    parser.add_argument('--kernel', type=int, default=0, help='被分片的是tc.v中第几次exe_finish(从0开始，默认0)；之前的kernel在每段中都完整仿真')
+    parser.add_argument('--ctas', type=int, help='CTA总数，默认 kernel_size_x*y*z，须与host_inter打印的总数一致')
+    parser.add_argument('--sim-cmd', default=DEFAULT_SIM_CMD, help=f'在分片目录中运行的命令(默认 "{DEFAULT_SIM_CMD}")')
+    parser.add_argument('--timeout', type=float, help='每段的超时时间(秒)')
+    parser.add_argument('-o', '--output', help='合并后的写入(spike json，.bin结尾时为二进制格式)')
+    parser.add_argument('--golden', help='与合并结果逐字比较的golden(spike json/.bin，如 ref_model.py 的输出)')
+    parser.add_argument('--report', help='JSON报告，默认 <用例>/cta_shard.json')
+    parser.add_argument('--clean', action='store_true', help='删除所有分片目录后退出')
+
+    args = parser.parse_args()
+    if args.clean:
+        for name in os.listdir(SCRIPT_DIR):
+            if name.startswith(SHARD_PREFIX):
+                shutil.rmtree(os.path.join(SCRIPT_DIR, name))
+                print(f"已删除: {name}")
+        return 0
+    if not args.testcase or not args.metadata:
+        parser.error("需要用例目录和.metadata")
+
+    testcase_dir = os.path.join(SCRIPT_DIR, args.testcase)
+    meta_path = os.path.join(testcase_dir, args.metadata)
+    data_path = meta_path[:-len(".metadata")] + ".data"
+    try:
+        meta = Metadata.from_file(meta_path)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+    total = args.ctas or meta.kernel_size_x * meta.kernel_size_y * meta.kernel_size_z
+    if args.sim_cmd == DEFAULT_SIM_CMD and not os.path.exists(os.path.join(testcase_dir, "simv")):
+        print(f"警告: {testcase_dir} 中没有simv，请先编译对应配置")
+
+    shards = [{'index': i, 'first': first, 'count': count}
+              for i, (first, count) in enumerate(plan_shards(total, args.shards))]
+    print(f"{args.testcase}/{args.metadata}: {total} 个CTA "
+          f"({meta.kernel_size_x}x{meta.kernel_size_y}x{meta.kernel_size_z}), kernel {args.kernel}, "
+          f"{len(shards)} 段, 并发 {max(1, args.jobs)}")
+    for shard in shards:
+        shard['workdir'] = prepare_shard_dir(args.testcase, shard['index'])
+
+    def work(shard):
+        ret, log_path, elapsed = run_shard(shard, args.sim_cmd, args.kernel, args.timeout)
+        writes, cycles, logged = parse_shard_log(log_path, args.kernel)
+        shard.update(returncode=ret, log=log_path, seconds=round(elapsed, 2), cycles=cycles,
+                     stores=len(writes[0]), bytes=write_bytes(writes))
+        if logged is not None and logged[:3] != (args.kernel, shard['first'], shard['count']):
+            shard['message'] = f"日志中的分片范围 (kernel, 起始, 数量) {logged[:3]} 与请求的不一致"
+        elif logged is not None and logged[3] != total:
+            shard['message'] = f"host_inter启动的CTA总数 {logged[3]} 与 {total} 不一致(tc.v传给exe_finish的数量与metadata不符)"
+        elif ret != 0:
+            shard['message'] = f"返回码 {ret}"
+        elif cycles is None:
+            shard['message'] = f"日志中没有第 {args.kernel} 个kernel的周期数"
+        status = "失败" if 'message' in shard else "完成"
+        print(f"[{status}] 段 {shard['index']}: CTA {shard['first']}..{shard['first'] + shard['count'] - 1}, "
+              f"{cycles} 周期, {shard['stores']} 次写, {len(shard['bytes'][0])} 字节, {elapsed:.1f} s"
+              + (f" ({shard['message']})" if 'message' in shard else ""), flush=True)
+        return shard
+
+    start_time = time.time()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.jobs)) as pool:
+            list(pool.map(work, shards))
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+    wall_time = time.time() - start_time
+
+    failed = [s for s in shards if 'message' in s]
+    overlaps = find_overlaps(shards)
+    for a, b, count, first in overlaps:
+        print(f"冲突: 段 {a} 与段 {b} 写了 {count} 个相同字节，第一个 0x{first:08x}")
+
+    initial = None
+    if os.path.exists(data_path):
+        launch = Launch(meta_path, data_path)
+        initial = DeviceMemory()
+        initial.load(launch.buffers, launch.segments)
+    merged = merge_image(shards, initial)
+    if args.output:
+        if args.output.endswith(BINARY_SUFFIX):
+            merged.write_binary(args.output)
+        else:
+            merged.write_json(args.output)
+    golden = compare_golden(merged, args.golden) if args.golden else None
+
+    cycles = [s['cycles'] for s in shards if s['cycles'] is not None]
+    report = {
+        'testcase': args.testcase, 'metadata': args.metadata, 'kernel': args.kernel, 'ctas': total,
+        'wall_time': round(wall_time, 2),
+        # 每段都重新仿真了前面的kernel，加速只作用于被分片的kernel
+        'resimulated_kernels': args.kernel,
+        'cycles_sum': sum(cycles), 'cycles_max': max(cycles) if cycles else None,
+        'written_words': merged.word_count, 'output': args.output,
+        'overlaps': [{'shards': [a, b], 'bytes': count, 'first': f"0x{first:08x}"} for a, b, count, first in overlaps],
+        'golden': None if golden is None else {'path': args.golden, 'compared': golden[0], 'mismatched': golden[1]},
+        'shards': [{k: v for k, v in s.items() if k != 'bytes'} | {'bytes': len(s['bytes'][0])} for s in shards],
+    }
+    report_path = args.report or os.path.join(testcase_dir, "cta_shard.json")
+    with open(report_path, 'w') as f:
+        json.dump(report, f, indent=2, ensure_ascii=False)
+
+    print("\n" + "=" * 60)
+    print(f"周期数: 各段之和 {report['cycles_sum']}, 最大 {report['cycles_max']} ({len(cycles)}/{len(shards)} 段)")
+    if args.kernel:
+        print(f"注意: 每段都完整仿真了前面的 {args.kernel} 个kernel，用时和加速只对被分片的kernel有意义")
+    print(f"合并写入: {merged.word_count} 个字" + (f" -> {args.output}" if args.output else ""))
+    if golden is not None:
+        print(f"golden: 比较 {golden[0]} 个字, 不一致 {golden[1]} 个"
+              + (f"，第一个 0x{golden[2]:08x}" if golden[2] is not None else ""))
+    print(f"总用时 {wall_time:.1f} s, 失败 {len(failed)} 段, 冲突 {len(overlaps)} 处, 报告: {report_path}")
+    return 1 if failed or overlaps or (golden is not None and golden[1]) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试用的假vcs: 不编译也不仿真，按环境变量模拟License失败、普通失败或成功，用于在没有VCS的机器上
+检查 regression.py 的调度、重试和汇总。命令行与vcs相同，只识别 -l <日志>。
+
+环境变量:
+  FAKE_VCS_LICENSE_FAILURES=N   前N次调用输出License失败信息并返回1 (调用次数记录在当前目录的 .fake_vcs_calls)
+  FAKE_VCS_FAIL=1               License获取成功后按编译错误失败
+  FAKE_VCS_CYCLES=N             成功时日志中的周期数，默认100
+
+用法:
+  python regression.py -t tc_vecadd -c 8w4t --vcs "python3 ../fake_vcs.py"
+  FAKE_VCS_LICENSE_FAILURES=2 python regression.py -t tc_vecadd -c 8w4t --vcs "python3 ../fake_vcs.py" --backoff-base 0.1
+"""
+
+import os
+import sys
+
+
+CALLS_FILE = ".fake_vcs_calls"
+LICENSE_MESSAGE = "Error: Failed to obtain VCS license (Licensed number of users already reached)\n"
+
+
+def count_call():
+    """当前目录下的调用次数加1并返回"""
+    calls = 0
+    if os.path.exists(CALLS_FILE):
+        with open(CALLS_FILE, 'r') as f:
+            calls = int(f.read().strip() or 0)
+    calls += 1
+    with open(CALLS_FILE, 'w') as f:
+        f.write(f"{calls}\n")
+    return calls
+
+
+def main():
+    """主函数"""
+    args = sys.argv[1:]
+    log_path = args[args.index("-l") + 1] if "-l" in args[:-1] else None
+    calls = count_call()
+    if calls <= int(os.environ.get("FAKE_VCS_LICENSE_FAILURES", "0")):
+        text = LICENSE_MESSAGE
+        ret = 1
+    elif os.environ.get("FAKE_VCS_FAIL"):
+        text = "Error-[SE] Syntax error\n  fake_vcs: FAKE_VCS_FAIL is set\n"
+        ret = 1
+    else:
+        cycles = int(os.environ.get("FAKE_VCS_CYCLES", "100"))
+        text = (f"Config finish!  time: 1000\nexe finish!     time: {1000 + 10 * cycles}\n"
+                f"Single kernel need : {cycles} cycles\n")
+        ret = 0
+    sys.stdout.write(text)
+    if log_path:
+        with open(log_path, 'w') as f:
+            f.write(text)
+    return ret
+
+
+if __name__ == "__main__":
+    sys.exit(main())
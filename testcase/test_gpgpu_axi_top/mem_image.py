@@ -0,0 +1,298 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+根据.metadata/.data生成axi_ram的$readmemh内存镜像
+按tc.v中init_mem的buffer布局(基址、大小按4字节对齐、16拍INCR burst、l%2选择64位字的高低32位)
+把数据预先打包成mem[addr][63:0]格式，仿真时加上 +BACKDOOR_MEM 即可零时间预加载，跳过AXI burst写入。
+
+$readmemh只能整字写入，而burst路径按wstrb只写64位字的一半、另一半保持原值。
+buffer末尾只写了一半的字，另一半取自按参数顺序在它之前加载的kernel镜像
+(axi_ram初始值为0)，因此同一个用例的多个kernel要一次传入、按运行顺序排列。
+
+用法:
+  python mem_image.py mnist/softdata/mnist/conv_0.metadata
+  python mem_image.py mnist/softdata/mnist                    # 目录下所有kernel
+  python mem_image.py mnist/softdata/mnist --merge all.mem    # 额外生成合并镜像
+"""
+
+import os
+import sys
+import glob
+import time
+import argparse
+
+import numpy as np
+
+from metadata2md import Metadata
+
+
+AXI_DATA_BYTES = 8      # axi_ram DATA_WIDTH = 64
+AXI_ADDR_WIDTH = 32     # axi_ram ADDR_WIDTH = 32
+BEAT_BYTES = 4          # awsize = 2
+BURST_BEATS = 16        # awlen = 15
+INDEX_MASK = (1 << (AXI_ADDR_WIDTH - 3)) - 1
+IMAGE_SUFFIX = ".mem"
+
+
+def read_hex_words(path):
+    """读取$readmemh格式的32位十六进制文件，返回uint32数组"""
+    words = []
+    with open(path, 'r') as f:
+        for line in f:
+            line = line.split("//", 1)[0].strip()
+            if not line:
+                continue
+            for token in line.split():
+                if token.startswith("@"):
+                    raise ValueError(f"{path}: 不支持带地址的readmemh文件")
+                words.append(int(token.replace("_", ""), 16))
+    return np.array(words, dtype=np.uint32)
+
+
+def word_count(size):
+    """buffer大小按4字节向上对齐后的32位字数"""
+    return (size + BEAT_BYTES - 1) // BEAT_BYTES
+
+
+def split_buffers(buffers, data, path):
+    """按metadata中的buffer顺序把.data切成每个buffer一段(大小按4字节向上对齐)"""
+    segments = []
+    offset = 0
+    for base, size, _ in buffers:
+        count = word_count(size)
+        if offset + count > len(data):
+            raise ValueError(f"{path}: 数据不足, buffer 0x{base:x} 需要 {count} 个字，剩余 {len(data) - offset} 个")
+        segments.append(data[offset:offset + count])
+        offset += count
+    if offset != len(data):
+        raise ValueError(f"{path}: 有 {len(data) - offset} 个字不属于任何buffer")
+    return segments
+
+
+def kernel_arg_words(meta, segments):
+    """kernel元数据块(基址为metaDataBaseAddr)的第0个字是入口PC，第1个字是参数buffer基址"""
+    bases = [base for base, _, _ in meta.buffers]
+    if meta.metaDataBaseAddr not in bases:
+        raise ValueError(f"找不到kernel元数据块 0x{meta.metaDataBaseAddr:x}")
+    block = segments[bases.index(meta.metaDataBaseAddr)]
+    args_base = int(block[1])
+    if args_base not in bases:
+        raise ValueError(f"找不到参数buffer 0x{args_base:x}")
+    return segments[bases.index(args_base)]
+
+
+def pack_kernel(buffers, data):
+    """按burst路径计算每个32位数据落到的 (mem下标, 高低位)
+
+    返回 (index数组, lane数组, 数据数组)，顺序与init_mem写入顺序一致。
+    """
+    indexes, lanes, values = [], [], []
+    offset = 0
+    for base, size, _ in buffers:
+        count = word_count(size)
+        if offset + count > len(data):
+            raise ValueError(f"数据不足: buffer 0x{base:x} 需要 {count} 个字，剩余 {len(data) - offset} 个")
+        beat = np.arange(count, dtype=np.uint64)
+        # 第k次burst起始地址为 base+64*k，第l拍地址为起始地址+4*l，写入lane为 l%2
+        addr = np.uint64(base) + (beat // BURST_BEATS) * np.uint64(BURST_BEATS * BEAT_BYTES) \
+            + (beat % BURST_BEATS) * np.uint64(BEAT_BYTES)
+        indexes.append((addr >> np.uint64(3)) & np.uint64(INDEX_MASK))
+        lanes.append((beat % BURST_BEATS) % 2)
+        values.append(data[offset:offset + count])
+        offset += count
+    if not indexes:
+        empty = np.zeros(0, dtype=np.uint64)
+        return empty, empty, np.zeros(0, dtype=np.uint32)
+    return np.concatenate(indexes), np.concatenate(lanes), np.concatenate(values)
+
+
+def build_image(indexes, lanes, values, image=None):
+    """把 (下标, 高低位, 数据) 合成 {mem下标: [低32位, 高32位]}，后写入的覆盖先写入的"""
+    if image is None:
+        image = {}
+    for index, lane, value in zip(indexes.tolist(), lanes.tolist(), values.tolist()):
+        word = image.get(index)
+        if word is None:
+            word = image[index] = [None, None]
+        word[lane] = value
+    return image
+
+
+def burst_reference(buffers, data):
+    """逐拍复现tc.v中init_mem的写入过程，用于校验打包结果"""
+    mem = {}
+    m = 0
+    for base, size, _ in buffers:
+        burst_len = word_count(size)
+        burst_len_mod = burst_len % BURST_BEATS
+        burst_times = burst_len // BURST_BEATS + (1 if burst_len_mod else 0)
+        addr = base
+        for k in range(burst_times):
+            addr = base if k == 0 else addr + BURST_BEATS * BEAT_BYTES
+            beats = BURST_BEATS if (burst_len_mod == 0 or k < burst_times - 1) else burst_len_mod
+            write_addr = addr
+            for l in range(beats):
+                # axi_ram按写地址选择mem下标，按wstrb选择高低32位
+                word = mem.setdefault((write_addr >> 3) & INDEX_MASK, [None, None])
+                word[l % 2] = int(data[m])
+                write_addr += BEAT_BYTES
+                m += 1
+    return mem
+
+
+def check_layout(buffers, image, data):
+    """与burst路径逐拍结果比较，并检查基址对齐和部分写入的64位字"""
+    problems = []
+    reference = burst_reference(buffers, data)
+    if reference != image:
+        diff = sorted(set(reference) ^ set(image)) or \
+            sorted(i for i in reference if reference[i] != image.get(i))
+        problems.append(f"与burst路径不一致: {len(diff)} 个字, 首个下标 0x{diff[0]:x}")
+    for base, size, _ in buffers:
+        if size and base % AXI_DATA_BYTES:
+            problems.append(f"buffer 0x{base:x} 不是8字节对齐, burst路径按拍序号选择高低位, "
+                            f"数据会写到 0x{base - BEAT_BYTES:x} 起的地址")
+    for i, (base_a, size_a, _) in enumerate(buffers):
+        for j in range(i + 1, len(buffers)):
+            base_b, size_b, _ = buffers[j]
+            if size_a and size_b and base_a < base_b + size_b and base_b < base_a + size_a:
+                problems.append(f"buffer {i} 与 buffer {j} 地址重叠 (0x{base_a:x}/0x{base_b:x}), 以后写入的 {j} 为准")
+    return problems
+
+
+def overlay_image(state, image):
+    """把image叠加到state上(原地修改state)，image中未写入的32位保留state中的值"""
+    for index, word in image.items():
+        old = state.get(index, [None, None])
+        state[index] = [word[0] if word[0] is not None else old[0],
+                        word[1] if word[1] is not None else old[1]]
+    return state
+
+
+def format_word(word, previous=None):
+    """64位字格式化为16位十六进制
+
+    未写入的32位取previous(之前加载的镜像)中同一位置的值，都没有时为axi_ram的初始值0。
+    """
+    previous = previous or (None, None)
+    low = word[0] if word[0] is not None else (previous[0] or 0)
+    high = word[1] if word[1] is not None else (previous[1] or 0)
+    return f"{(high << 32) | low:016x}"
+
+
+def write_image(image, path, previous=None):
+    """写$readmemh镜像，连续的下标只在开头写一次@地址
+
+    返回 (只写了一半的字数, 其中从previous补齐另一半的字数)。
+    """
+    previous = previous or {}
+    partial = 0
+    merged = 0
+    last = None
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        for index in sorted(image):
+            word = image[index]
+            old = previous.get(index)
+            if None in word:
+                partial += 1
+                if old is not None and any(old[lane] is not None for lane in (0, 1) if word[lane] is None):
+                    merged += 1
+            if last is None or index != last + 1:
+                f.write(f"@{index:x}\n")
+            f.write(format_word(word, old) + "\n")
+            last = index
+    os.replace(tmp_path, path)
+    return partial, merged
+
+
+def kernel_files(paths):
+    """展开输入参数为 (metadata, data) 文件对列表，目录按文件名排序"""
+    pairs = []
+    for path in paths:
+        metas = sorted(glob.glob(os.path.join(path, "*.metadata"))) if os.path.isdir(path) else [path]
+        for meta in metas:
+            data = meta[:-len(".metadata")] + ".data" if meta.endswith(".metadata") else meta + ".data"
+            pairs.append((meta, data))
+    return pairs
+
+
+def convert_kernel(meta_path, data_path, output_dir=None, check=True, previous=None):
+    """为单个kernel生成镜像，返回 (镜像, buffer列表, 问题列表)
+
+    previous为之前加载的kernel叠加后的镜像，用于补齐只写了一半的64位字。
+    """
+    buffers = Metadata.from_file(meta_path).buffers
+    data = read_hex_words(data_path)
+    indexes, lanes, values = pack_kernel(buffers, data)
+    image = build_image(indexes, lanes, values)
+    problems = check_layout(buffers, image, data) if check else []
+
+    out_path = data_path + IMAGE_SUFFIX
+    if output_dir:
+        out_path = os.path.join(output_dir, os.path.basename(out_path))
+    partial, merged = write_image(image, out_path, previous)
+
+    bursts = sum((word_count(size) + BURST_BEATS - 1) // BURST_BEATS for _, size, _ in buffers)
+    print(f"{meta_path}: {len(buffers)} 个buffer, {len(values)} 个32位数据, {bursts} 次burst "
+          f"-> {len(image)} 个64位字 ({out_path})")
+    if partial:
+        print(f"  注意: {partial} 个64位字只写了一半，另一半按burst路径保留原值: "
+              f"{merged} 个取自之前加载的kernel, {partial - merged} 个为初始值0")
+    return image, buffers, problems
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="生成axi_ram的64位$readmemh内存镜像，用于 +BACKDOOR_MEM 零时间预加载",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python mem_image.py tc_vecadd/softdata/8w4t/vecadd_0.metadata
+  python mem_image.py mnist/softdata/mnist
+  python mem_image.py mnist/softdata/mnist --merge mnist_all.mem
+仿真时: make run-mnist SIM_ARGS=+BACKDOOR_MEM 或在vcs命令后加 +BACKDOOR_MEM
+        """
+    )
+    parser.add_argument('paths', nargs='+',
+                        help='.metadata文件或包含.metadata/.data的目录，按kernel运行顺序给出(半字从之前的kernel补齐)')
+    parser.add_argument('-o', '--output-dir', help='镜像输出目录，默认与.data文件相同(文件名为 <data>.mem)')
+    parser.add_argument('--merge', help='额外生成所有kernel按顺序叠加后的合并镜像')
+    parser.add_argument('--no-check', action='store_true', help='跳过与burst路径的逐拍校验')
+
+    args = parser.parse_args()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start_time = time.time()
+    # 按参数顺序叠加的内存状态，既用于补齐半字也用于--merge
+    merged = {}
+    owners = {}
+    failed = False
+    for meta_path, data_path in kernel_files(args.paths):
+        if not os.path.exists(data_path):
+            print(f"错误: 找不到数据文件 {data_path}")
+            failed = True
+            continue
+        image, buffers, problems = convert_kernel(meta_path, data_path, args.output_dir, not args.no_check,
+                                                  merged)
+        for problem in problems:
+            print(f"  校验: {problem}")
+        failed = failed or any(p.startswith("与burst路径不一致") for p in problems)
+        if args.merge:
+            overlap = [i for i in image if i in owners and merged[i] != image[i]]
+            if overlap:
+                print(f"  注意: 与 {owners[overlap[0]]} 有 {len(overlap)} 个字内容不同，合并镜像中以后者为准")
+            owners.update((index, os.path.basename(meta_path)) for index in image)
+        overlay_image(merged, image)
+
+    if args.merge:
+        write_image(merged, args.merge)
+        print(f"合并镜像: {len(merged)} 个64位字 -> {args.merge}")
+    print(f"用时 {time.time() - start_time:.2f} s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
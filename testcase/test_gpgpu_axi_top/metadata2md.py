@@ -1,233 +1,318 @@
 #!/usr/bin/env python3
 """
 此脚本用于将Ventus GPGPU的metadata文件转换为人类可读的Markdown格式
-用法: python metadata_to_md.py <metadata文件路径>
+用法: python metadata2md.py <metadata文件路径>
+      python metadata2md.py --recursive [目录]   # 批量处理目录下所有*.metadata，并生成汇总索引
 """
 
 import sys
 import os
-import struct
+import json
+import hashlib
+import argparse
+from array import array
+from concurrent.futures import ProcessPoolExecutor
 
 
-def hex_to_bytes(hex_str):
-    """将十六进制字符串转换为字节数"""
-    value = int(hex_str, 16)
+# 批量模式的默认根目录(testcase/)和增量缓存文件
+DEFAULT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_FILE = ".metadata2md_cache.json"
+INDEX_NAME = "metadata_index"
+
+# metadata头部的64位字段，按顺序各占两行(低32位在前)
+HEADER_FIELDS = (
+    "start_addr", "kernel_id", "kernel_size_x", "kernel_size_y", "kernel_size_z",
+    "wf_size", "wg_size", "metaDataBaseAddr", "ldsSize", "pdsSize",
+    "sgprUsage", "vgprUsage", "pdsBaseAddr", "num_buffer",
+)
+
+
+class Metadata:
+    """metadata文件模型
+
+    只保存原始32位字数组，字段按需解码。第k个64位字段为 {metadata[2k+1], metadata[2k]}，
+    与host_inter.sv和tc.v中的拼接方式一致。
+    """
+
+    __slots__ = ("words",)
+
+    def __init__(self, words):
+        self.words = array("I", words)
+
+    @classmethod
+    def from_file(cls, file_path):
+        """从readmemh格式的文件读取，每行一个32位十六进制字"""
+        words = array("I")
+        with open(file_path, 'r') as file:
+            for line in file:
+                line = line.split("//", 1)[0].strip()
+                if line:
+                    words.extend(int(token, 16) for token in line.split())
+        return cls(words)
+
+    def read_uint64(self, index):
+        """读取从第index个32位字开始的64位值，超出文件长度的部分按0处理"""
+        low = self.words[index] if index < len(self.words) else 0
+        high = self.words[index + 1] if index + 1 < len(self.words) else 0
+        return (high << 32) | low
+
+    def _buffer_field(self, group):
+        """读取第group组buffer数组(0: 基址, 1: 大小, 2: 分配大小)"""
+        n = self.num_buffer
+        return [self.read_uint64(2 * len(HEADER_FIELDS) + 2 * (group * n + i)) for i in range(n)]
+
+    @property
+    def buffer_base(self):
+        return self._buffer_field(0)
+
+    @property
+    def buffer_size(self):
+        return self._buffer_field(1)
+
+    @property
+    def buffer_allocsize(self):
+        return self._buffer_field(2)
+
+    @property
+    def buffers(self):
+        """[(基址, 大小, 分配大小), ...]"""
+        return list(zip(self.buffer_base, self.buffer_size, self.buffer_allocsize))
+
+    def to_dict(self):
+        """转换为可序列化的字典"""
+        result = {name: getattr(self, name) for name in HEADER_FIELDS}
+        result["buffers"] = [{"base": base, "size": size, "allocsize": allocsize}
+                             for base, size, allocsize in self.buffers]
+        return result
+
+
+def _header_property(index):
+    return property(lambda self: self.read_uint64(2 * index))
+
+
+for _index, _name in enumerate(HEADER_FIELDS):
+    setattr(Metadata, _name, _header_property(_index))
+
+
+def hex_to_bytes(value):
+    """将字节数转换为带单位的字符串"""
     if value == 0:
         return "0 B"
-    
+
     # 转换为适当的单位
     units = ["B", "KB", "MB", "GB"]
     unit_index = 0
-    
+    original_bytes = value
+
     while value >= 1024 and unit_index < len(units) - 1:
         value /= 1024
         unit_index += 1
-    
+
     # 对于KB及以上的单位，保留小数点后两位
     if unit_index == 0:
         return f"{int(value)} {units[unit_index]}"
     else:
         # 同时保留原始字节数
-        original_bytes = int(hex_str, 16)
         return f"{value:.2f} {units[unit_index]} ({original_bytes:,} B)"
 
 
-def read_uint64(lines, index):
-    """从两行文本中读取一个uint64_t值"""
-    if index + 1 >= len(lines):
-        return "0", 0
-    
-    high = lines[index].strip()
-    low = lines[index + 1].strip()
-    
-    # 合并高32位和低32位
-    value = high
-    
-    return value, 2  # 返回值和消耗的行数
-
-
 def read_metadata(file_path):
     """读取metadata文件并解析"""
     try:
-        with open(file_path, 'r') as file:
-            lines = [line.strip() for line in file if line.strip()]
-        
-        # 提取基本信息
-        index = 0
-        
-        start_addr, offset = read_uint64(lines, index)
-        index += offset
-        
-        kernel_id, offset = read_uint64(lines, index)
-        index += offset
-        
-        kernel_size_x, offset = read_uint64(lines, index)
-        index += offset
-        
-        kernel_size_y, offset = read_uint64(lines, index)
-        index += offset
-        
-        kernel_size_z, offset = read_uint64(lines, index)
-        index += offset
-        
-        wf_size, offset = read_uint64(lines, index)
-        index += offset
-        
-        wg_size, offset = read_uint64(lines, index)
-        index += offset
-        
-        metaDataBaseAddr, offset = read_uint64(lines, index)
-        index += offset
-        
-        ldsSize, offset = read_uint64(lines, index)
-        index += offset
-        
-        pdsSize, offset = read_uint64(lines, index)
-        index += offset
-        
-        sgprUsage, offset = read_uint64(lines, index)
-        index += offset
-        
-        vgprUsage, offset = read_uint64(lines, index)
-        index += offset
-        
-        pdsBaseAddr, offset = read_uint64(lines, index)
-        index += offset
-        
-        num_buffer_str, offset = read_uint64(lines, index)
-        index += offset
-        num_buffer = int(num_buffer_str, 16)
-        
-        # 提取缓冲区信息
-        buffer_base = []
-        buffer_size = []
-        buffer_allocsize = []
-        
-        # 读取buffer_base
-        for i in range(num_buffer):
-            base, offset = read_uint64(lines, index)
-            buffer_base.append(base)
-            index += offset
-        
-        # 读取buffer_size
-        for i in range(num_buffer):
-            size, offset = read_uint64(lines, index)
-            buffer_size.append(size)
-            index += offset
-        
-        # 读取buffer_allocsize
-        for i in range(num_buffer):
-            allocsize, offset = read_uint64(lines, index)
-            buffer_allocsize.append(allocsize)
-            index += offset
-        
-        metadata = {
-            "start_addr": start_addr,
-            "kernel_id": kernel_id,
-            "kernel_size_x": kernel_size_x,
-            "kernel_size_y": kernel_size_y,
-            "kernel_size_z": kernel_size_z,
-            "wf_size": wf_size,
-            "wg_size": wg_size,
-            "metaDataBaseAddr": metaDataBaseAddr,
-            "ldsSize": ldsSize,
-            "pdsSize": pdsSize,
-            "sgprUsage": sgprUsage,
-            "vgprUsage": vgprUsage,
-            "pdsBaseAddr": pdsBaseAddr,
-            "num_buffer": num_buffer,
-            "buffer_base": buffer_base,
-            "buffer_size": buffer_size,
-            "buffer_allocsize": buffer_allocsize
-        }
-        
-        return metadata
-    
+        return Metadata.from_file(file_path)
     except Exception as e:
         print(f"Error reading metadata file: {e}")
         sys.exit(1)
 
 
+def format_markdown(metadata, base_name):
+    """生成Markdown文本"""
+    lines = []
+    # 标题
+    lines.append(f"# `{base_name}` 文件解析\n")
+
+    # 基本内核信息
+    lines.append("## 基本内核信息")
+    lines.append(f"- **指令起始地址**: 0x{metadata.start_addr:08x}")
+    lines.append(f"- **内核ID**: 0x{metadata.kernel_id:08x}")
+    lines.append("- **线程块维度**:")
+    lines.append(f"  - X维度: {metadata.kernel_size_x}")
+    lines.append(f"  - Y维度: {metadata.kernel_size_y}")
+    lines.append(f"  - Z维度: {metadata.kernel_size_z}")
+    lines.append(f"- **每warp线程数**: {metadata.wf_size}")
+    lines.append(f"- **每个线程块的warp数**: {metadata.wg_size}\n")
+
+    # 内存配置
+    lines.append("## 内存配置")
+    lines.append(f"- **元数据基址(CSR_KNL值)**: 0x{metadata.metaDataBaseAddr:08x}")
+    lines.append(f"- **每线程块share memory大小**: {hex_to_bytes(metadata.ldsSize)}")
+    lines.append(f"- **每线程private memory大小**: {hex_to_bytes(metadata.pdsSize)}\n")
+
+    # 寄存器使用
+    lines.append("## 寄存器使用")
+    lines.append(f"- **每warp标量寄存器使用**: {metadata.sgprUsage}")
+    lines.append(f"- **每warp向量寄存器使用**: {metadata.vgprUsage}\n")
+
+    # Private Memory配置
+    lines.append("## Private Memory配置")
+    lines.append(f"- **内核private memory基址**: 0x{metadata.pdsBaseAddr:08x}\n")
+
+    # Buffer信息
+    lines.append("## Buffer信息")
+    lines.append(f"- **Buffer数量**: {metadata.num_buffer}\n")
+
+    # 创建Buffer表格
+    lines.append("| Buffer Index | 基址 (Hex) | 初始化数据大小 | 实际分配大小 |")
+    lines.append("|---|---|---|---|")
+    for i, (base, size, allocsize) in enumerate(metadata.buffers):
+        lines.append(f"| {i} | 0x{base:08x} | {hex_to_bytes(size)} | {hex_to_bytes(allocsize)} |")
+    return "\n".join(lines) + "\n"
+
+
 def generate_markdown(metadata, output_path):
     """生成Markdown文件"""
     try:
+        base_name = os.path.basename(output_path).replace('.md', '')
         with open(output_path, 'w') as md_file:
-            # 标题
-            base_name = os.path.basename(output_path).replace('.md', '')
-            md_file.write(f"# `{base_name}` 文件解析\n\n")
-            
-            # 基本内核信息
-            md_file.write("## 基本内核信息\n")
-            md_file.write(f"- **指令起始地址**: 0x{metadata['start_addr']}\n")
-            md_file.write(f"- **内核ID**: 0x{metadata['kernel_id']}\n")
-            md_file.write("- **线程块维度**:\n")
-            md_file.write(f"  - X维度: {int(metadata['kernel_size_x'], 16)}\n")
-            md_file.write(f"  - Y维度: {int(metadata['kernel_size_y'], 16)}\n")
-            md_file.write(f"  - Z维度: {int(metadata['kernel_size_z'], 16)}\n")
-            md_file.write(f"- **每warp线程数**: {int(metadata['wf_size'], 16)}\n")
-            md_file.write(f"- **每个线程块的warp数**: {int(metadata['wg_size'], 16)}\n\n")
-            
-            # 内存配置
-            md_file.write("## 内存配置\n")
-            md_file.write(f"- **元数据基址(CSR_KNL值)**: 0x{metadata['metaDataBaseAddr']}\n")
-            lds_size_bytes = hex_to_bytes(metadata['ldsSize'])
-            md_file.write(f"- **每线程块share memory大小**: {lds_size_bytes}\n")
-            pds_size_bytes = hex_to_bytes(metadata['pdsSize'])
-            md_file.write(f"- **每线程private memory大小**: {pds_size_bytes}\n\n")
-            
-            # 寄存器使用
-            md_file.write("## 寄存器使用\n")
-            md_file.write(f"- **每warp标量寄存器使用**: {int(metadata['sgprUsage'], 16)}\n")
-            md_file.write(f"- **每warp向量寄存器使用**: {int(metadata['vgprUsage'], 16)}\n\n")
-            
-            # Private Memory配置
-            md_file.write("## Private Memory配置\n")
-            md_file.write(f"- **内核private memory基址**: 0x{metadata['pdsBaseAddr']}\n\n")
-            
-            # Buffer信息
-            md_file.write("## Buffer信息\n")
-            md_file.write(f"- **Buffer数量**: {metadata['num_buffer']}\n\n")
-            
-            # 创建Buffer表格
-            md_file.write("| Buffer Index | 基址 (Hex) | 初始化数据大小 | 实际分配大小 |\n")
-            md_file.write("|---|---|---|---|\n")
-            
-            for i in range(metadata['num_buffer']):
-                base = metadata['buffer_base'][i]
-                size = metadata['buffer_size'][i]
-                allocsize = metadata['buffer_allocsize'][i]
-                
-                size_bytes = hex_to_bytes(size)
-                allocsize_bytes = hex_to_bytes(allocsize)
-                
-                md_file.write(f"| {i} | 0x{base} | {size_bytes} | {allocsize_bytes} |\n")
-            
-            print(f"成功生成Markdown文件: {output_path}")
-    
+            md_file.write(format_markdown(metadata, base_name))
+        print(f"成功生成Markdown文件: {output_path}")
+
     except Exception as e:
         print(f"Error generating Markdown file: {e}")
         sys.exit(1)
 
 
+def hash_file(path):
+    """计算文件内容的sha256"""
+    with open(path, 'rb') as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def convert_file(path):
+    """进程池任务: 解析单个metadata文件并写出.md，返回汇总信息"""
+    metadata = Metadata.from_file(path)
+    output_path = path + ".md"
+    with open(output_path, 'w') as md_file:
+        md_file.write(format_markdown(metadata, os.path.basename(path)))
+    return metadata.to_dict()
+
+
+def load_cache(cache_path):
+    """读取批量模式的增量缓存 {相对路径: {mtime_ns, size, sha256, summary}}"""
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_json(data, path):
+    """原子地写入json文件"""
+    tmp_path = path + ".tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def write_index(root, entries):
+    """写汇总索引: 所有kernel的启动维度和buffer"""
+    save_json(entries, os.path.join(root, INDEX_NAME + ".json"))
+
+    lines = ["# metadata 汇总索引\n",
+             "| 文件 | 起始地址 | 维度 (x,y,z) | warp数 | 线程数 | LDS | Buffer数 | 初始化数据 |",
+             "|---|---|---|---|---|---|---|---|"]
+    for rel_path in sorted(entries):
+        m = entries[rel_path]
+        data_size = sum(b["size"] for b in m["buffers"])
+        lines.append(f"| [{rel_path}]({rel_path}.md) | 0x{m['start_addr']:08x} | "
+                     f"({m['kernel_size_x']},{m['kernel_size_y']},{m['kernel_size_z']}) | "
+                     f"{m['wg_size']} | {m['wf_size']} | {hex_to_bytes(m['ldsSize'])} | "
+                     f"{m['num_buffer']} | {hex_to_bytes(data_size)} |")
+
+    lines.append("\n## Buffer明细\n")
+    for rel_path in sorted(entries):
+        lines.append(f"### {rel_path}\n")
+        lines.append("| Buffer Index | 基址 (Hex) | 初始化数据大小 | 实际分配大小 |")
+        lines.append("|---|---|---|---|")
+        for i, b in enumerate(entries[rel_path]["buffers"]):
+            lines.append(f"| {i} | 0x{b['base']:08x} | {hex_to_bytes(b['size'])} | {hex_to_bytes(b['allocsize'])} |")
+        lines.append("")
+    with open(os.path.join(root, INDEX_NAME + ".md"), 'w') as f:
+        f.write("\n".join(lines))
+
+
+def convert_tree(root, jobs=None, force=False):
+    """批量模式: 处理root下所有*.metadata，跳过内容未变化的文件"""
+    paths = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith("."))
+        paths.extend(os.path.join(dirpath, f) for f in sorted(filenames) if f.endswith(".metadata"))
+
+    cache_path = os.path.join(root, CACHE_FILE)
+    cache = {} if force else load_cache(cache_path)
+    new_cache = {}
+    todo = []
+    for path in paths:
+        rel_path = os.path.relpath(path, root)
+        st = os.stat(path)
+        entry = cache.get(rel_path)
+        if entry and os.path.exists(path + ".md"):
+            # mtime和大小都没变直接跳过，否则再比较内容哈希
+            if entry["mtime_ns"] == st.st_mtime_ns and entry["size"] == st.st_size:
+                new_cache[rel_path] = entry
+                continue
+            digest = hash_file(path)
+            if entry["sha256"] == digest:
+                new_cache[rel_path] = dict(entry, mtime_ns=st.st_mtime_ns, size=st.st_size)
+                continue
+        todo.append((path, rel_path, st))
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            for (path, rel_path, st), summary in zip(todo, pool.map(convert_file, [t[0] for t in todo])):
+                new_cache[rel_path] = {"mtime_ns": st.st_mtime_ns, "size": st.st_size,
+                                       "sha256": hash_file(path), "summary": summary}
+
+    save_json(new_cache, cache_path)
+    write_index(root, {rel_path: entry["summary"] for rel_path, entry in new_cache.items()})
+    print(f"共 {len(paths)} 个metadata文件, 重新生成 {len(todo)} 个, 跳过 {len(paths) - len(todo)} 个")
+    print(f"汇总索引: {os.path.join(root, INDEX_NAME)}.json / .md")
+
+
 def main():
-    if len(sys.argv) != 2:
-        print("Usage: python metadata_to_md.py <metadata_file_path>")
+    parser = argparse.ArgumentParser(description="将metadata文件转换为Markdown格式")
+    parser.add_argument('path', nargs='?', help='metadata文件路径；--recursive时为目录，默认testcase/')
+    parser.add_argument('-r', '--recursive', action='store_true', help='批量处理目录下所有*.metadata')
+    parser.add_argument('-j', '--jobs', type=int, help='批量模式的进程数，默认CPU核数')
+    parser.add_argument('--force', action='store_true', help='批量模式下忽略缓存，全部重新生成')
+    args = parser.parse_args()
+
+    if args.recursive:
+        root = args.path or DEFAULT_ROOT
+        if not os.path.isdir(root):
+            print(f"Error: Directory '{root}' does not exist.")
+            sys.exit(1)
+        convert_tree(root, args.jobs, args.force)
+        return
+
+    if not args.path:
+        print("Usage: python metadata2md.py <metadata_file_path>")
         sys.exit(1)
-    
-    metadata_path = sys.argv[1]
+
+    metadata_path = args.path
     if not os.path.exists(metadata_path):
         print(f"Error: File '{metadata_path}' does not exist.")
         sys.exit(1)
-    
+
     # 生成输出文件路径
     output_path = metadata_path + ".md"
-    
+
     # 读取并解析metadata
     metadata = read_metadata(metadata_path)
-    
+
     # 生成Markdown文件
     generate_markdown(metadata, output_path)
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,336 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+内置测试用例(vecadd/matadd/gaussian/bfs/nn)的NumPy参考模型，不经过spike直接生成期望的结果内存
+按tc.v中init_mem的方式把每个kernel的.data按buffer写入设备内存，从kernel元数据块取NDRange、
+从参数buffer取指针和标量参数，对整个NDRange做向量化计算，输出被kernel写过的buffer。
+
+同一目录下的多个kernel(如 Fan1_0, Fan2_0, Fan1_1 ... 或 BFS_1_0, BFS_2_0 ...)按 tc.v 的启动顺序
+(编号, 名字)共享同一份设备内存依次执行: 后面的kernel通常只带参数buffer，输入来自前一个kernel的结果。
+
+kernel元数据块: 字0 入口PC，字1 参数buffer基址，字2 work_dim，字3~5 全局大小，字6~8 工作组大小。
+浮点乘加按 vfmadd 的单次舍入用float64计算后舍入到float32，sqrt/除法与spike可能相差1 ULP，
+比较时可以用 check_result.py --ulp。
+
+输出为spike导出的json格式(<data>.ref.json，.bin结尾时为 spike_dump.py 的二进制格式)，可直接作为 check_result.py 的golden。
+
+用法:
+  python ref_model.py tc_vecadd/softdata/8w4t/vecadd_0.metadata     # -> vecadd_0.ref.json
+  python ref_model.py tc_gaussian/softdata/4x8                       # 按顺序执行 Fan1_0..Fan2_3
+  python ref_model.py tc_bfs/softdata/4x8 --merge /tmp/bfs_4x8.ref.json --no-per-kernel
+"""
+
+import os
+import re
+import sys
+import time
+import argparse
+
+import numpy as np
+
+from metadata2md import Metadata
+from mem_image import read_hex_words, split_buffers, kernel_arg_words, kernel_files
+from spike_dump import SpikeDump, ENTRY_DTYPE, RANGE_DTYPE, BINARY_SUFFIX
+
+
+REF_SUFFIX = ".ref.json"
+LAUNCH_RE = re.compile(r"^(?P<name>.+?)(?:_(?P<index>\d+))?$")
+
+
+# ──────────────────────────────
+# 设备内存
+# ──────────────────────────────
+class DeviceMemory:
+    """按buffer保存的设备内存，base -> uint8数组(大小按4字节向上对齐)"""
+
+    def __init__(self):
+        self.buffers = {}
+
+    def load(self, buffers, segments):
+        """与init_mem相同: 每个kernel的buffer整体覆盖写入"""
+        for (base, size, _), words in zip(buffers, segments):
+            if size:
+                self.buffers[base] = np.array(words, dtype="<u4").view(np.uint8)
+
+    def find(self, addr):
+        for base, data in self.buffers.items():
+            if base <= addr < base + len(data):
+                return base, data
+        raise ValueError(f"地址 0x{addr:08x} 不在任何已加载的buffer中")
+
+    def array(self, addr, dtype, count=None):
+        """从addr开始的可写视图，count为None时到buffer结尾"""
+        base, data = self.find(addr)
+        dtype = np.dtype(dtype)
+        offset = addr - base
+        available = (len(data) - offset) // dtype.itemsize
+        if count is None:
+            count = available
+        if count > available:
+            raise ValueError(f"0x{addr:08x} 起需要 {count} 个 {dtype}，buffer 0x{base:08x} 只剩 {available} 个")
+        return data[offset:offset + count * dtype.itemsize].view(dtype)
+
+    def dump(self, bases):
+        """指定buffer的当前内容 → SpikeDump"""
+        bases = sorted(bases)
+        entries = np.zeros(len(bases), dtype=ENTRY_DTYPE)
+        ranges = np.zeros(len(bases), dtype=RANGE_DTYPE)
+        for i, base in enumerate(bases):
+            data = self.buffers[base]
+            entries[i] = (base, len(data))
+            ranges[i] = (base, len(data) // 4, i)
+        payload = np.concatenate([self.buffers[b].view("<u4") for b in bases]) if bases else np.zeros(0, "<u4")
+        return SpikeDump(entries, ranges, payload)
+
+
+class Launch:
+    """一次kernel启动: NDRange和按参数顺序排列的参数字"""
+
+    def __init__(self, meta_path, data_path):
+        self.meta = Metadata.from_file(meta_path)
+        self.buffers = self.meta.buffers
+        self.segments = split_buffers(self.buffers, read_hex_words(data_path), data_path)
+        bases = [base for base, _, _ in self.buffers]
+        block = self.segments[bases.index(self.meta.metaDataBaseAddr)]
+        self.work_dim = int(block[2])
+        self.global_size = tuple(int(v) for v in block[3:6])
+        self.local_size = tuple(int(v) for v in block[6:9])
+        self.args = kernel_arg_words(self.meta, self.segments)
+
+    def ptr(self, i):
+        return int(self.args[i])
+
+    def arg_int(self, i):
+        return int(self.args[i:i + 1].view(np.int32)[0])
+
+    def arg_float(self, i):
+        return self.args[i:i + 1].view(np.float32)[0]
+
+
+def fma(a, b, c):
+    """float32 a*b+c 只舍入一次(与vfmadd一致)
+
+    float32的乘积在float64中是精确的；float64的加法按round-to-odd修正后再舍入到float32，
+    避免两次舍入带来的1 ULP误差。
+    """
+    product = np.asarray(a, dtype=np.float64) * np.asarray(b, dtype=np.float64)
+    c = np.asarray(c, dtype=np.float64)
+    total = product + c
+    # TwoSum: error 为加法的精确舍入误差
+    back = total - product
+    error = (product - (total - back)) + (c - back)
+    inexact = (error != 0) & (total.view(np.int64) & 1 == 0)
+    total = np.where(inexact, np.nextafter(total, np.where(error > 0, np.inf, -np.inf)), total)
+    return total.astype(np.float32)
+
+
+# ──────────────────────────────
+# kernel模型: 返回写过的指针
+# ──────────────────────────────
+def vecadd(mem, launch):
+    """c[gid] = a[gid] + b[gid]"""
+    n = launch.global_size[0]
+    a, b, c = (mem.array(launch.ptr(i), np.float32, n) for i in range(3))
+    c[:] = a + b
+    return [launch.ptr(2)]
+
+
+def matadd(mem, launch):
+    """c = a + b，逐元素，覆盖整个二维NDRange"""
+    n = int(np.prod(launch.global_size[:launch.work_dim]))
+    a, b, c = (mem.array(launch.ptr(i), np.float32, n) for i in range(3))
+    c[:] = a + b
+    return [launch.ptr(2)]
+
+
+def fan1(mem, launch):
+    """m[size*(gid+t+1)+t] = a[size*(gid+t+1)+t] / a[size*t+t]，gid < size-1-t"""
+    size, t = launch.arg_int(3), launch.arg_int(4)
+    m = mem.array(launch.ptr(0), np.float32, size * size)
+    a = mem.array(launch.ptr(1), np.float32, size * size)
+    rows = np.arange(min(launch.global_size[0], size - 1 - t)) + t + 1
+    m[size * rows + t] = a[size * rows + t] / a[size * t + t]
+    return [launch.ptr(0)]
+
+
+def fan2(mem, launch):
+    """a[x+1+t][y+t] -= m[x+1+t][t] * a[t][y+t]，y == 0 时 b[x+1+t] -= m[x+1+t][t] * b[t]"""
+    size, t = launch.arg_int(3), launch.arg_int(4)
+    m = mem.array(launch.ptr(0), np.float32, size * size).reshape(size, size)
+    a = mem.array(launch.ptr(1), np.float32, size * size).reshape(size, size)
+    b = mem.array(launch.ptr(2), np.float32, size)
+    rows = np.arange(min(launch.global_size[0], size - 1 - t)) + t + 1
+    cols = np.arange(min(launch.global_size[1], size - t)) + t
+    factor = -m[rows, t]
+    # 第t行不会被写，各工作项之间没有依赖
+    a[np.ix_(rows, cols)] = fma(factor[:, None], a[t, cols][None, :], a[np.ix_(rows, cols)])
+    if len(cols):
+        b[rows] = fma(factor, b[t], b[rows])
+    return [launch.ptr(1), launch.ptr(2)]
+
+
+def bfs_1(mem, launch):
+    """展开当前前沿: 未访问的邻居 cost = cost[tid]+1，updating_mask置1"""
+    n = min(launch.arg_int(6), launch.global_size[0])
+    nodes = mem.array(launch.ptr(0), np.int32, 2 * n).reshape(n, 2)
+    mask = mem.array(launch.ptr(2), np.uint8, n)
+    updating = mem.array(launch.ptr(3), np.uint8)
+    visited = mem.array(launch.ptr(4), np.uint8)
+    cost = mem.array(launch.ptr(5), np.int32)
+    frontier = np.flatnonzero(mask)
+    starts, counts = nodes[frontier, 0], nodes[frontier, 1]
+    total = int(counts.sum())
+    # 每条边的下标: 各节点的起点按边数重复，再加上节点内的偏移
+    first = np.repeat(starts - np.concatenate([[0], np.cumsum(counts)[:-1]]), counts)
+    edges = mem.array(launch.ptr(1), np.int32)[first + np.arange(total)] if total else np.zeros(0, np.int32)
+    sources = np.repeat(frontier, counts)
+    fresh = visited[edges] == 0
+    cost[edges[fresh]] = cost[sources[fresh]] + 1
+    updating[edges[fresh]] = 1
+    mask[frontier] = 0
+    return [launch.ptr(i) for i in (2, 3, 5)]
+
+
+def bfs_2(mem, launch):
+    """updating_mask中的节点成为新的前沿并标记为已访问，有新节点时 over = 1"""
+    n = min(launch.arg_int(4), launch.global_size[0])
+    mask, updating, visited = (mem.array(launch.ptr(i), np.uint8, n) for i in range(3))
+    over = mem.array(launch.ptr(3), np.uint8, 1)
+    selected = updating != 0
+    mask[selected] = 1
+    visited[selected] = 1
+    updating[selected] = 0
+    if selected.any():
+        over[0] = 1
+    return [launch.ptr(i) for i in range(4)]
+
+
+def nearest_neighbor(mem, launch):
+    """dist[gid] = sqrt((lat - loc.lat)^2 + (lng - loc.lng)^2)，gid < numRecords"""
+    n = min(launch.arg_int(2), launch.global_size[0])
+    locations = mem.array(launch.ptr(0), np.float32, 2 * n).reshape(n, 2)
+    distances = mem.array(launch.ptr(1), np.float32, n)
+    dlat = launch.arg_float(3) - locations[:, 0]
+    dlng = launch.arg_float(4) - locations[:, 1]
+    distances[:] = np.sqrt(fma(dlat, dlat, dlng * dlng))
+    return [launch.ptr(1)]
+
+
+KERNELS = {
+    "vecadd": vecadd,
+    "matadd": matadd,
+    "Fan1": fan1,
+    "Fan2": fan2,
+    "BFS_1": bfs_1,
+    "BFS_2": bfs_2,
+    "NearestNeighbor": nearest_neighbor,
+}
+
+
+def kernel_name(meta_path):
+    """文件名 → (kernel名, 启动编号)，如 BFS_1_3 → ("BFS_1", 3)，没有编号的排在最前面"""
+    stem = os.path.basename(meta_path)[:-len(".metadata")] if meta_path.endswith(".metadata") \
+        else os.path.basename(meta_path)
+    if stem in KERNELS:
+        return stem, -1
+    m = LAUNCH_RE.match(stem)
+    return m.group("name"), int(m.group("index")) if m.group("index") is not None else -1
+
+
+def launch_order(pairs):
+    """按 (编号, kernel名) 排序，与tc.v中 Fan1_0, Fan2_0, Fan1_1 ... 的启动顺序一致"""
+    return sorted(pairs, key=lambda pair: kernel_name(pair[0])[::-1])
+
+
+def write_dump(dump, path):
+    if path.endswith(BINARY_SUFFIX):
+        dump.write_binary(path)
+    else:
+        dump.write_json(path)
+
+
+def run_sequence(pairs, kernel=None, per_kernel=True, output_dir=None):
+    """在同一份设备内存上依次执行，返回 (设备内存, 所有写过的buffer基址)"""
+    mem = DeviceMemory()
+    written = set()
+    for meta_path, data_path in pairs:
+        start_time = time.time()
+        name = kernel or kernel_name(meta_path)[0]
+        if name not in KERNELS:
+            raise ValueError(f"{meta_path}: 没有kernel {name} 的参考模型 (可用: {', '.join(KERNELS)})")
+        launch = Launch(meta_path, data_path)
+        mem.load(launch.buffers, launch.segments)
+        bases = sorted({mem.find(ptr)[0] for ptr in KERNELS[name](mem, launch)})
+        written.update(bases)
+        message = (f"{meta_path}: {name} 全局大小 {'x'.join(map(str, launch.global_size[:launch.work_dim]))}, "
+                   f"写 {len(bases)} 个buffer ({', '.join(f'0x{b:08x}' for b in bases)})")
+        if per_kernel:
+            out_path = data_path[:-len(".data")] + REF_SUFFIX if data_path.endswith(".data") else data_path + REF_SUFFIX
+            if output_dir:
+                out_path = os.path.join(output_dir, os.path.basename(out_path))
+            write_dump(mem.dump(bases), out_path)
+            message += f" -> {out_path}"
+        print(f"{message} ({(time.time() - start_time) * 1000:.1f} ms)")
+    return mem, written
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="用NumPy参考模型执行vecadd/matadd/gaussian/bfs/nn kernel，生成期望的结果内存(spike json格式)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python ref_model.py tc_vecadd/softdata/8w4t/vecadd_0.metadata
+  python ref_model.py tc_gaussian/softdata/4x8 -o /tmp/gaussian_4x8
+  python ref_model.py tc_bfs/softdata/4x8 --merge /tmp/bfs_4x8.ref.json --no-per-kernel
+  python check_result.py tc_vecadd/simv.log tc_vecadd/softdata/8w4t/vecadd_0.ref.json
+同一目录的kernel按 (编号, 名字) 顺序在同一份设备内存上执行；多个目录各自独立。
+        """
+    )
+    parser.add_argument('paths', nargs='+', help='.metadata文件或包含.metadata/.data的目录')
+    parser.add_argument('-o', '--output-dir', help='输出目录，默认与.data文件相同(文件名为 <data>.ref.json)')
+    parser.add_argument('--merge', help='额外输出整个序列结束后所有写过的buffer (.bin结尾时为二进制格式)')
+    parser.add_argument('--no-per-kernel', action='store_true', help='不输出每个kernel的结果文件')
+    parser.add_argument('--kernel', choices=sorted(KERNELS), help='指定kernel，默认由文件名推断')
+
+    args = parser.parse_args()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    start_time = time.time()
+    # 目录内的kernel组成一个序列，单独给出的文件按参数顺序组成一个序列
+    sequences, files = [], []
+    for path in args.paths:
+        if not os.path.exists(path):
+            print(f"错误: 找不到 {path}")
+            return 2
+        if os.path.isdir(path):
+            sequences.append(launch_order(kernel_files([path])))
+        else:
+            files.extend(kernel_files([path]))
+    if files:
+        sequences.append(files)
+
+    merged = {}
+    try:
+        for pairs in sequences:
+            if not pairs:
+                continue
+            mem, written = run_sequence(pairs, args.kernel, not args.no_per_kernel, args.output_dir)
+            merged.update((base, mem.buffers[base]) for base in written)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+
+    if args.merge:
+        mem = DeviceMemory()
+        mem.buffers = merged
+        write_dump(mem.dump(merged), args.merge)
+        print(f"合并结果: {len(merged)} 个buffer -> {args.merge}")
+    print(f"用时 {time.time() - start_time:.2f} s")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+回归测试调度器
+按 测试用例 × 配置 矩阵并行运行仿真，每个任务使用独立的临时目录(不共享simv/csrc)，
+并发数同时受CPU核数和License数量限制，License失败时按带抖动的指数退避重试，
+最后输出JSON和JUnit格式的汇总。
+
+用法:
+  python regression.py                                   # 默认矩阵
+  python regression.py -t tc_vecadd,tc_bfs -c 8w4t,4w8t --licenses 2
+  python regression.py -t mnist --targets run-mnist-tiny
+  python regression.py --in-place run-vcs-8w4t            # 在当前用例目录重试单个目标
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import argparse
+import threading
+import subprocess
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+
+import bench_db
+
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_TESTCASES = ["tc_vecadd", "tc_matadd", "tc_gaussian", "tc_bfs", "tc_nn", "mnist"]
+DEFAULT_CONFIGS = ["8w4t", "4w8t", "4w16t", "4w32t", "1w8t"]
+# 临时目录和用例目录在同一层，保证Makefile和run.f中的 ../common、../../../src 等相对路径有效
+SCRATCH_PREFIX = ".regress."
+# 仿真生成的文件，不链接到临时目录
+GENERATED_RE = re.compile(r'^(simv.*|csrc|verdiLog|ucli.*|DVEfiles|AN\.DB|novas.*|.*\.fsdb|.*\.log|.*\.key|\.fake_vcs_calls)$')
+MAKE_TARGET_RE = re.compile(r'^([A-Za-z0-9_.-]+)\s*:(?!=)', re.M)
+# VCS/FlexLM 的License失败信息
+LICENSE_ERROR_RE = re.compile(
+    r'Failed to obtain .*license|Unable to checkout|cannot checkout|'
+    r'Licensed number of users already reached|license server .*(down|not responding)|'
+    r'license.*(not available|unavailable|denied|exceeded)', re.I)
+
+print_lock = threading.Lock()
+
+
+def log(message):
+    """多线程安全的打印"""
+    with print_lock:
+        print(message, flush=True)
+
+
+def make_targets(testcase_dir):
+    """读取用例Makefile中定义的目标"""
+    makefile = os.path.join(testcase_dir, "Makefile")
+    if not os.path.exists(makefile):
+        return set()
+    with open(makefile, 'r', errors='replace') as f:
+        return set(MAKE_TARGET_RE.findall(f.read()))
+
+
+def build_matrix(testcases, configs, targets):
+    """生成任务列表，Makefile中没有的目标标记为跳过"""
+    jobs = []
+    for testcase in testcases:
+        available = make_targets(os.path.join(SCRIPT_DIR, testcase))
+        names = targets if targets else [f"run-vcs-{cfg}" for cfg in configs]
+        for target in names:
+            jobs.append({
+                'testcase': testcase,
+                'target': target,
+                'config': target[len("run-vcs-"):] if target.startswith("run-vcs-") else target,
+                'skip': target not in available,
+            })
+    return jobs
+
+
+def prepare_scratch(testcase, target):
+    """创建任务的临时目录，链接用例目录中的输入文件"""
+    src_dir = os.path.join(SCRIPT_DIR, testcase)
+    scratch = os.path.join(SCRIPT_DIR, f"{SCRATCH_PREFIX}{testcase}.{target}")
+    if os.path.exists(scratch):
+        shutil.rmtree(scratch)
+    os.makedirs(scratch)
+    for name in os.listdir(src_dir):
+        if not GENERATED_RE.match(name):
+            os.symlink(os.path.join("..", testcase, name), os.path.join(scratch, name))
+    return scratch
+
+
+def is_license_error(text):
+    """判断输出中是否包含License失败信息"""
+    return LICENSE_ERROR_RE.search(text) is not None
+
+
+def backoff_delay(attempt, base, cap):
+    """带抖动的指数退避: 在 [0, min(cap, base*2^attempt)] 中均匀取值"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class Scheduler:
+    """执行任务矩阵，License令牌用信号量控制"""
+
+    def __init__(self, licenses, max_retries, backoff_base, backoff_max, timeout, make_vars, bench_path=None):
+        self.license_tokens = threading.BoundedSemaphore(licenses)
+        self.bench_path = bench_path
+        # 所有任务使用同一份硬件代码，哈希只算一次
+        self.bench_hw = bench_db.hw_tree_hash(bench_db.DEFAULT_HW) if bench_path else None
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.timeout = timeout
+        self.make_vars = make_vars
+
+    def attempt(self, workdir, target, log_path, attempt):
+        """运行一次make目标，返回 (返回码, 本次输出)"""
+        sim_log = os.path.join(workdir, "simv.log")
+        if os.path.exists(sim_log):
+            os.remove(sim_log)
+        cmd = ["make", "--no-print-directory", target] + self.make_vars
+        with self.license_tokens, open(log_path, 'a') as f:
+            f.write(f"\n===== ATTEMPT #{attempt} - {time.strftime('%Y-%m-%d %H:%M:%S')} =====\n")
+            f.write(f"$ {' '.join(cmd)}\n")
+            f.flush()
+            offset = f.tell()
+            try:
+                ret = subprocess.run(cmd, cwd=workdir, stdout=f, stderr=subprocess.STDOUT,
+                                     timeout=self.timeout).returncode
+            except subprocess.TimeoutExpired:
+                ret = -1
+                f.write(f"\n超时: {self.timeout} s\n")
+        with open(log_path, 'r', errors='replace') as f:
+            f.seek(offset)
+            output = f.read()
+        if os.path.exists(sim_log):
+            with open(sim_log, 'r', errors='replace') as f:
+                output += f.read()
+        return ret, output
+
+    def run_job(self, job, workdir=None):
+        """运行单个任务，License失败时退避重试"""
+        result = dict(job, status='skipped', attempts=0, duration=0.0, license_failures=0)
+        name = f"{job['testcase']}/{job['target']}"
+        if job['skip']:
+            log(f"[跳过] {name}: Makefile中没有该目标")
+            return result
+
+        if workdir is None:
+            workdir = prepare_scratch(job['testcase'], job['target'])
+        log_path = os.path.join(workdir, "regress.log")
+        result['workdir'] = workdir
+        result['log'] = log_path
+        start_time = time.time()
+
+        for attempt in range(1, self.max_retries + 2):
+            result['attempts'] = attempt
+            ret, output = self.attempt(workdir, job['target'], log_path, attempt)
+            if ret == 0:
+                result['status'] = 'passed'
+                break
+            if not is_license_error(output):
+                result['status'] = 'failed'
+                result['message'] = f"返回码 {ret}"
+                break
+            result['license_failures'] += 1
+            if attempt > self.max_retries:
+                result['status'] = 'license_exhausted'
+                result['message'] = f"License重试 {self.max_retries} 次后仍失败"
+                break
+            delay = backoff_delay(attempt - 1, self.backoff_base, self.backoff_max)
+            log(f"[License] {name}: 第 {attempt} 次获取失败，{delay:.1f} s 后重试")
+            time.sleep(delay)
+
+        result['duration'] = round(time.time() - start_time, 2)
+        if result['status'] == 'passed' and self.bench_path:
+            self.record_bench(job, workdir, name)
+        tag = {'passed': '通过', 'failed': '失败', 'license_exhausted': 'License不足'}[result['status']]
+        log(f"[{tag}] {name}: {result['attempts']} 次尝试, 用时 {result['duration']:.1f} s")
+        return result
+
+    def record_bench(self, job, workdir, name):
+        """把通过的任务的周期数写入 bench_db 数据库，失败只打印警告"""
+        try:
+            run_id, kernels = bench_db.record(self.bench_path, os.path.join(workdir, "simv.log"),
+                                              job['testcase'], job['config'], hw=self.bench_hw)
+            log(f"[记录] {name}: bench_db #{run_id}, {kernels} 个内核")
+        except (OSError, ValueError, bench_db.sqlite3.Error) as e:
+            log(f"[警告] {name}: 周期数未记录: {e}")
+
+
+def write_json(results, path, wall_time):
+    """写JSON汇总"""
+    counts = {}
+    for r in results:
+        counts[r['status']] = counts.get(r['status'], 0) + 1
+    with open(path, 'w') as f:
+        json.dump({'wall_time': round(wall_time, 2), 'counts': counts, 'jobs': results},
+                  f, indent=2, ensure_ascii=False)
+
+
+def write_junit(results, path, wall_time):
+    """写JUnit XML汇总，每个用例一个testsuite"""
+    root = ET.Element('testsuites', name='ventus_regression', time=f"{wall_time:.2f}")
+    suites = {}
+    for r in results:
+        suite = suites.get(r['testcase'])
+        if suite is None:
+            suite = ET.SubElement(root, 'testsuite', name=r['testcase'])
+            suites[r['testcase']] = suite
+        case = ET.SubElement(suite, 'testcase', classname=r['testcase'], name=r['target'],
+                             time=f"{r['duration']:.2f}")
+        if r['status'] == 'skipped':
+            ET.SubElement(case, 'skipped')
+        elif r['status'] != 'passed':
+            ET.SubElement(case, 'failure', type=r['status'], message=r.get('message', ''))
+        if r.get('log'):
+            ET.SubElement(case, 'system-out').text = f"log: {r['log']}, attempts: {r['attempts']}"
+    for suite in suites.values():
+        cases = list(suite)
+        suite.set('tests', str(len(cases)))
+        suite.set('failures', str(sum(1 for c in cases if c.find('failure') is not None)))
+        suite.set('skipped', str(sum(1 for c in cases if c.find('skipped') is not None)))
+    ET.ElementTree(root).write(path, encoding='utf-8', xml_declaration=True)
+
+
+def split_list(value):
+    """解析逗号分隔的列表参数"""
+    return [v.strip() for v in value.split(",") if v.strip()]
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="License感知的并行回归测试调度器",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python regression.py -j 8 --licenses 4
+  python regression.py -t tc_vecadd,tc_nn -c 8w4t,4w8t
+  python regression.py -t mnist --targets run-mnist-small,run-mnist-tiny
+  python regression.py -t tc_vecadd -c 8w4t --vcs "python3 ../fake_vcs.py"   # 没有VCS时检查调度和汇总
+  python regression.py --bench-db ~/.cache/ventus_bench/bench.db   # 记录通过的任务的周期数
+  cd tc_vecadd && python ../regression.py --in-place run-vcs-8w4t
+        """
+    )
+    parser.add_argument('-t', '--testcases', default=",".join(DEFAULT_TESTCASES), help='测试用例列表(逗号分隔)')
+    parser.add_argument('-c', '--configs', default=",".join(DEFAULT_CONFIGS), help='配置列表(逗号分隔)，对应 run-vcs-<配置> 目标')
+    parser.add_argument('--targets', help='直接指定make目标列表(逗号分隔)，覆盖 --configs')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1, help='最大并发任务数，默认CPU核数')
+    parser.add_argument('--licenses', type=int, default=int(os.environ.get("VCS_LICENSES", "1")),
+                        help='可同时使用的License数，默认 $VCS_LICENSES 或 1')
+    parser.add_argument('--max-retries', type=int, default=20, help='License失败的最大重试次数')
+    parser.add_argument('--backoff-base', type=float, default=5.0, help='退避基准时间(秒)')
+    parser.add_argument('--backoff-max', type=float, default=600.0, help='单次退避上限(秒)')
+    parser.add_argument('--timeout', type=float, help='单次尝试的超时时间(秒)')
+    parser.add_argument('--vcs', help='传给Makefile的VCS命令，例如接入simv_cache.py或测试用的假vcs')
+    parser.add_argument('--json', default='regress_summary.json', help='JSON汇总文件')
+    parser.add_argument('--junit', default='regress_junit.xml', help='JUnit汇总文件')
+    parser.add_argument('--list', action='store_true', help='只列出任务矩阵，不运行')
+    parser.add_argument('--clean', action='store_true', help='删除所有临时目录后退出')
+    parser.add_argument('--in-place', metavar='TARGET', help='在当前目录运行单个make目标(替代 make re-<目标>)')
+    parser.add_argument('--bench-db', metavar='DB', help='把通过的任务的周期数记录到 bench_db.py 的数据库')
+
+    args = parser.parse_args()
+    make_vars = [f"VCS={args.vcs}"] if args.vcs else []
+    scheduler = Scheduler(max(1, args.licenses), args.max_retries, args.backoff_base,
+                          args.backoff_max, args.timeout, make_vars, args.bench_db)
+
+    if args.clean:
+        for name in os.listdir(SCRIPT_DIR):
+            if name.startswith(SCRATCH_PREFIX):
+                shutil.rmtree(os.path.join(SCRIPT_DIR, name))
+                print(f"已删除: {name}")
+        return 0
+
+    if args.in_place:
+        job = {'testcase': os.path.basename(os.getcwd()), 'target': args.in_place,
+               'config': args.in_place, 'skip': False}
+        result = scheduler.run_job(job, workdir=os.getcwd())
+        return 0 if result['status'] == 'passed' else 1
+
+    jobs = build_matrix(split_list(args.testcases), split_list(args.configs),
+                        split_list(args.targets) if args.targets else None)
+    # 工作线程数受核数限制，同时运行的仿真数再受License令牌限制；退避等待期间不占用License
+    workers = max(1, args.jobs)
+    print(f"任务: {len(jobs)} 个 ({sum(1 for j in jobs if j['skip'])} 个跳过), "
+          f"并发: {workers} 个任务, {args.licenses} 个License")
+    if args.list:
+        for job in jobs:
+            print(f"  {job['testcase']:<12} {job['target']:<20} {'跳过' if job['skip'] else ''}")
+        return 0
+
+    start_time = time.time()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(scheduler.run_job, jobs))
+    wall_time = time.time() - start_time
+
+    write_json(results, args.json, wall_time)
+    write_junit(results, args.junit, wall_time)
+
+    print("\n" + "=" * 60)
+    print(f"{'用例':<12} {'目标':<20} {'状态':<18} {'尝试':>4} {'用时(s)':>8}")
+    for r in results:
+        print(f"{r['testcase']:<12} {r['target']:<20} {r['status']:<18} {r['attempts']:>4} {r['duration']:>8.1f}")
+    failed = [r for r in results if r['status'] not in ('passed', 'skipped')]
+    print(f"总用时 {wall_time:.1f} s, 失败 {len(failed)} 个")
+    print(f"汇总已写入: {args.json}, {args.junit}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+为rtl.log/simv.log建立旁路索引(<日志>.idx，SQLite)，按SM/Warp、仿真时间、PC或行号直接定位到日志中的区域
+日志按固定大小(默认256KB，按行对齐)分块，每块记录 字节偏移、起始行号、仿真时间范围，
+以及块内出现过的 (SM, Warp) 和 PC。查询只读取命中的块，耗时与日志大小无关。
+索引可以增量更新：日志还在写入时重复执行 build (或 build --follow) 只处理新增的完整行。
+
+rtl.log的行本身不带时间，仿真时间取自之前最近一条带时间的行(如 "exe finish!     time: 1200 ns")，
+时间格式可以用 --time-re 指定。
+
+用法:
+  python rtl_index.py build rtl.log
+  python rtl_index.py build rtl.log --follow                   # 仿真运行时持续更新
+  python rtl_index.py query rtl.log --sm 0 --warp 3 --time 1200..1800
+  python rtl_index.py query rtl.log --pc 0x80000040 --limit 20 -n
+"""
+
+import os
+import re
+import sys
+import time
+import hashlib
+import sqlite3
+import argparse
+
+
+INDEX_SUFFIX = ".idx"
+INDEX_VERSION = "1"
+BLOCK_SIZE = 256 << 10       # 每块的字节数(按行对齐)
+READ_SIZE = 16 << 20         # 建索引时每次读取的字节数
+HEAD_SIZE = 64 << 10         # 用于判断日志是否被重写的头部长度
+TIME_RE = rb"time:\s*(\d+(?:\.\d+)?)"
+# "sm %d warp %d 0x%x(pc) 0x%x(inst) ..."
+LINE_RE = re.compile(rb"^sm[ \t]+(\d+)[ \t]+warp[ \t]+(\d+)[ \t]+0x([0-9a-fA-F]+)", re.M)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS blocks (
+    id INTEGER PRIMARY KEY, offset INTEGER, end INTEGER, line INTEGER, t_start REAL, t_end REAL);
+CREATE INDEX IF NOT EXISTS blocks_line ON blocks (line);
+CREATE INDEX IF NOT EXISTS blocks_time ON blocks (t_end);
+CREATE TABLE IF NOT EXISTS streams (
+    sm INTEGER, warp INTEGER, block INTEGER, PRIMARY KEY (sm, warp, block)) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS pcs (pc INTEGER, block INTEGER, PRIMARY KEY (pc, block)) WITHOUT ROWID;
+"""
+
+
+def index_path(log_path):
+    return log_path + INDEX_SUFFIX
+
+
+def head_hash(path, length):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read(length)).hexdigest()
+
+
+class LogIndex:
+    """日志的旁路索引"""
+
+    def __init__(self, log_path, block_size=BLOCK_SIZE, time_re=TIME_RE):
+        self.log_path = log_path
+        self.db = sqlite3.connect(index_path(log_path))
+        # WAL: build --follow 写索引的同时可以查询
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.executescript(SCHEMA)
+        self.meta = dict(self.db.execute("SELECT key, value FROM meta"))
+        if self.meta.get("version") != INDEX_VERSION:
+            self.reset(block_size, time_re)
+        self.time_re = re.compile(self.meta["time_re"].encode())
+
+    def reset(self, block_size=None, time_re=None):
+        """清空索引，从头开始"""
+        with self.db:
+            for table in ("meta", "blocks", "streams", "pcs"):
+                self.db.execute(f"DELETE FROM {table}")
+        self.meta = {"version": INDEX_VERSION, "size": "0", "lines": "0", "last_time": "",
+                     "head_len": "0", "head_hash": "",
+                     "block_size": str(block_size or int(self.meta.get("block_size", BLOCK_SIZE))),
+                     "time_re": (time_re if isinstance(time_re, str) else (time_re or TIME_RE).decode())}
+        self.save_meta()
+
+    def save_meta(self):
+        """写入元数据并提交，新增的块和元数据在同一个事务中，中断时索引仍然一致"""
+        with self.db:
+            self.db.executemany("INSERT OR REPLACE INTO meta VALUES (?, ?)", self.meta.items())
+
+    def is_stale(self):
+        """日志变短或头部变化说明被重新生成，需要重建索引"""
+        size = os.path.getsize(self.log_path)
+        indexed = int(self.meta["size"])
+        if size < indexed:
+            return True
+        head_len = int(self.meta["head_len"])
+        return head_len > 0 and head_hash(self.log_path, head_len) != self.meta["head_hash"]
+
+    # ── 建索引 ──
+    def update(self):
+        """处理上次索引之后新增的完整行，返回 (新增块数, 新增字节数)"""
+        if self.is_stale():
+            self.reset()
+        offset = start = int(self.meta["size"])
+        line = int(self.meta["lines"])
+        last_time = float(self.meta["last_time"]) if self.meta["last_time"] else None
+        block_size = int(self.meta["block_size"])
+        new_blocks = 0
+        with open(self.log_path, "rb") as f:
+            f.seek(offset)
+            pending = b""
+            while True:
+                data = f.read(READ_SIZE)
+                if not data:
+                    break
+                pending += data
+                pos = 0
+                # 只切出完整的块，剩余部分与下一次读取拼接
+                while len(pending) - pos >= block_size:
+                    cut = pending.find(b"\n", pos + block_size - 1) + 1
+                    if cut == 0:
+                        break
+                    last_time = self.add_block(pending[pos:cut], offset, line, last_time)
+                    line += pending.count(b"\n", pos, cut)
+                    offset += cut - pos
+                    pos = cut
+                    new_blocks += 1
+                pending = pending[pos:]
+            cut = pending.rfind(b"\n") + 1
+            if cut:
+                last_time = self.add_block(pending[:cut], offset, line, last_time)
+                line += pending.count(b"\n", 0, cut)
+                offset += cut
+                new_blocks += 1
+
+        self.meta["size"] = str(offset)
+        self.meta["lines"] = str(line)
+        self.meta["last_time"] = "" if last_time is None else repr(last_time)
+        if int(self.meta["head_len"]) < HEAD_SIZE:
+            self.meta["head_len"] = str(min(offset, HEAD_SIZE))
+            self.meta["head_hash"] = head_hash(self.log_path, int(self.meta["head_len"]))
+        self.save_meta()
+        return new_blocks, offset - start
+
+    def add_block(self, block, offset, line, last_time):
+        """记录一块的偏移、行号、时间范围、(SM, Warp) 和 PC，返回块末尾的仿真时间"""
+        times = self.time_re.findall(block)
+        t_end = float(times[-1]) if times else last_time
+        entries = set(LINE_RE.findall(block))
+        streams = {(int(sm), int(warp)) for sm, warp, _ in entries}
+        pcs = {int(pc, 16) for _, _, pc in entries}
+        cur = self.db.execute("INSERT INTO blocks (offset, end, line, t_start, t_end) VALUES (?, ?, ?, ?, ?)",
+                              (offset, offset + len(block), line, last_time, t_end))
+        block_id = cur.lastrowid
+        self.db.executemany("INSERT OR IGNORE INTO streams VALUES (?, ?, ?)",
+                            [(sm, warp, block_id) for sm, warp in streams])
+        self.db.executemany("INSERT OR IGNORE INTO pcs VALUES (?, ?)", [(pc, block_id) for pc in pcs])
+        return t_end
+
+    # ── 查询 ──
+    def find_blocks(self, sm=None, warp=None, pc=None, time_range=None, line_range=None):
+        """返回可能包含匹配行的块 [(偏移, 结束偏移, 起始行号, 起始时间)]"""
+        where, params = [], []
+        if sm is not None or warp is not None:
+            cond = []
+            if sm is not None:
+                cond.append("sm = ?")
+                params.append(sm)
+            if warp is not None:
+                cond.append("warp = ?")
+                params.append(warp)
+            where.append(f"id IN (SELECT block FROM streams WHERE {' AND '.join(cond)})")
+        if pc is not None:
+            where.append("id IN (SELECT block FROM pcs WHERE pc = ?)")
+            params.append(pc)
+        if time_range is not None:
+            # 仿真时间单调不减，块的时间范围是 [t_start, t_end]
+            where.append("t_end >= ? AND (t_start IS NULL OR t_start <= ?)")
+            params += list(time_range)
+        if line_range is not None:
+            # 行号从1开始，块的第一行是 line+1，包含起始行的是最后一个 line < 起始行 的块
+            where.append("id >= COALESCE((SELECT MAX(id) FROM blocks WHERE line < ?), 0) AND line < ?")
+            params += list(line_range)
+        sql = "SELECT offset, end, line, t_start FROM blocks"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        return self.db.execute(sql + " ORDER BY id", params).fetchall()
+
+    def query(self, sm=None, warp=None, pc=None, time_range=None, line_range=None):
+        """逐行产生 (行号, 仿真时间, 行内容)"""
+        with open(self.log_path, "rb") as f:
+            for offset, end, line, t_start in self.find_blocks(sm, warp, pc, time_range, line_range):
+                f.seek(offset)
+                now = t_start
+                for text in f.read(end - offset).splitlines():
+                    line += 1
+                    m = self.time_re.search(text)
+                    if m:
+                        now = float(m.group(1))
+                    if line_range is not None and not line_range[0] <= line <= line_range[1]:
+                        continue
+                    if time_range is not None and (now is None or not time_range[0] <= now <= time_range[1]):
+                        continue
+                    if sm is not None or warp is not None or pc is not None:
+                        m = LINE_RE.match(text)
+                        if not m or (sm is not None and int(m.group(1)) != sm) \
+                                or (warp is not None and int(m.group(2)) != warp) \
+                                or (pc is not None and int(m.group(3), 16) != pc):
+                            continue
+                    yield line, now, text
+
+    def stats(self):
+        blocks, = self.db.execute("SELECT COUNT(*) FROM blocks").fetchone()
+        streams, = self.db.execute("SELECT COUNT(DISTINCT sm * 65536 + warp) FROM streams").fetchone()
+        pcs, = self.db.execute("SELECT COUNT(DISTINCT pc) FROM pcs").fetchone()
+        t_min, t_max = self.db.execute("SELECT MIN(t_end), MAX(t_end) FROM blocks").fetchone()
+        return {"size": int(self.meta["size"]), "lines": int(self.meta["lines"]), "blocks": blocks,
+                "streams": streams, "pcs": pcs, "time": (t_min, t_max)}
+
+    def close(self):
+        self.db.close()
+
+
+# ──────────────────────────────
+# 命令行
+# ──────────────────────────────
+def parse_range(text, parse=float):
+    """A..B / A.. / ..B / A → (下限, 上限)"""
+    low, sep, high = text.partition("..")
+    if not sep:
+        high = low
+    return (parse(low) if low else float("-inf"), parse(high) if high else float("inf"))
+
+
+def cmd_build(args):
+    index = LogIndex(args.log, args.block_kb << 10, args.time_re)
+    if args.rebuild or (args.block_kb << 10) != int(index.meta["block_size"]) \
+            or args.time_re != index.meta["time_re"]:
+        index.reset(args.block_kb << 10, args.time_re)
+    while True:
+        start_time = time.time()
+        blocks, added = index.update()
+        if blocks or not args.follow:
+            elapsed = max(time.time() - start_time, 1e-9)
+            size = int(index.meta["size"])
+            print(f"{args.log}: 新增 {blocks} 块, 共 {index.meta['lines']} 行 {size / (1 << 20):.1f} MB, "
+                  f"{added / elapsed / (1 << 20):.1f} MB/s", flush=True)
+        if not args.follow:
+            break
+        time.sleep(args.interval)
+    index.close()
+    return 0
+
+
+def cmd_query(args):
+    index = LogIndex(args.log)
+    if not args.no_update:
+        index.update()
+    time_range = parse_range(args.time) if args.time else None
+    line_range = parse_range(args.line, int) if args.line else None
+    pc = int(args.pc, 16) if args.pc else None
+    if args.blocks:
+        for offset, end, line, t_start in index.find_blocks(args.sm, args.warp, pc, time_range, line_range):
+            print(f"{offset}\t{end - offset}\t{line + 1}\t{'' if t_start is None else t_start}")
+        index.close()
+        return 0
+
+    out = sys.stdout.buffer
+    count = 0
+    try:
+        for line, now, text in index.query(args.sm, args.warp, pc, time_range, line_range):
+            if args.line_number:
+                out.write(f"{line}:".encode())
+            out.write(text + b"\n")
+            count += 1
+            if args.limit and count >= args.limit:
+                break
+        out.flush()
+    except BrokenPipeError:
+        pass
+    finally:
+        index.close()
+    return 0 if count else 1
+
+
+def cmd_info(args):
+    index = LogIndex(args.log)
+    if not args.no_update:
+        index.update()
+    stats = index.stats()
+    t_min, t_max = stats["time"]
+    print(f"日志:   {args.log} ({stats['size'] / (1 << 20):.1f} MB 已索引, {stats['lines']} 行)")
+    print(f"索引:   {index_path(args.log)} ({os.path.getsize(index_path(args.log)) / 1024:.0f} KB)")
+    print(f"分块:   {stats['blocks']} 块, 每块 {int(index.meta['block_size']) >> 10} KB")
+    print(f"SM/Warp: {stats['streams']} 个, PC: {stats['pcs']} 个")
+    print(f"时间:   {'无' if t_min is None else f'{t_min:g} .. {t_max:g}'}")
+    index.close()
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="为rtl.log/simv.log建立旁路索引，按SM/Warp、时间、PC、行号直接定位",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python rtl_index.py build tc_vecadd/rtl.log
+  python rtl_index.py build tc_vecadd/rtl.log --follow --interval 2     # 仿真运行时持续更新
+  python rtl_index.py query tc_vecadd/rtl.log --sm 0 --warp 3 --time 1200..1800
+  python rtl_index.py query tc_vecadd/rtl.log --pc 0x80000040 --limit 20 -n
+  python rtl_index.py query tc_vecadd/rtl.log --line 100000..100050
+  python rtl_index.py info tc_vecadd/rtl.log
+查询前会先增量更新索引(--no-update 跳过)；日志被重新生成时自动重建。
+        """
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("build", help="建立或增量更新索引")
+    p.add_argument("log", help="日志文件")
+    p.add_argument("--block-kb", type=int, default=BLOCK_SIZE >> 10, help="每块大小KB(默认256)")
+    p.add_argument("--time-re", default=TIME_RE.decode(), help=f"提取仿真时间的正则(默认 {TIME_RE.decode()})")
+    p.add_argument("--rebuild", action="store_true", help="丢弃已有索引重新建立")
+    p.add_argument("--follow", action="store_true", help="持续跟踪日志增长，Ctrl-C结束")
+    p.add_argument("--interval", type=float, default=1.0, help="--follow 的轮询间隔秒数(默认1)")
+    p.set_defaults(func=cmd_build)
+
+    p = sub.add_parser("query", help="按条件输出日志行")
+    p.add_argument("log", help="日志文件")
+    p.add_argument("--sm", type=int, help="SM号")
+    p.add_argument("--warp", type=int, help="Warp号")
+    p.add_argument("--pc", help="PC (十六进制)")
+    p.add_argument("--time", help="仿真时间范围 A..B (A.. / ..B / 单个值)")
+    p.add_argument("--line", help="行号范围 A..B")
+    p.add_argument("--limit", type=int, default=0, help="最多输出的行数")
+    p.add_argument("-n", "--line-number", action="store_true", help="输出行号")
+    p.add_argument("--blocks", action="store_true", help="只输出命中的块: 偏移 长度 起始行号 起始时间")
+    p.add_argument("--no-update", action="store_true", help="不更新索引")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("info", help="显示索引信息")
+    p.add_argument("log", help="日志文件")
+    p.add_argument("--no-update", action="store_true", help="不更新索引")
+    p.set_defaults(func=cmd_info)
+
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 0
+    except (OSError, ValueError, re.error, sqlite3.Error) as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+从rtl.log统计每个warp的执行情况，PC通过object.dump反汇编解析
+rtl.log按块流式读取，每条 "sm X warp Y 0x<pc> 0x<inst> ..." 记录按PC在有序数组中二分查找对应的指令，
+输出每个warp的指令数、IPC、指令类型分布、热点PC/基本块和空闲间隔，结果可导出为CSV/JSON。
+
+rtl.log中的记录是写回/提交事件: 访存的 "lsu.r"(地址计算) 和 "lsu.w finish" 不单独算指令，
+同一warp连续两条相同PC的记录(如jal的跳转和写回)只算一条。
+日志不带时间，IPC使用 "Single kernel need : N cycles" 的周期数(或 --cycles)；
+空闲间隔以同一SM上其它warp提交的指令数计量。
+
+用法:
+  python rtl_profile.py tc_vecadd/rtl.log -d tc_vecadd/softdata/4w32t/object.dump
+  python rtl_profile.py rtl.log -d object.dump --simv-log simv.log --csv profile/ --json profile.json
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import bisect
+import argparse
+from collections import Counter
+
+import numpy as np
+
+
+CHUNK_SIZE = 16 << 20        # 每次读取的字节数
+TOP_N = 20                   # 热点/空闲间隔表的默认行数
+GAP_THRESHOLD = 32           # 超过该长度的空闲间隔单独计数
+# "sm %d warp %d 0x%x 0x%x <类型> ..."，类型取后两个字段: x5 / v3 / lsu.r / lsu.w finish / Jump? / join ...
+EVENT_RE = re.compile(rb"^sm[ \t]+(\d+)[ \t]+warp[ \t]+(\d+)[ \t]+0x([0-9a-fA-F]+)[ \t]+0x[0-9a-fA-FxXzZ]+"
+                      rb"[ \t]*([^ \t\n]*)[ \t]*([^ \t\n]*)", re.M)
+CYCLES_RE = re.compile(rb"Single kernel need\s*:\s*(\d+)\s*cycles")
+# objdump: "80000054 <.Ltmp0>:" 和 "80000054: f3 22 30 80  \tcsrr\tt0, 2051"
+LABEL_RE = re.compile(r"^([0-9a-fA-F]+) <(.+)>:\s*$")
+INSN_RE = re.compile(r"^\s*([0-9a-fA-F]+):\s")
+TARGET_RE = re.compile(r"0x([0-9a-fA-F]+) <")
+
+BRANCHES = {"j", "jal", "jalr", "jr", "ret", "mret", "beq", "bne", "blt", "bge", "bltu", "bgeu",
+            "beqz", "bnez", "blez", "bgez", "bltz", "bgtz", "bgt", "ble", "bgtu", "bleu"}
+SIMT = {"vbeq", "vbne", "vblt", "vbge", "vbltu", "vbgeu", "join", "setrpc", "barrier", "endprg"}
+VLOAD_RE = re.compile(r"^vl(b|bu|h|hu|w|e\d+)(\d+)?\.v$")
+VSTORE_RE = re.compile(r"^vs(b|h|w|e\d+)(\d+)?\.v$")
+CATEGORIES = ["alu", "load", "store", "branch", "csr", "fp", "valu", "vfp", "vload", "vstore", "simt", "unknown"]
+
+
+def categorize(mnemonic):
+    """助记符 → 指令类型"""
+    if mnemonic in SIMT:
+        return "simt"
+    if mnemonic in BRANCHES:
+        return "branch"
+    if mnemonic in ("lw", "lh", "lb", "lhu", "lbu", "flw"):
+        return "load"
+    if mnemonic in ("sw", "sh", "sb", "fsw"):
+        return "store"
+    if mnemonic.startswith("csr"):
+        return "csr"
+    if VLOAD_RE.match(mnemonic):
+        return "vload"
+    if VSTORE_RE.match(mnemonic):
+        return "vstore"
+    if mnemonic.startswith("vf"):
+        return "vfp"
+    if mnemonic.startswith("v"):
+        return "valu"
+    if mnemonic.startswith("f"):
+        return "fp"
+    return "alu" if mnemonic != "?" else "unknown"
+
+
+# ──────────────────────────────
+# object.dump
+# ──────────────────────────────
+class Disassembly:
+    """object.dump中的指令表，PC按升序保存，查找用二分"""
+
+    def __init__(self, path):
+        pcs, mnemonics, operands = [], [], []
+        labels = {}
+        with open(path, 'r') as f:
+            for line in f:
+                m = LABEL_RE.match(line)
+                if m:
+                    labels.setdefault(int(m.group(1), 16), m.group(2))
+                    continue
+                if not INSN_RE.match(line):
+                    continue
+                fields = line.rstrip("\n").split("\t")
+                if len(fields) < 2:
+                    continue
+                pcs.append(int(fields[0].split(":")[0], 16))
+                mnemonics.append(fields[1].strip())
+                operands.append(fields[2].strip() if len(fields) > 2 else "")
+
+        order = np.argsort(pcs, kind="stable")
+        self.pcs = np.array(pcs, dtype=np.uint64)[order]
+        self.mnemonics = [mnemonics[i] for i in order]
+        self.operands = [operands[i] for i in order]
+        self.categories = np.array([CATEGORIES.index(categorize(m)) for m in self.mnemonics], dtype=np.int64)
+        # 符号名只用非 .L 开头的标签(函数)，.Lpcrel_hi 等局部标签不适合显示
+        symbols = sorted((pc, name) for pc, name in labels.items() if not name.startswith(".L"))
+        self.symbol_pcs = [pc for pc, _ in symbols]
+        self.symbol_names = [name for _, name in symbols]
+        self.leaders = self.find_leaders(labels)
+
+    def find_leaders(self, labels):
+        """基本块起点: 标签、跳转目标、控制流指令的下一条"""
+        leaders = set(labels)
+        for i, (mnemonic, operand) in enumerate(zip(self.mnemonics, self.operands)):
+            if mnemonic in BRANCHES or mnemonic in SIMT:
+                leaders.update(int(t, 16) for t in TARGET_RE.findall(operand))
+                if i + 1 < len(self.pcs):
+                    leaders.add(int(self.pcs[i + 1]))
+        if len(self.pcs):
+            leaders.add(int(self.pcs[0]))
+        return np.array(sorted(leaders), dtype=np.uint64)
+
+    def lookup(self, pcs):
+        """PC数组 → 指令表下标，不在反汇编中的为-1"""
+        index = np.searchsorted(self.pcs, pcs)
+        index[index >= len(self.pcs)] = 0
+        found = (self.pcs[index] == pcs) if len(self.pcs) else np.zeros(len(pcs), dtype=bool)
+        return np.where(found, index, -1)
+
+    def block_of(self, pcs):
+        """PC数组 → 所在基本块的起点PC"""
+        index = np.searchsorted(self.leaders, pcs, side="right") - 1
+        return np.where(index >= 0, self.leaders[np.maximum(index, 0)], pcs)
+
+    def symbol(self, pc):
+        """PC → "函数名+偏移" """
+        i = bisect.bisect_right(self.symbol_pcs, pc) - 1
+        if i < 0:
+            return ""
+        offset = pc - self.symbol_pcs[i]
+        return self.symbol_names[i] + (f"+0x{offset:x}" if offset else "")
+
+    def describe(self, pc):
+        """PC → (助记符, 操作数)"""
+        i = int(self.lookup(np.array([pc], dtype=np.uint64))[0])
+        return (self.mnemonics[i], self.operands[i]) if i >= 0 else ("?", "")
+
+
+# ──────────────────────────────
+# rtl.log
+# ──────────────────────────────
+class WarpProfile:
+    """流式累计每个warp提交的指令"""
+
+    def __init__(self, top_n=TOP_N, gap_threshold=GAP_THRESHOLD):
+        self.top_n = top_n
+        self.gap_threshold = gap_threshold
+        self.stream_ids = {}              # (sm, warp) -> 流编号
+        self.streams = []                 # [(sm, warp)]
+        self.sm_of = np.zeros(0, dtype=np.int64)
+        self.sm_count = Counter()         # SM -> 已提交的指令数(用于空闲间隔)
+        self.last_pc = np.zeros(0, dtype=np.int64)
+        self.last_ord = np.zeros(0, dtype=np.int64)
+        self.first_ord = np.zeros(0, dtype=np.int64)
+        self.idle = np.zeros(0, dtype=np.int64)
+        self.max_gap = np.zeros(0, dtype=np.int64)
+        self.max_gap_pc = np.zeros(0, dtype=np.int64)
+        self.gaps_over = np.zeros(0, dtype=np.int64)
+        self.pc_counts = Counter()        # (流编号 << 32) | pc -> 次数
+        self.gaps = np.zeros((0, 5), dtype=np.int64)  # 流编号, 起始序号, 长度, 之前的PC, 之后的PC
+        self.cycles = None
+        self.stats = {"bytes": 0, "events": 0, "retired": 0}
+
+    def add_streams(self, keys):
+        for key in keys:
+            if key in self.stream_ids:
+                continue
+            self.stream_ids[key] = len(self.streams)
+            self.streams.append((int(key[0]), int(key[1])))
+        grow = len(self.streams) - len(self.sm_of)
+        if grow:
+            self.sm_of = np.concatenate([self.sm_of, [sm for sm, _ in self.streams[-grow:]]])
+            for name in ("last_pc", "last_ord", "first_ord"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.full(grow, -1)]))
+            for name in ("idle", "max_gap", "max_gap_pc", "gaps_over"):
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(grow, dtype=np.int64)]))
+
+    def feed(self, block):
+        """处理一块完整的行"""
+        self.stats["bytes"] += len(block)
+        m = CYCLES_RE.search(block)
+        if m:
+            self.cycles = int(m.group(1))
+        events = EVENT_RE.findall(block)
+        if not events:
+            return
+        self.stats["events"] += len(events)
+        events = [e for e in events if e[3] != b"lsu.r" and e[4] != b"finish"]
+        if not events:
+            return
+        self.add_streams({(e[0], e[1]) for e in events})
+        ids = self.stream_ids
+        g = np.fromiter((ids[e[0], e[1]] for e in events), dtype=np.int64, count=len(events))
+        pc = np.fromiter((int(e[2], 16) for e in events), dtype=np.int64, count=len(events))
+
+        # 每个SM内按日志顺序给提交的指令编号
+        sm = self.sm_of[g]
+        ordinal = np.empty(len(g), dtype=np.int64)
+        for s in np.unique(sm).tolist():
+            mask = sm == s
+            n = int(mask.sum())
+            ordinal[mask] = self.sm_count[s] + np.arange(n)
+            self.sm_count[s] += n
+
+        # 按流稳定排序后与同一流的上一条比较，块的第一条与上一块最后一条比较
+        order = np.argsort(g, kind="stable")
+        g, pc, ordinal = g[order], pc[order], ordinal[order]
+        head = np.ones(len(g), dtype=bool)
+        head[1:] = g[1:] != g[:-1]
+        prev_pc = np.empty_like(pc)
+        prev_pc[1:] = pc[:-1]
+        prev_pc[head] = self.last_pc[g[head]]
+        prev_ord = np.empty_like(ordinal)
+        prev_ord[1:] = ordinal[:-1]
+        prev_ord[head] = self.last_ord[g[head]]
+
+        tail = np.ones(len(g), dtype=bool)
+        tail[:-1] = head[1:]
+        self.last_pc[g[tail]] = pc[tail]
+        self.last_ord[g[tail]] = ordinal[tail]
+        new = head & (self.first_ord[g] < 0)
+        self.first_ord[g[new]] = ordinal[new]
+
+        has_prev = prev_ord >= 0
+        gap = np.where(has_prev, ordinal - prev_ord - 1, 0)
+        self.idle += np.bincount(g, weights=gap, minlength=len(self.streams)).astype(np.int64)
+        big = gap > self.max_gap[g]
+        if big.any():
+            np.maximum.at(self.max_gap, g[big], gap[big])
+            rows = np.flatnonzero(big & (gap == self.max_gap[g]))
+            self.max_gap_pc[g[rows]] = pc[rows]
+        over = gap >= self.gap_threshold
+        self.gaps_over += np.bincount(g[over], minlength=len(self.streams))
+        if over.any():
+            rows = np.column_stack([g[over], prev_ord[over] + 1, gap[over], prev_pc[over], pc[over]])
+            self.gaps = np.concatenate([self.gaps, rows])
+            if len(self.gaps) > self.top_n:
+                keep = np.argsort(-self.gaps[:, 2], kind="stable")[:self.top_n]
+                self.gaps = self.gaps[keep]
+
+        keep = ~(has_prev & (pc == prev_pc))
+        self.stats["retired"] += int(keep.sum())
+        keys, counts = np.unique((g[keep] << 32) | pc[keep], return_counts=True)
+        self.pc_counts.update(dict(zip(keys.tolist(), counts.tolist())))
+
+
+def scan_log(path, profile, chunk_size=CHUNK_SIZE):
+    """按块读取日志交给 profile"""
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                if tail:
+                    profile.feed(tail + b"\n")
+                break
+            block = tail + chunk
+            cut = block.rfind(b"\n") + 1
+            block, tail = block[:cut], block[cut:]
+            profile.feed(block)
+
+
+def read_cycles(path):
+    """simv.log中最后一个 "Single kernel need : N cycles" """
+    cycles = None
+    with open(path, 'rb') as f:
+        for line in f:
+            m = CYCLES_RE.search(line)
+            if m:
+                cycles = int(m.group(1))
+    return cycles
+
+
+# ──────────────────────────────
+# 统计表: {列名: 数组}
+# ──────────────────────────────
+def build_tables(profile, dis, cycles, top_n=TOP_N):
+    n = len(profile.streams)
+    keys = np.fromiter(profile.pc_counts.keys(), dtype=np.int64, count=len(profile.pc_counts))
+    counts = np.fromiter(profile.pc_counts.values(), dtype=np.int64, count=len(profile.pc_counts))
+    stream, pcs = keys >> 32, (keys & 0xffffffff).astype(np.uint64)
+    index = dis.lookup(pcs)
+    category = np.where(index >= 0, dis.categories[np.maximum(index, 0)], CATEGORIES.index("unknown"))
+
+    # 按 (SM, Warp) 排序输出
+    order = sorted(range(n), key=lambda i: profile.streams[i])
+    rank = np.empty(n, dtype=np.int64)
+    rank[order] = np.arange(n)
+    insts = np.bincount(stream, weights=counts, minlength=n).astype(np.int64)
+    span = np.where(profile.first_ord >= 0, profile.last_ord - profile.first_ord + 1, 0)
+    warps = {
+        "sm": np.array([profile.streams[i][0] for i in order], dtype=np.int64),
+        "warp": np.array([profile.streams[i][1] for i in order], dtype=np.int64),
+        "insts": insts[order],
+        "ipc": (insts[order] / cycles) if cycles else np.full(n, np.nan),
+        "active_span": span[order],
+        "idle": profile.idle[order],
+        "max_gap": profile.max_gap[order],
+        "max_gap_pc": np.array([f"0x{int(p):08x}" if g else "" for p, g in
+                                zip(profile.max_gap_pc[order], profile.max_gap[order])], dtype=object),
+        f"gaps_ge_{profile.gap_threshold}": profile.gaps_over[order],
+    }
+    mix = np.zeros((n, len(CATEGORIES)), dtype=np.int64)
+    np.add.at(mix, (rank[stream], category), counts)
+    for j, name in enumerate(CATEGORIES):
+        warps[name] = mix[:, j]
+
+    # 热点PC: 所有warp合计
+    upcs, inverse = np.unique(pcs, return_inverse=True)
+    pc_total = np.bincount(inverse, weights=counts).astype(np.int64)
+    total = max(int(pc_total.sum()), 1)
+    top = np.argsort(-pc_total, kind="stable")[:top_n]
+    hot_pcs = {
+        "pc": np.array([f"0x{int(p):08x}" for p in upcs[top]], dtype=object),
+        "count": pc_total[top],
+        "share": pc_total[top] / total,
+        "symbol": np.array([dis.symbol(int(p)) for p in upcs[top]], dtype=object),
+        "insn": np.array([" ".join(dis.describe(int(p))).strip() for p in upcs[top]], dtype=object),
+    }
+
+    # 热点基本块: 块内指令次数之和，进入次数取起点PC的执行次数
+    blocks = dis.block_of(upcs)
+    ublocks, binv = np.unique(blocks, return_inverse=True)
+    block_total = np.bincount(binv, weights=pc_total).astype(np.int64)
+    entries = np.where(upcs == blocks, pc_total, 0)
+    block_entries = np.bincount(binv, weights=entries).astype(np.int64)
+    top = np.argsort(-block_total, kind="stable")[:top_n]
+    starts = ublocks[top]
+    next_leader = np.searchsorted(dis.leaders, starts, side="right")
+    ends = np.where(next_leader < len(dis.leaders),
+                    dis.leaders[np.minimum(next_leader, len(dis.leaders) - 1)], np.uint64(1 << 40))
+    hot_blocks = {
+        "start": np.array([f"0x{int(p):08x}" for p in ublocks[top]], dtype=object),
+        "insts": block_total[top],
+        "share": block_total[top] / total,
+        "entries": block_entries[top],
+        "length": np.searchsorted(dis.pcs, ends) - np.searchsorted(dis.pcs, starts),
+        "symbol": np.array([dis.symbol(int(p)) for p in ublocks[top]], dtype=object),
+    }
+
+    # 指令助记符分布
+    mnemonic = np.array([dis.mnemonics[i] if i >= 0 else "?" for i in dis.lookup(upcs)], dtype=object)
+    names, minv = np.unique(mnemonic.astype(str), return_inverse=True)
+    mn_total = np.bincount(minv, weights=pc_total).astype(np.int64)
+    order_mn = np.argsort(-mn_total, kind="stable")
+    mnemonics = {
+        "mnemonic": names[order_mn].astype(object),
+        "category": np.array([categorize(m) for m in names[order_mn]], dtype=object),
+        "count": mn_total[order_mn],
+        "share": mn_total[order_mn] / total,
+    }
+
+    gaps = profile.gaps[np.argsort(-profile.gaps[:, 2], kind="stable")] if len(profile.gaps) else profile.gaps
+    gap_table = {
+        "sm": np.array([profile.streams[i][0] for i in gaps[:, 0]], dtype=np.int64),
+        "warp": np.array([profile.streams[i][1] for i in gaps[:, 0]], dtype=np.int64),
+        "start": gaps[:, 1],
+        "length": gaps[:, 2],
+        "pc_before": np.array([f"0x{int(p):08x}" for p in gaps[:, 3]], dtype=object),
+        "pc_after": np.array([f"0x{int(p):08x}" for p in gaps[:, 4]], dtype=object),
+        "insn_after": np.array([" ".join(dis.describe(int(p))).strip() for p in gaps[:, 4]], dtype=object),
+    }
+    return {"warps": warps, "mnemonics": mnemonics, "hot_pcs": hot_pcs, "hot_blocks": hot_blocks,
+            "gaps": gap_table}
+
+
+def to_python(value):
+    if isinstance(value, (np.integer,)):
+        return int(value)
+    if isinstance(value, (np.floating, float)):
+        return None if np.isnan(value) else float(value)
+    return value
+
+
+def table_rows(table):
+    names = list(table)
+    return [dict(zip(names, (to_python(v) for v in row))) for row in zip(*(table[c] for c in names))]
+
+
+def write_csv(path, table):
+    names = list(table)
+    with open(path, 'w') as f:
+        f.write(",".join(names) + "\n")
+        for row in zip(*(table[c] for c in names)):
+            cells = []
+            for value in row:
+                value = to_python(value)
+                if value is None:
+                    value = ""
+                elif isinstance(value, float):
+                    value = f"{value:.6g}"
+                value = str(value)
+                if any(c in value for c in ',"\n'):
+                    value = '"' + value.replace('"', '""') + '"'
+                cells.append(value)
+            f.write(",".join(cells) + "\n")
+
+
+def print_table(table, columns, limit=None):
+    rows = [[("" if to_python(v) is None else f"{v:.4g}" if isinstance(to_python(v), float) else str(v))
+             for v in (table[c][i] for c in columns)] for i in range(len(table[columns[0]]))][:limit]
+    widths = [max([len(c)] + [len(r[j]) for r in rows]) for j, c in enumerate(columns)]
+    print("  " + "  ".join(c.rjust(w) for c, w in zip(columns, widths)))
+    for r in rows:
+        print("  " + "  ".join(v.rjust(w) for v, w in zip(r, widths)))
+
+
+def print_summary(tables, summary, limit):
+    cycles = summary["cycles"]
+    print(f"共 {summary['insts']} 条指令, {summary['warps']} 个warp, "
+          + (f"{cycles} cycles, IPC {summary['ipc']:.3f}" if cycles else "未找到周期数(IPC不可用)"))
+    warps = tables["warps"]
+    mix = [c for c in CATEGORIES if warps[c].any()]
+    print("\n每个warp:")
+    print_table(warps, ["sm", "warp", "insts", "ipc", "idle", "max_gap", "max_gap_pc"] + mix)
+    print(f"\n热点PC (前{limit}):")
+    print_table(tables["hot_pcs"], ["pc", "count", "share", "symbol", "insn"], limit)
+    print(f"\n热点基本块 (前{limit}):")
+    print_table(tables["hot_blocks"], ["start", "insts", "share", "entries", "length", "symbol"], limit)
+    if len(tables["gaps"]["sm"]):
+        print("\n最长的空闲间隔 (单位: 同一SM提交的指令数):")
+        print_table(tables["gaps"], ["sm", "warp", "start", "length", "pc_after", "insn_after"], limit)
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="统计rtl.log中每个warp的指令数、IPC、指令类型、热点PC/基本块和空闲间隔",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python rtl_profile.py tc_vecadd/rtl.log -d tc_vecadd/softdata/4w32t/object.dump
+  python rtl_profile.py mnist/rtl.log -d mnist/softdata/mnist_tiny/object.dump --simv-log mnist/simv.log
+  python rtl_profile.py rtl.log -d object.dump --csv profile/ --json profile.json --top 50
+CSV输出: warps.csv  mnemonics.csv  hot_pcs.csv  hot_blocks.csv  gaps.csv
+        """
+    )
+    parser.add_argument('log', help='rtl.log')
+    parser.add_argument('-d', '--dump', required=True, help='object.dump 反汇编')
+    parser.add_argument('--simv-log', help='从simv.log读取 "Single kernel need : N cycles"')
+    parser.add_argument('--cycles', type=int, help='内核周期数(计算IPC)')
+    parser.add_argument('--top', type=int, default=TOP_N, help=f'热点和空闲间隔表的行数(默认{TOP_N})')
+    parser.add_argument('--gap-threshold', type=int, default=GAP_THRESHOLD,
+                        help=f'统计长度不小于该值的空闲间隔(默认{GAP_THRESHOLD})')
+    parser.add_argument('--csv', metavar='DIR', help='把各表写成CSV文件')
+    parser.add_argument('--json', metavar='FILE', help='把所有表写成一个JSON文件')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不打印汇总')
+
+    args = parser.parse_args()
+    try:
+        dis = Disassembly(args.dump)
+        profile = WarpProfile(args.top, args.gap_threshold)
+        start_time = time.time()
+        scan_log(args.log, profile)
+        elapsed = max(time.time() - start_time, 1e-9)
+        cycles = args.cycles or (read_cycles(args.simv_log) if args.simv_log else None) or profile.cycles
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+    if not profile.streams:
+        print(f"错误: {args.log} 中没有 sm/warp 记录")
+        return 1
+
+    tables = build_tables(profile, dis, cycles, args.top)
+    warps = tables["warps"]
+    insts = int(warps["insts"].sum())
+    sm_insts = {sm: int(warps["insts"][warps["sm"] == sm].sum()) for sm in np.unique(warps["sm"]).tolist()}
+    summary = {"log": args.log, "dump": args.dump, "cycles": cycles, "insts": insts,
+               "warps": len(profile.streams), "ipc": insts / cycles if cycles else None,
+               "sm_ipc": {str(sm): n / cycles if cycles else None for sm, n in sm_insts.items()}}
+    if not args.quiet:
+        print(f"{args.log}: {profile.stats['events']} 条记录, {profile.stats['bytes'] / elapsed / (1 << 20):.1f} MB/s")
+        print_summary(tables, summary, args.top)
+    if args.csv:
+        os.makedirs(args.csv, exist_ok=True)
+        for name, table in tables.items():
+            write_csv(os.path.join(args.csv, name + ".csv"), table)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({"summary": summary, **{name: table_rows(t) for name, t in tables.items()}},
+                      f, indent=2, ensure_ascii=False)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
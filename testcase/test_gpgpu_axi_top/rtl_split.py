@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单遍扫描rtl.log，按 "sm X warp Y" 把日志行拆分到各自的文件
+extractWarpInfo.sh 每个 (SM, Warp) 都要grep一遍完整日志；这里按大块读取只扫描一次，
+每个流的行先缓存在内存中，总缓存超过上限时批量写出；同时打开的文件数也有上限(LRU关闭，之后追加写)。
+
+用法:
+  python rtl_split.py -f rtl.log                       # 所有流 -> rtl_split/sm<X>_warp<Y>.log
+  python rtl_split.py -f rtl.log -s 0 -w 3 -o -        # 与 extractWarpInfo.sh -f rtl.log -s 0 -w 3 相同
+  python rtl_split.py -f rtl.log -s 0,1 --compress     # 只拆分SM0/SM1，输出 .log.gz
+"""
+
+import os
+import re
+import sys
+import gzip
+import time
+import argparse
+from collections import OrderedDict
+
+import numpy as np
+
+
+CHUNK_SIZE = 16 << 20        # 每次读取的字节数
+BUFFER_LIMIT = 64 << 20      # 所有流合计缓存的字节数上限
+MAX_OPEN = 64                # 同时打开的输出文件数上限
+# 与 extractWarpInfo.sh 的 "^sm[[:space:]]\+N[[:space:]]\+warp[[:space:]]\+M[[:space:]]\+" 相同
+LINE_RE = re.compile(rb"^sm[ \t]+(\d+)[ \t]+warp[ \t]+(\d+)[ \t][^\n]*\n", re.M)
+PREFIX_RE = re.compile(rb"sm[ \t]+(\d+)[ \t]+warp[ \t]+(\d+)[ \t]")
+PREFIX_WINDOW = 40           # 行前缀最多取的字节数(8的倍数)
+WINDOW_OFFSETS = np.arange(PREFIX_WINDOW, dtype=np.int64)
+HASH_MULT = np.uint64(0x100000001b3)
+NEWLINE = ord("\n")
+
+
+class StreamWriter:
+    """按流缓存日志行并写出，限制缓存总量和同时打开的文件数"""
+
+    ordered = False
+
+    def __init__(self, out_dir, compress=False, level=3, max_open=MAX_OPEN, buffer_limit=BUFFER_LIMIT):
+        self.out_dir = out_dir
+        self.compress = compress
+        self.level = level
+        self.max_open = max(1, max_open)
+        self.buffer_limit = buffer_limit
+        self.pending = {}            # key -> [bytes, ...]
+        self.pending_bytes = 0
+        self.handles = OrderedDict()  # key -> file，按最近使用排序
+        self.started = set()         # 已经创建(截断)过的输出文件
+        self.reopened = 0
+
+    def path(self, key):
+        sm, warp = key
+        suffix = ".log.gz" if self.compress else ".log"
+        return os.path.join(self.out_dir, f"sm{sm}_warp{warp}{suffix}")
+
+    def write(self, key, data):
+        self.pending.setdefault(key, []).append(data)
+        self.pending_bytes += len(data)
+
+    def maybe_flush(self):
+        if self.pending_bytes >= self.buffer_limit:
+            self.flush()
+
+    def handle(self, key):
+        f = self.handles.get(key)
+        if f is not None:
+            self.handles.move_to_end(key)
+            return f
+        if len(self.handles) >= self.max_open:
+            _, old = self.handles.popitem(last=False)
+            old.close()
+        mode = "ab" if key in self.started else "wb"
+        if key in self.started:
+            self.reopened += 1
+        self.started.add(key)
+        # gzip追加写会产生多个member，gzip/zcat都能按一个文件读取
+        f = gzip.open(self.path(key), mode, compresslevel=self.level) if self.compress \
+            else open(self.path(key), mode, buffering=1 << 20)
+        self.handles[key] = f
+        return f
+
+    def flush(self):
+        for key, lines in self.pending.items():
+            self.handle(key).write(b"".join(lines))
+        self.pending.clear()
+        self.pending_bytes = 0
+
+    def close(self):
+        self.flush()
+        for f in self.handles.values():
+            f.close()
+        self.handles.clear()
+
+
+class SingleWriter:
+    """所有匹配行按原顺序写到同一个输出(文件或标准输出)"""
+
+    ordered = True
+
+    def __init__(self, output):
+        self.file = sys.stdout.buffer if output == "-" else open(output, "wb", buffering=1 << 20)
+        self.output = output
+
+    def write(self, key, data):
+        self.file.write(data)
+
+    def maybe_flush(self):
+        pass
+
+    def close(self):
+        if self.output == "-":
+            self.file.flush()
+        else:
+            self.file.close()
+
+
+def parse_ids(text):
+    """'0,2-3' → {0, 2, 3}，None 表示不过滤"""
+    if text is None:
+        return None
+    ids = set()
+    for part in text.split(","):
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            ids.update(range(int(lo), int(hi) + 1))
+        elif part:
+            ids.add(int(part))
+    return ids
+
+
+def line_bounds(block):
+    """以\n结尾的块 → (uint8数组, 行起始, 行结束)"""
+    arr = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(arr == NEWLINE) + 1
+    starts = np.empty_like(ends)
+    starts[:1] = 0
+    starts[1:] = ends[:-1]
+    return arr, starts, ends
+
+
+def classify_lines(arr, starts, ends, streams, prefix_keys, sms, warps):
+    """给每行分配流编号(-1表示丢弃)
+
+    每行取第一个"0x"之前(最多PREFIX_WINDOW字节)的前缀做哈希，只对不同的前缀用正则解析一次；
+    哈希冲突时返回None，由调用者改用逐行正则。
+    """
+    gid = np.full(len(starts), -1, dtype=np.int64)
+    lengths = ends - starts
+    cand = np.flatnonzero((lengths > 2) & (arr[np.minimum(starts, len(arr) - 1)] == ord("s"))
+                          & (arr[np.minimum(starts + 1, len(arr) - 1)] == ord("m")))
+    if not len(cand):
+        return gid
+    c_starts = starts[cand]
+    zx = np.flatnonzero((arr[:-1] == ord("0")) & (arr[1:] == ord("x")))
+    if len(zx):
+        pos = np.searchsorted(zx, c_starts)
+        first_zx = np.where(pos < len(zx), zx[np.minimum(pos, len(zx) - 1)], len(arr))
+    else:
+        # 块中没有"0x"(例如被杀掉的仿真最后截断的一行)，前缀一直延伸到行尾
+        first_zx = np.full(len(c_starts), len(arr), dtype=np.int64)
+    prefix_len = np.minimum(np.minimum(first_zx - c_starts, lengths[cand]), PREFIX_WINDOW)
+    width = (int(prefix_len.max()) + 7) // 8 * 8        # 只取本块中最长前缀的宽度
+    offsets = WINDOW_OFFSETS[:width]
+
+    padded = np.concatenate([arr, np.zeros(width, dtype=np.uint8)])
+    window = padded[c_starts[:, None] + offsets]
+    window[offsets >= prefix_len[:, None]] = 0
+    words = window.view(np.uint64)
+    hashes = words[:, 0].copy()
+    for k in range(1, words.shape[1]):
+        hashes = hashes * HASH_MULT ^ words[:, k]
+    uniq, first, inverse = np.unique(hashes, return_index=True, return_inverse=True)
+    # 同一哈希的前缀必须完全相同
+    if (words != words[first[inverse]]).any():
+        return None
+
+    ids = np.empty(len(uniq), dtype=np.int64)
+    for u, row in enumerate(first.tolist()):
+        raw = window[row].tobytes()
+        key = prefix_keys.get(raw, False)
+        if key is False:
+            m = PREFIX_RE.match(raw)
+            key = (int(m.group(1)), int(m.group(2))) if m else None
+            if key is not None and ((sms is not None and key[0] not in sms)
+                                    or (warps is not None and key[1] not in warps)):
+                key = None
+            prefix_keys[raw] = key
+        if key is None:
+            ids[u] = -1
+        else:
+            if key not in streams:
+                streams[key] = len(streams)
+            ids[u] = streams[key]
+    gid[cand] = ids[inverse]
+    return gid
+
+
+def classify_lines_re(block, starts, streams, sms, warps):
+    """逐行正则的分类方式，哈希冲突时使用"""
+    gid = np.full(len(starts), -1, dtype=np.int64)
+    for m in LINE_RE.finditer(block):
+        key = (int(m.group(1)), int(m.group(2)))
+        if (sms is not None and key[0] not in sms) or (warps is not None and key[1] not in warps):
+            continue
+        if key not in streams:
+            streams[key] = len(streams)
+        gid[np.searchsorted(starts, m.start())] = streams[key]
+    return gid
+
+
+def gather_lines(arr, starts, ends, rows):
+    """按rows的顺序拼接这些行，返回 (bytes, 每行长度)"""
+    lengths = ends[rows] - starts[rows]
+    total = int(lengths.sum())
+    if total == 0:
+        return b"", lengths
+    # 块不超过2GB，用int32下标减少临时内存
+    offsets = np.cumsum(lengths) - lengths
+    index = np.repeat((starts[rows] - offsets).astype(np.int32), lengths)
+    index += np.arange(total, dtype=np.int32)
+    return arr[index].tobytes(), lengths
+
+
+def write_groups(writer, keys, per_line, lengths, data):
+    """data中的行已按流编号排好，每个流的连续一段交给writer"""
+    bounds = np.flatnonzero(np.diff(per_line)) + 1
+    row_starts = np.concatenate([[0], bounds]).tolist()
+    row_ends = np.concatenate([bounds, [len(per_line)]]).tolist()
+    byte_offsets = np.concatenate([[0], np.cumsum(lengths)]).tolist()
+    for a, b in zip(row_starts, row_ends):
+        if a < b:
+            writer.write(keys[per_line[a]], data[byte_offsets[a]:byte_offsets[b]])
+
+
+def split_log(path, writer, sms=None, warps=None, chunk_size=CHUNK_SIZE):
+    """单遍扫描日志，返回 ({(sm, warp): [行数, 字节数]}, 总行数, 读取字节数)"""
+    streams = {}                     # (sm, warp) -> 流编号
+    prefix_keys = {}                 # 行前缀 -> (sm, warp) 或 None
+    line_counts = np.zeros(0, dtype=np.int64)
+    byte_counts = np.zeros(0, dtype=np.int64)
+    total_lines = 0
+    total_bytes = 0
+    tail = b""
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if chunk:
+                block = tail + chunk
+                cut = block.rfind(b"\n") + 1
+                block, tail = block[:cut], block[cut:]
+            else:
+                # 最后一行没有换行时补上，与grep的输出一致
+                block, tail = (tail + b"\n" if tail else b""), b""
+            total_bytes += len(block)
+            if block:
+                arr, starts, ends = line_bounds(block)
+                total_lines += len(starts)
+                gid = classify_lines(arr, starts, ends, streams, prefix_keys, sms, warps)
+                if gid is None:
+                    gid = classify_lines_re(block, starts, streams, sms, warps)
+                rows = np.flatnonzero(gid >= 0)
+                if not writer.ordered:
+                    rows = rows[np.argsort(gid[rows], kind="stable")]   # 按流分组，流内保持原顺序
+                data, lengths = gather_lines(arr, starts, ends, rows)
+                per_line = gid[rows]
+                if writer.ordered:
+                    writer.write(None, data)
+                else:
+                    write_groups(writer, sorted(streams, key=streams.get), per_line, lengths, data)
+                if len(streams) > len(line_counts):
+                    line_counts = np.pad(line_counts, (0, len(streams) - len(line_counts)))
+                    byte_counts = np.pad(byte_counts, (0, len(streams) - len(byte_counts)))
+                line_counts += np.bincount(per_line, minlength=len(streams))
+                byte_counts += np.bincount(per_line, weights=lengths, minlength=len(streams)).astype(np.int64)
+                writer.maybe_flush()
+            if not chunk:
+                break
+    counts = {key: [int(line_counts[i]), int(byte_counts[i])] for key, i in streams.items()}
+    return counts, total_lines, total_bytes
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="单遍扫描rtl.log，按SM/Warp拆分日志",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python rtl_split.py -f rtl.log                         # 所有流 -> rtl_split/sm<X>_warp<Y>.log
+  python rtl_split.py -f rtl.log -d sm0 -s 0 --compress  # 只拆分SM0，输出 sm0/sm0_warp<Y>.log.gz
+  python rtl_split.py -f rtl.log -s 0 -w 3 -o sm0_warp3.log
+  python rtl_split.py -f rtl.log -s 0 -w 3 -o -          # 输出到控制台
+-s/-w 可以是逗号分隔的列表或范围，例如 -s 0,1 -w 0-3
+        """
+    )
+    parser.add_argument("-f", "--file", required=True, help="输入的RTL日志文件路径")
+    parser.add_argument("-s", "--sm", help="只保留这些SM编号")
+    parser.add_argument("-w", "--warp", help="只保留这些Warp编号")
+    parser.add_argument("-o", "--output", help="把匹配的行按原顺序写到一个文件('-'为控制台)，不按流拆分")
+    parser.add_argument("-d", "--out-dir", help="拆分输出目录(默认为日志所在目录下的 rtl_split/)")
+    parser.add_argument("--compress", action="store_true", help="输出gzip压缩文件(.log.gz)")
+    parser.add_argument("--level", type=int, default=3, help="gzip压缩级别(默认3)")
+    parser.add_argument("--max-open", type=int, default=MAX_OPEN, help=f"同时打开的输出文件数上限(默认{MAX_OPEN})")
+    parser.add_argument("--buffer-mb", type=int, default=BUFFER_LIMIT >> 20,
+                        help=f"所有流合计缓存上限MB(默认{BUFFER_LIMIT >> 20})")
+
+    args = parser.parse_args()
+    if not os.path.isfile(args.file):
+        print(f"错误: 文件 '{args.file}' 不存在")
+        return 1
+    try:
+        sms, warps = parse_ids(args.sm), parse_ids(args.warp)
+    except ValueError:
+        print("错误: SM和Warp编号必须是数字")
+        return 1
+
+    if args.output:
+        writer = SingleWriter(args.output)
+    else:
+        out_dir = args.out_dir or os.path.join(os.path.dirname(os.path.abspath(args.file)), "rtl_split")
+        os.makedirs(out_dir, exist_ok=True)
+        writer = StreamWriter(out_dir, args.compress, args.level, args.max_open, args.buffer_mb << 20)
+
+    # 结果输出到控制台时，统计信息写到stderr
+    log = sys.stderr if args.output == "-" else sys.stdout
+    start_time = time.time()
+    try:
+        counts, total_lines, total_bytes = split_log(args.file, writer, sms, warps)
+    finally:
+        writer.close()
+    elapsed = max(time.time() - start_time, 1e-9)
+
+    for key in sorted(counts):
+        lines, size = counts[key]
+        target = writer.path(key) if isinstance(writer, StreamWriter) else args.output
+        print(f"  sm {key[0]:>2} warp {key[1]:>2}: {lines:>10} 行 {size / (1 << 20):>9.1f} MB  {target}", file=log)
+    matched = sum(c[0] for c in counts.values())
+    print(f"共 {total_lines} 行, 提取 {matched} 行到 {len(counts)} 个流, "
+          f"{total_bytes / (1 << 20):.1f} MB 用时 {elapsed:.2f} s ({total_bytes / elapsed / (1 << 20):.1f} MB/s)",
+          file=log)
+    if isinstance(writer, StreamWriter) and writer.reopened:
+        print(f"  打开文件数超过 --max-open，{writer.reopened} 次重新打开追加写", file=log)
+    if not counts:
+        print("未找到匹配的日志行", file=log)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+把仿真日志转换为 Chrome trace-event / Perfetto 可以打开的 JSON 时间线
+每个SM一个进程、每个warp一条轨道，warp从第一条记录到 endprg 为一个切片；
+每个SM另有一条活跃warp数的计数轨道，Host进程中显示每个内核以及每个CTA从 Launching 到 finished 的切片。
+输出边读边写，内存占用只与同时活跃的warp/CTA数有关。
+
+日志中只有 "Config finish!  time:" 和 "exe finish!     time:" 带仿真时间，其它行的时间按
+在日志中的位置在相邻两个时间点之间线性插值(需要rtl记录和host_inter输出在同一个日志中，如VCS -l 的simv.log)。
+"Block N finished" 不包含CTA编号，按先进先出对应到最早启动、尚未结束的CTA。
+
+用法:
+  python rtl_trace.py tc_vecadd/simv.log                        # -> tc_vecadd/simv.trace.json
+  python rtl_trace.py mnist/simv.log -o mnist/trace.json.gz     # 打开: https://ui.perfetto.dev 或 chrome://tracing
+"""
+
+import os
+import re
+import sys
+import gzip
+import json
+import time
+import argparse
+from collections import deque
+
+
+CHUNK_SIZE = 16 << 20        # 每次读取的字节数
+CLOCK_NS = 10                # 时钟周期(ns)，与 host_inter 中 kernel_cycles = 时间差/10 一致
+HOST_PID = 1000              # Host进程编号，SM进程编号为SM号
+RECORD_RE = re.compile(
+    rb"^(?:sm[ \t]+(?P<sm>\d+)[ \t]+warp[ \t]+(?P<warp>\d+)[ \t]+0x(?P<pc>[0-9a-fA-F]+)[ \t]+\S+[ \t]*(?P<kind>[^\n]{0,12})"
+    rb"|Launching CTA with ID: x=\s*(?P<x>\d+), y=\s*(?P<y>\d+), z=\s*(?P<z>\d+),wg_id=\s*(?P<wg>\d+)"
+    rb",wgid_inkernel=\s*(?P<wgk>\d+)"
+    rb"|Block\s+(?P<block>\d+) finished"
+    rb"|(?P<stage>Config|exe) finish!\s+time:\s*(?P<time>\d+(?:\.\d+)?))", re.M)
+
+
+def scan_records(path, chunk_size=CHUNK_SIZE):
+    """按块读取日志，按顺序产生匹配的记录"""
+    tail = b""
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                block, tail = tail, b""
+            else:
+                block = tail + chunk
+                cut = block.rfind(b"\n") + 1
+                block, tail = block[:cut], block[cut:]
+            yield from RECORD_RE.finditer(block)
+            if not chunk:
+                break
+
+
+class Clock:
+    """记录序号 → 仿真时间(ns)，在带时间的记录之间线性插值"""
+
+    def __init__(self, anchors, clock_ns=CLOCK_NS):
+        self.anchors = anchors        # [(序号, 时间)]，序号递增
+        self.clock_ns = clock_ns
+        self.index = 0
+
+    def __call__(self, ordinal):
+        anchors = self.anchors
+        if not anchors:
+            return ordinal * self.clock_ns
+        # 序号单调递增，只需要向前移动
+        while self.index + 1 < len(anchors) and anchors[self.index + 1][0] <= ordinal:
+            self.index += 1
+        o0, t0 = anchors[self.index]
+        if ordinal <= o0 or self.index + 1 >= len(anchors):
+            return t0
+        o1, t1 = anchors[self.index + 1]
+        return t0 + (ordinal - o0) * (t1 - t0) / (o1 - o0)
+
+
+def find_anchors(path):
+    """第一遍: 带时间的记录的序号"""
+    anchors = []
+    for ordinal, m in enumerate(scan_records(path)):
+        if m.group("time") is not None:
+            t = float(m.group("time"))
+            # 时间不减，回退的时间点(不同仿真拼接的日志)忽略
+            if not anchors or t >= anchors[-1][1]:
+                anchors.append((ordinal, t))
+    return anchors
+
+
+class TraceWriter:
+    """流式写出 {"traceEvents": [...]}"""
+
+    def __init__(self, path):
+        if path == "-":
+            self.f = sys.stdout
+        elif path.endswith(".gz"):
+            self.f = gzip.open(path, 'wt')
+        else:
+            self.f = open(path, 'w')
+        self.count = 0
+        self.f.write('{"displayTimeUnit": "ns", "traceEvents": [\n')
+
+    def emit(self, **event):
+        self.f.write((",\n" if self.count else "") + json.dumps(event, separators=(",", ":")))
+        self.count += 1
+
+    def name(self, pid, name, tid=None, sort=None):
+        if tid is None:
+            self.emit(ph="M", pid=pid, name="process_name", args={"name": name})
+            if sort is not None:
+                self.emit(ph="M", pid=pid, name="process_sort_index", args={"sort_index": sort})
+        else:
+            self.emit(ph="M", pid=pid, tid=tid, name="thread_name", args={"name": name})
+            self.emit(ph="M", pid=pid, tid=tid, name="thread_sort_index", args={"sort_index": tid})
+
+    def close(self):
+        self.f.write("\n]}\n")
+        if self.f is not sys.stdout:
+            self.f.close()
+
+
+def us(ns):
+    """trace-event 的时间单位是微秒"""
+    return round(ns / 1000.0, 6)
+
+
+def export_trace(path, writer, clock, split_gap=0):
+    """第二遍: 产生切片，返回统计"""
+    warps = {}                # (sm, warp) -> [开始时间, 最后时间, 指令记录数, 起始PC, 最后PC]
+    active = {}               # sm -> 活跃warp数
+    ctas = deque()            # 未结束的CTA: [开始时间, 名字, args, 轨道]
+    lanes = []                # Host上CTA轨道是否占用
+    kernel = None             # [开始时间, 编号]
+    stats = {"records": 0, "warp_slices": 0, "cta_slices": 0, "kernels": 0}
+    writer.name(HOST_PID, "Host", sort=-1)
+    writer.name(HOST_PID, "kernel", tid=0)
+    seen_sms, seen_lanes = set(), set()
+    now = 0.0
+
+    def set_active(sm, ts, delta):
+        active[sm] = active.get(sm, 0) + delta
+        writer.emit(ph="C", pid=sm, name="active warps", ts=us(ts), args={"warps": active[sm]})
+
+    def close_warp(key, state, end_name):
+        start, last, count, first_pc, last_pc = state
+        writer.emit(ph="X", pid=key[0], tid=key[1], name="warp", ts=us(start), dur=us(max(last - start, 0)),
+                    args={"records": count, "start_pc": f"0x{first_pc:08x}", "end_pc": f"0x{last_pc:08x}",
+                          "end": end_name})
+        set_active(key[0], last, -1)
+        stats["warp_slices"] += 1
+
+    for ordinal, m in enumerate(scan_records(path)):
+        stats["records"] += 1
+        now = clock(ordinal)
+        if m.group("sm") is not None:
+            key = (int(m.group("sm")), int(m.group("warp")))
+            pc = int(m.group("pc"), 16)
+            kind = m.group("kind")
+            state = warps.get(key)
+            if state is not None and split_gap and now - state[1] > split_gap:
+                close_warp(key, warps.pop(key), "gap")
+                state = None
+            if state is None:
+                if kind.startswith(b"lsu.w finish"):
+                    continue  # endprg之后才完成的store
+                if key[0] not in seen_sms:
+                    seen_sms.add(key[0])
+                    writer.name(key[0], f"SM {key[0]}", sort=key[0])
+                if key not in seen_lanes:
+                    seen_lanes.add(key)
+                    writer.name(key[0], f"warp {key[1]}", tid=key[1])
+                state = warps[key] = [now, now, 0, pc, pc]
+                set_active(key[0], now, 1)
+            state[1] = now
+            state[2] += 1
+            state[4] = pc
+            if kind.startswith(b"endprg"):
+                close_warp(key, warps.pop(key), "endprg")
+        elif m.group("wg") is not None:
+            lane = lanes.index(False) if False in lanes else len(lanes)
+            if lane == len(lanes):
+                lanes.append(True)
+                writer.name(HOST_PID, f"CTA slot {lane}", tid=lane + 1)
+            lanes[lane] = True
+            x, y, z = int(m.group("x")), int(m.group("y")), int(m.group("z"))
+            ctas.append([now, f"CTA ({x},{y},{z})", {"wg_id": int(m.group("wg")), "wgid_inkernel": int(m.group("wgk")),
+                                                     "x": x, "y": y, "z": z}, lane])
+        elif m.group("block") is not None:
+            if ctas:
+                start, name, args, lane = ctas.popleft()
+                args["finish_order"] = int(m.group("block"))
+                writer.emit(ph="X", pid=HOST_PID, tid=lane + 1, name=name, ts=us(start),
+                            dur=us(now - start), args=args)
+                lanes[lane] = False
+                stats["cta_slices"] += 1
+        else:
+            if m.group("stage") == b"Config":
+                writer.emit(ph="i", pid=HOST_PID, tid=0, name="config finish", ts=us(now), s="p")
+                kernel = [now, stats["kernels"]]
+            elif kernel is not None:
+                writer.emit(ph="X", pid=HOST_PID, tid=0, name=f"kernel {kernel[1]}", ts=us(kernel[0]),
+                            dur=us(now - kernel[0]), args={"cycles": round((now - kernel[0]) / clock.clock_ns)})
+                stats["kernels"] += 1
+                kernel = None
+
+    # 日志结束时仍未结束的切片
+    for key, state in list(warps.items()):
+        close_warp(key, state, "log end")
+    for start, name, args, lane in ctas:
+        writer.emit(ph="X", pid=HOST_PID, tid=lane + 1, name=name, ts=us(start), dur=us(now - start),
+                    args=dict(args, unfinished=True))
+        stats["cta_slices"] += 1
+    return stats
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="把simv.log/rtl.log转换为Chrome trace / Perfetto时间线(每个SM/warp一条轨道，CTA生命周期切片)",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python rtl_trace.py tc_vecadd/simv.log
+  python rtl_trace.py mnist/simv.log -o mnist/trace.json.gz
+  python rtl_trace.py tc_nn/simv.log --split-gap 2000        # warp空闲超过2000ns时拆分切片
+打开: https://ui.perfetto.dev 或 chrome://tracing (支持 .json.gz)
+        """
+    )
+    parser.add_argument('log', help='同时包含rtl记录和host_inter输出的仿真日志')
+    parser.add_argument('-o', '--output', help='输出文件(默认 <日志>.trace.json，.gz结尾时压缩，- 为标准输出)')
+    parser.add_argument('--split-gap', type=float, default=0,
+                        help='同一warp两条记录间隔超过该时间(ns)时拆分切片(默认不拆分)')
+    parser.add_argument('--clock-ns', type=float, default=CLOCK_NS,
+                        help=f'日志中没有时间点时每条记录按该时间(ns)递增(默认{CLOCK_NS})')
+
+    args = parser.parse_args()
+    output = args.output or os.path.splitext(args.log)[0] + ".trace.json"
+    try:
+        start_time = time.time()
+        anchors = find_anchors(args.log)
+        if not anchors:
+            print(f"警告: {args.log} 中没有 Config/exe finish 时间，按每条记录 {args.clock_ns}ns 排列", file=sys.stderr)
+        writer = TraceWriter(output)
+        stats = export_trace(args.log, writer, Clock(anchors, args.clock_ns), args.split_gap)
+        writer.close()
+    except OSError as e:
+        print(f"错误: {e}", file=sys.stderr)
+        return 2
+    elapsed = time.time() - start_time
+    print(f"{args.log}: {stats['records']} 条记录, {stats['kernels']} 个内核, {stats['cta_slices']} 个CTA, "
+          f"{stats['warp_slices']} 个warp切片 -> {output} ({writer.count} 个事件, {elapsed:.1f}s)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
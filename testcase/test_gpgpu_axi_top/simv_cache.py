@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+simv编译产物缓存
+根据源文件内容、+define+宏、编译选项和VCS版本计算缓存key，命中时直接恢复simv/simv.daidir，
+跳过编译，只运行仿真。
+
+用法:
+  python ../simv_cache.py run -- vcs -full64 ... -R -f ../common/run.f ... +define+CASE_8W4T ...
+  python ../simv_cache.py stats
+  python ../simv_cache.py clear
+
+也可以在测试用例目录下通过Makefile的VCS变量接入:
+  make run-vcs-8w4t VCS="python3 ../simv_cache.py run -- vcs"
+"""
+
+import os
+import re
+import sys
+import json
+import glob
+import time
+import shlex
+import shutil
+import hashlib
+import argparse
+import subprocess
+
+
+DEFAULT_CACHE_DIR = os.path.expanduser("~/.cache/ventus_simv")
+DEFAULT_MAX_SIZE_GB = 20.0
+ARTIFACTS = ("simv", "simv.daidir")
+
+# VCS编译期的+选项，其余+参数(+vcs+finish+、+BACKDOOR_MEM、+CTA_KERNEL=...等)都作为运行时参数传给simv
+COMPILE_PREFIXES = (
+    "+define+", "+incdir+", "+libext+", "+v2k", "+systemverilog", "+verilog", "+fsdb+functions",
+    "+bus_conflict_off", "+notimingcheck", "+nospecify", "+lint", "+warn", "+error+", "+vpi", "+acc",
+    "+cli", "+memcbk", "+nbaopt", "+rad", "+vcsd", "+plusarg_save", "+plusarg_ignore", "+optconfigfile+",
+    "+delay_mode_", "+maxdelays", "+mindelays", "+typdelays", "+neg_tchk", "+pathpulse",
+    "+transport_", "+pulse_", "+csdf+", "+timopt", "+race", "+udpsched", "+lib",
+)
+# 编译和运行都需要的参数
+BOTH_PREFIXES = ("+vcs+initreg+", "+vcs+lic+")
+# 带单独取值的编译选项，计算key时选项和取值一起参与
+VALUE_OPTIONS = {
+    "-top", "-o", "-e", "-P", "-y", "-v", "-assert", "-cm", "-cm_dir", "-cm_hier", "-CFLAGS",
+    "-LDFLAGS", "-CC", "-ld", "-load", "-ntb_opts", "-xlrm", "-timescale", "-override_timescale",
+    "-partcomp_dir", "-Mdir", "-Xlinker",
+}
+INCLUDE_RE = re.compile(r'`include\s+"([^"]+)"')
+
+
+def read_option_file(path):
+    """读取-f文件，去掉//注释后按空白切分"""
+    tokens = []
+    with open(path, 'r', errors='replace') as f:
+        for line in f:
+            line = line.split("//", 1)[0].strip()
+            if line:
+                tokens.extend(shlex.split(line))
+    return tokens
+
+
+def expand_args(args):
+    """递归展开-f文件，返回完整的参数列表(路径相对于当前目录)"""
+    expanded = []
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg in ("-f", "-F") and i + 1 < len(args):
+            expanded.extend(expand_args(read_option_file(args[i + 1])))
+            i += 2
+            continue
+        expanded.append(arg)
+        i += 1
+    return expanded
+
+
+def split_args(args):
+    """把vcs参数分成 (编译参数, 运行参数, 日志文件)"""
+    compile_args = []
+    runtime_args = []
+    log_file = None
+    i = 0
+    while i < len(args):
+        arg = args[i]
+        if arg == "-R":
+            pass
+        elif arg == "-l" and i + 1 < len(args):
+            log_file = args[i + 1]
+            i += 1
+        elif arg in VALUE_OPTIONS and i + 1 < len(args):
+            compile_args.extend(args[i:i + 2])
+            i += 1
+        elif arg.startswith(BOTH_PREFIXES):
+            compile_args.append(arg)
+            runtime_args.append(arg)
+        elif arg.startswith("+") and not arg.startswith(COMPILE_PREFIXES):
+            runtime_args.append(arg)
+        else:
+            compile_args.append(arg)
+        i += 1
+    return compile_args, runtime_args, log_file
+
+
+def tool_version(vcs):
+    """获取VCS版本字符串，失败时退回到可执行文件的路径和mtime"""
+    try:
+        out = subprocess.run([vcs, "-ID"], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                             timeout=60).stdout.decode(errors='replace')
+        lines = [l.strip() for l in out.splitlines() if "version" in l.lower()]
+        if lines:
+            return lines[0]
+    except (OSError, subprocess.SubprocessError):
+        pass
+    path = shutil.which(vcs) or vcs
+    try:
+        return f"{os.path.realpath(path)}@{os.stat(path).st_mtime_ns}"
+    except OSError:
+        return path
+
+
+def compute_key(vcs, compile_args):
+    """计算缓存key: 展开后的编译选项、+define+集合、所有源文件和include文件内容、VCS版本"""
+    expanded = expand_args(compile_args)
+    h = hashlib.sha256()
+    defines = sorted(a for a in expanded if a.startswith("+define+"))
+    options = []
+    sources = []
+    for i, arg in enumerate(expanded):
+        if arg.startswith(("-", "+")):
+            if not arg.startswith("+define+"):
+                options.append(arg)
+        elif i > 0 and expanded[i - 1] in VALUE_OPTIONS:
+            # -top X / -o X 等的取值不以-或+开头，也要进入key; -o的输出文件不能当作源文件哈希
+            options.append(arg)
+            if expanded[i - 1] == "-v" and os.path.isfile(arg):
+                sources.append(arg)
+        elif os.path.isfile(arg):
+            sources.append(arg)
+    incdirs = [d for a in expanded if a.startswith("+incdir+") for d in a[len("+incdir+"):].split("+") if d]
+
+    h.update(("version:" + tool_version(vcs) + "\n").encode())
+    h.update(("defines:" + " ".join(defines) + "\n").encode())
+    h.update(("options:" + " ".join(options) + "\n").encode())
+
+    # 源文件及其`include的文件，按出现顺序哈希内容
+    seen = set()
+    pending = list(sources)
+    for incdir in incdirs:
+        pending.extend(sorted(glob.glob(os.path.join(incdir, "*"))))
+    while pending:
+        path = pending.pop(0)
+        real = os.path.realpath(path)
+        if real in seen or not os.path.isfile(real):
+            continue
+        seen.add(real)
+        with open(real, 'rb') as f:
+            data = f.read()
+        h.update(f"file:{path}:{len(data)}\n".encode())
+        h.update(data)
+        for inc in INCLUDE_RE.findall(data.decode(errors='replace')):
+            for base in [os.getcwd()] + incdirs:
+                candidate = os.path.join(base, inc)
+                if os.path.isfile(candidate):
+                    pending.append(candidate)
+                    break
+    return h.hexdigest(), len(seen), defines
+
+
+def dir_size(path):
+    """计算文件或目录占用的字节数"""
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, dirs, files in os.walk(path):
+        for file in files:
+            fp = os.path.join(root, file)
+            if not os.path.islink(fp):
+                total += os.path.getsize(fp)
+    return total
+
+
+def copy_artifact(src, dst):
+    """复制simv或simv.daidir，保留符号链接"""
+    if os.path.isdir(src):
+        shutil.copytree(src, dst, symlinks=True)
+    else:
+        shutil.copy2(src, dst)
+
+
+def remove_path(path):
+    """删除文件或目录"""
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    elif os.path.lexists(path):
+        os.remove(path)
+
+
+def load_json(path, default):
+    """读取json文件，不存在或损坏时返回默认值"""
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return default
+
+
+def save_json(path, data):
+    """原子地写入json文件"""
+    tmp_path = f"{path}.tmp.{os.getpid()}"
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f, indent=1)
+    os.replace(tmp_path, path)
+
+
+def update_stats(cache_dir, hit, saved_seconds=0.0):
+    """累计命中率和节省时间"""
+    stats_path = os.path.join(cache_dir, "stats.json")
+    stats = load_json(stats_path, {'hits': 0, 'misses': 0, 'saved_seconds': 0.0})
+    stats['hits' if hit else 'misses'] += 1
+    stats['saved_seconds'] += saved_seconds
+    save_json(stats_path, stats)
+    return stats
+
+
+def evict(cache_dir, max_bytes):
+    """按最近使用时间淘汰缓存项，直到总大小不超过上限"""
+    entries = []
+    for meta_path in glob.glob(os.path.join(cache_dir, "entries", "*", "meta.json")):
+        meta = load_json(meta_path, None)
+        if meta is not None:
+            entries.append((meta.get('last_used', 0), meta.get('size', 0), os.path.dirname(meta_path)))
+    total = sum(e[1] for e in entries)
+    for last_used, size, entry_dir in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(entry_dir, ignore_errors=True)
+        total -= size
+        print(f"[simv_cache] 淘汰缓存项 {os.path.basename(entry_dir)[:12]} ({size / 2**20:.1f} MB)")
+
+
+def restore(entry_dir):
+    """把缓存项中的simv产物恢复到当前目录"""
+    for name in ARTIFACTS:
+        src = os.path.join(entry_dir, name)
+        if os.path.lexists(src):
+            remove_path(name)
+            copy_artifact(src, name)
+
+
+def store(cache_dir, key, compile_seconds, defines, max_bytes):
+    """把当前目录的simv产物存入缓存(先写临时目录再rename)"""
+    entries_dir = os.path.join(cache_dir, "entries")
+    os.makedirs(entries_dir, exist_ok=True)
+    entry_dir = os.path.join(entries_dir, key)
+    if os.path.exists(entry_dir):
+        return
+    tmp_dir = f"{entry_dir}.tmp.{os.getpid()}"
+    remove_path(tmp_dir)
+    os.makedirs(tmp_dir)
+    size = 0
+    for name in ARTIFACTS:
+        if os.path.lexists(name):
+            copy_artifact(name, os.path.join(tmp_dir, name))
+            size += dir_size(name)
+    save_json(os.path.join(tmp_dir, "meta.json"), {
+        'key': key,
+        'size': size,
+        'compile_seconds': compile_seconds,
+        'defines': defines,
+        'cwd': os.getcwd(),
+        'created': time.time(),
+        'last_used': time.time(),
+    })
+    try:
+        os.rename(tmp_dir, entry_dir)
+    except OSError:
+        # 其他进程已经存入了相同的key
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    evict(cache_dir, max_bytes)
+
+
+def run_simv(runtime_args, log_file):
+    """运行恢复或新编译的simv"""
+    cmd = ["./simv"] + runtime_args
+    if log_file:
+        cmd += ["-l", log_file]
+    print(f"[simv_cache] 运行: {' '.join(cmd)}")
+    return subprocess.call(cmd)
+
+
+def run_command(vcs_cmd, cache_dir, max_bytes, compile_only=False):
+    """执行run命令 - 命中缓存时跳过编译，否则编译后存入缓存"""
+    if not vcs_cmd:
+        print("错误: 缺少vcs命令，用法: simv_cache.py run -- vcs ...")
+        return 1
+    vcs = vcs_cmd[0]
+    compile_args, runtime_args, log_file = split_args(vcs_cmd[1:])
+    run_after = "-R" in vcs_cmd[1:] and not compile_only
+
+    start_time = time.time()
+    key, file_count, defines = compute_key(vcs, compile_args)
+    print(f"[simv_cache] key {key[:12]} ({file_count} 个文件, 宏: {' '.join(defines) or '无'}, "
+          f"计算用时 {time.time() - start_time:.2f} s)")
+
+    os.makedirs(cache_dir, exist_ok=True)
+    entry_dir = os.path.join(cache_dir, "entries", key)
+    meta_path = os.path.join(entry_dir, "meta.json")
+    meta = load_json(meta_path, None)
+    if meta is not None:
+        restore(entry_dir)
+        meta['last_used'] = time.time()
+        save_json(meta_path, meta)
+        stats = update_stats(cache_dir, True, meta['compile_seconds'])
+        print(f"[simv_cache] 命中，跳过编译，节省 {meta['compile_seconds']:.1f} s")
+    else:
+        compile_log = "vcs_compile.log" if log_file else None
+        cmd = [vcs] + compile_args + (["-l", compile_log] if compile_log else [])
+        print(f"[simv_cache] 未命中，编译: {' '.join(cmd)}")
+        compile_start = time.time()
+        ret = subprocess.call(cmd)
+        compile_seconds = time.time() - compile_start
+        if ret != 0:
+            print(f"[simv_cache] 编译失败，返回码: {ret}")
+            return ret
+        store(cache_dir, key, compile_seconds, defines, max_bytes)
+        stats = update_stats(cache_dir, False)
+        print(f"[simv_cache] 编译用时 {compile_seconds:.1f} s，已存入缓存")
+
+    total = stats['hits'] + stats['misses']
+    print(f"[simv_cache] 命中率 {stats['hits']}/{total} ({100.0 * stats['hits'] / total:.1f}%), "
+          f"累计节省 {stats['saved_seconds']:.1f} s")
+    if run_after:
+        return run_simv(runtime_args, log_file)
+    return 0
+
+
+def stats_command(cache_dir):
+    """执行stats命令 - 显示命中率、节省时间和缓存占用"""
+    stats = load_json(os.path.join(cache_dir, "stats.json"), {'hits': 0, 'misses': 0, 'saved_seconds': 0.0})
+    metas = [load_json(p, {}) for p in glob.glob(os.path.join(cache_dir, "entries", "*", "meta.json"))]
+    total = stats['hits'] + stats['misses']
+    rate = 100.0 * stats['hits'] / total if total else 0.0
+    print(f"缓存目录: {cache_dir}")
+    print(f"缓存项: {len(metas)} 个, 占用 {sum(m.get('size', 0) for m in metas) / 2**20:.1f} MB")
+    print(f"命中: {stats['hits']}, 未命中: {stats['misses']}, 命中率: {rate:.1f}%")
+    print(f"累计节省编译时间: {stats['saved_seconds']:.1f} s")
+    for meta in sorted(metas, key=lambda m: m.get('last_used', 0), reverse=True):
+        print(f"  {meta.get('key', '?')[:12]}  {meta.get('size', 0) / 2**20:8.1f} MB  "
+              f"编译 {meta.get('compile_seconds', 0):.1f} s  {' '.join(meta.get('defines', []))}")
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="simv编译产物缓存",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python ../simv_cache.py run -- vcs -full64 -R -f ../common/run.f -l simv.log +define+CASE_8W4T
+  make run-vcs-8w4t VCS="python3 ../simv_cache.py run -- vcs"
+  python ../simv_cache.py stats
+        """
+    )
+    parser.add_argument('command', choices=['run', 'stats', 'clear'], help='要执行的命令')
+    parser.add_argument('--cache-dir', default=os.environ.get("SIMV_CACHE_DIR", DEFAULT_CACHE_DIR),
+                        help=f'缓存目录，默认 $SIMV_CACHE_DIR 或 {DEFAULT_CACHE_DIR}')
+    parser.add_argument('--max-size', type=float, default=DEFAULT_MAX_SIZE_GB,
+                        help=f'缓存大小上限(GB)，默认 {DEFAULT_MAX_SIZE_GB}')
+    parser.add_argument('--compile-only', action='store_true', help='run: 只编译/恢复simv，不运行仿真')
+
+    if len(sys.argv) == 1:
+        parser.print_help()
+        return 0
+
+    # -- 之后是完整的vcs命令，原样保留，不交给argparse解析
+    argv = sys.argv[1:]
+    vcs_cmd = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, vcs_cmd = argv[:split], argv[split + 1:]
+    args = parser.parse_args(argv)
+    max_bytes = int(args.max_size * 2**30)
+
+    if args.command == 'run':
+        return run_command(vcs_cmd, args.cache_dir, max_bytes, args.compile_only)
+    elif args.command == 'stats':
+        return stats_command(args.cache_dir)
+    elif args.command == 'clear':
+        shutil.rmtree(args.cache_dir, ignore_errors=True)
+        print(f"已清空缓存目录: {args.cache_dir}")
+        return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
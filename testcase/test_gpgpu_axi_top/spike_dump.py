@@ -0,0 +1,348 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+spike/RTL内存dump (*.spike.json, *.rtl.json) 与紧凑二进制格式之间的转换、查询和比较
+json中每个32位字都是一对 "0x9000xxxx": "0x3ADE121E" 字符串；二进制格式只保存按基址排序的
+连续区间表和小端uint32数据，读取时直接内存映射，区间查询和比较都用数组切片完成。
+
+二进制格式 (小端):
+  头部   "VSPK", 版本, 条目数, 区间数                (4s + 3 x uint32)
+  条目   json中每个元素的 address, size              (uint64, uint64)
+  区间   基址, 字数, 所属条目                        (uint64, uint32, uint32)，按基址排序
+  数据   各区间的uint32数据按区间顺序连续存放
+
+用法:
+  python spike_dump.py convert mnist/softdata/mnist_tiny/mnist_tiny.spike.json   # -> mnist_tiny.spike.bin
+  python spike_dump.py tojson mnist_tiny.spike.bin -o mnist_tiny.spike.json
+  python spike_dump.py query mnist_tiny.spike.bin 0x90007000+0x28
+  python spike_dump.py diff mnist_small.rtl.json mnist_small.spike.json
+"""
+
+import os
+import sys
+import json
+import time
+import struct
+import argparse
+
+import numpy as np
+
+
+MAGIC = b"VSPK"
+VERSION = 1
+HEADER = struct.Struct("<4sIII")
+ENTRY_DTYPE = np.dtype([("address", "<u8"), ("size", "<u8")])
+RANGE_DTYPE = np.dtype([("base", "<u8"), ("words", "<u4"), ("entry", "<u4")])
+BINARY_SUFFIX = ".bin"
+
+
+def parse_int(text):
+    return int(text, 0) if isinstance(text, str) else int(text)
+
+
+def split_runs(addrs):
+    """地址数组按4字节连续切分，返回每段的起始下标"""
+    if len(addrs) == 0:
+        return np.zeros(0, dtype=np.int64)
+    breaks = np.flatnonzero(np.diff(addrs) != 4) + 1
+    return np.concatenate([[0], breaks])
+
+
+class SpikeDump:
+    """内存dump: entries(条目表), ranges(区间表), payload(uint32数据)，可来自json或内存映射的二进制文件"""
+
+    def __init__(self, entries, ranges, payload, path=None):
+        self.entries = entries
+        self.ranges = ranges
+        self.payload = payload
+        self.path = path
+        self.bases = ranges["base"].astype(np.uint64)
+        self.words = ranges["words"].astype(np.int64)
+        self.offsets = np.concatenate([[0], np.cumsum(self.words)]).astype(np.int64)
+        self.ends = self.bases + (self.words * 4).astype(np.uint64)
+        if len(self.bases) > 1 and (self.bases[1:] < self.ends[:-1]).any():
+            overlap = int(np.flatnonzero(self.bases[1:] < self.ends[:-1])[0])
+            raise ValueError(f"{path}: 区间 0x{int(self.bases[overlap]):x} 与 0x{int(self.bases[overlap + 1]):x} 重叠")
+
+    # ── 读取 ──
+    @classmethod
+    def open(cls, path):
+        """按文件头自动识别二进制格式或json"""
+        with open(path, 'rb') as f:
+            magic = f.read(len(MAGIC))
+        return cls.from_binary(path) if magic == MAGIC else cls.from_json(path)
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path, 'r') as f:
+            items = json.load(f)
+        entries = np.zeros(len(items), dtype=ENTRY_DTYPE)
+        ranges, payloads = [], []
+        for i, item in enumerate(items):
+            entries[i] = (parse_int(item["address"]), parse_int(item["size"]))
+            data = item["data"]
+            addrs = np.array([parse_int(a) for a in data], dtype=np.uint64)
+            values = np.array([parse_int(v) for v in data.values()], dtype=np.uint32)
+            order = np.argsort(addrs, kind="stable")
+            addrs, values = addrs[order], values[order]
+            starts = split_runs(addrs)
+            stops = np.append(starts[1:], len(addrs))
+            for start, stop in zip(starts.tolist(), stops.tolist()):
+                ranges.append((int(addrs[start]), stop - start, i))
+                payloads.append(values[start:stop])
+        table = np.array(ranges, dtype=RANGE_DTYPE)
+        order = np.argsort(table["base"], kind="stable")
+        payload = np.concatenate([payloads[i] for i in order]) if payloads else np.zeros(0, dtype=np.uint32)
+        return cls(entries, table[order], payload.astype("<u4"), path)
+
+    @classmethod
+    def from_binary(cls, path):
+        raw = np.memmap(path, dtype=np.uint8, mode="r")
+        magic, version, n_entries, n_ranges = HEADER.unpack(raw[:HEADER.size].tobytes())
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: 不是版本 {VERSION} 的dump文件")
+        pos = HEADER.size
+        entries = raw[pos:pos + n_entries * ENTRY_DTYPE.itemsize].view(ENTRY_DTYPE)
+        pos += n_entries * ENTRY_DTYPE.itemsize
+        ranges = raw[pos:pos + n_ranges * RANGE_DTYPE.itemsize].view(RANGE_DTYPE)
+        pos += n_ranges * RANGE_DTYPE.itemsize
+        payload = raw[pos:].view("<u4")
+        dump = cls(entries, ranges, payload, path)
+        if dump.offsets[-1] != len(payload):
+            raise ValueError(f"{path}: 数据长度 {len(payload)} 与区间表 {dump.offsets[-1]} 不一致")
+        return dump
+
+    # ── 写出 ──
+    def write_binary(self, path):
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, len(self.entries), len(self.ranges)))
+            f.write(np.ascontiguousarray(self.entries, dtype=ENTRY_DTYPE).tobytes())
+            f.write(np.ascontiguousarray(self.ranges, dtype=RANGE_DTYPE).tobytes())
+            f.write(np.ascontiguousarray(self.payload, dtype="<u4").tobytes())
+        os.replace(tmp_path, path)
+
+    def write_json(self, path):
+        """按spike导出的格式(indent=4, 大写十六进制)流式写回json，条目内按地址排序"""
+        entry_of = self.ranges["entry"]
+        tmp_path = f"{path}.tmp.{os.getpid()}"
+        with open(tmp_path, 'w') as f:
+            f.write("[")
+            for i, (address, size) in enumerate(self.entries.tolist()):
+                f.write(",\n" if i else "\n")
+                f.write(f'    {{\n        "address": "0x{address:08X}",\n        "data": {{')
+                first = True
+                for r in np.flatnonzero(entry_of == i).tolist():
+                    base = int(self.bases[r])
+                    values = self.payload[self.offsets[r]:self.offsets[r + 1]]
+                    lines = [f'            "0x{base + 4 * k:08X}": "0x{v:08X}"' for k, v in enumerate(values.tolist())]
+                    if lines:
+                        f.write(("\n" if first else ",\n") + ",\n".join(lines))
+                        first = False
+                f.write("}" if first else "\n        }")
+                f.write(f',\n        "size": "0x{size:08X}"\n    }}')
+            f.write("\n]" if len(self.entries) else "]")
+        os.replace(tmp_path, path)
+
+    # ── 查询 ──
+    def query(self, start, end):
+        """返回与 [start, end) 相交的各段 (起始地址, uint32数组切片)"""
+        first = int(np.searchsorted(self.ends, np.uint64(start), side="right"))
+        result = []
+        for r in range(first, len(self.bases)):
+            base = int(self.bases[r])
+            if base >= end:
+                break
+            lo = max(start, base)
+            hi = min(end, int(self.ends[r]))
+            if lo < hi:
+                begin = self.offsets[r] + (lo - base) // 4
+                result.append((lo, self.payload[begin:begin + (hi - lo + 3) // 4]))
+        return result
+
+    def lookup(self, addrs):
+        """任意地址数组 → (数据数组, 是否存在)"""
+        addrs = np.asarray(addrs, dtype=np.uint64)
+        if not len(self.bases):
+            return np.zeros(len(addrs), dtype=np.uint32), np.zeros(len(addrs), dtype=bool)
+        r = np.searchsorted(self.bases, addrs, side="right") - 1
+        valid = r >= 0
+        r = np.where(valid, r, 0)
+        valid &= (addrs < self.ends[r]) & ((addrs - self.bases[r]) % 4 == 0)
+        index = self.offsets[r] + ((addrs - self.bases[r]) // 4).astype(np.int64)
+        values = np.zeros(len(addrs), dtype=np.uint32)
+        values[valid] = self.payload[index[valid]]
+        return values, valid
+
+    def items(self):
+        """所有 (地址数组, 数据数组)，按地址排序"""
+        if not len(self.bases):
+            return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32)
+        addrs = np.repeat(self.bases - (self.offsets[:-1] * 4).astype(np.uint64), self.words) \
+            + np.arange(self.offsets[-1], dtype=np.uint64) * np.uint64(4)
+        return addrs, np.asarray(self.payload[:self.offsets[-1]], dtype=np.uint32)
+
+    @property
+    def word_count(self):
+        return int(self.offsets[-1])
+
+
+def diff(a, b):
+    """比较两个dump，返回 (地址, a中的值, b中的值) 不一致数组，以及只在a/只在b中的字数"""
+    mismatch = []
+    only_a = 0
+    for r in range(len(a.bases)):
+        base = int(a.bases[r])
+        values = a.payload[a.offsets[r]:a.offsets[r + 1]]
+        covered = 0
+        for lo, other in b.query(base, int(a.ends[r])):
+            start = (lo - base) // 4
+            mine = values[start:start + len(other)]
+            covered += len(other)
+            bad = np.flatnonzero(mine != other)
+            if len(bad):
+                mismatch.append((np.uint64(lo) + bad.astype(np.uint64) * np.uint64(4), mine[bad], other[bad]))
+        only_a += len(values) - covered
+    only_b = b.word_count - (a.word_count - only_a)
+    if mismatch:
+        addrs, va, vb = (np.concatenate(x) for x in zip(*mismatch))
+    else:
+        addrs, va, vb = np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.uint32)
+    return addrs, va, vb, only_a, only_b
+
+
+def binary_path(path):
+    return (path[:-len(".json")] if path.endswith(".json") else path) + BINARY_SUFFIX
+
+
+def parse_range(text):
+    """0x90007000 / 0x90007000..0x90007028 / 0x90007000+0x28 → (start, end)"""
+    if ".." in text:
+        start, end = text.split("..", 1)
+        return int(start, 0), int(end, 0)
+    if "+" in text:
+        start, length = text.split("+", 1)
+        return int(start, 0), int(start, 0) + int(length, 0)
+    return int(text, 0), int(text, 0) + 4
+
+
+def cmd_convert(args):
+    for path in args.paths:
+        start_time = time.time()
+        dump = SpikeDump.from_json(path)
+        out_path = args.output if args.output and len(args.paths) == 1 else binary_path(path)
+        dump.write_binary(out_path)
+        if args.verify:
+            with open(path, 'r') as f:
+                original = f.read()
+            check_path = f"{out_path}.verify.json"
+            SpikeDump.from_binary(out_path).write_json(check_path)
+            with open(check_path, 'r') as f:
+                same = f.read() == original
+            os.remove(check_path)
+            if not same:
+                print(f"错误: {out_path} 转回json后与 {path} 不一致")
+                return 1
+        print(f"{path}: {len(dump.entries)} 个条目, {len(dump.ranges)} 个区间, {dump.word_count} 个字, "
+              f"{os.path.getsize(path)} -> {os.path.getsize(out_path)} 字节 ({out_path}, "
+              f"{time.time() - start_time:.2f} s)")
+    return 0
+
+
+def cmd_tojson(args):
+    dump = SpikeDump.open(args.path)
+    out_path = args.output
+    if not out_path:
+        stem = args.path[:-len(BINARY_SUFFIX)] if args.path.endswith(BINARY_SUFFIX) else args.path
+        out_path = stem + ".json"
+    dump.write_json(out_path)
+    print(f"{args.path} -> {out_path}")
+    return 0
+
+
+def cmd_query(args):
+    dump = SpikeDump.open(args.path)
+    start, end = parse_range(args.range)
+    found = 0
+    for lo, values in dump.query(start, end):
+        for k, value in enumerate(values.tolist()):
+            print(f"0x{lo + 4 * k:08x} {value:08x}")
+        found += len(values)
+    if not found:
+        print(f"0x{start:x}..0x{end:x} 不在dump中")
+        return 1
+    return 0
+
+
+def cmd_diff(args):
+    a, b = SpikeDump.open(args.a), SpikeDump.open(args.b)
+    addrs, va, vb, only_a, only_b = diff(a, b)
+    for addr, x, y in list(zip(addrs.tolist(), va.tolist(), vb.tolist()))[:args.max_report]:
+        print(f"  0x{addr:08x}: {x:08x} != {y:08x}")
+    if len(addrs) > args.max_report:
+        print(f"  ... 另有 {len(addrs) - args.max_report} 个")
+    print(f"{args.a} vs {args.b}: 共同 {a.word_count - only_a} 个字, 不一致 {len(addrs)} 个, "
+          f"只在前者 {only_a} 个, 只在后者 {only_b} 个")
+    return 1 if len(addrs) or (args.strict and (only_a or only_b)) else 0
+
+
+def cmd_info(args):
+    dump = SpikeDump.open(args.path)
+    for r in range(len(dump.ranges)):
+        print(f"0x{int(dump.bases[r]):08x}..0x{int(dump.ends[r]):08x}  {int(dump.words[r])} 个字  "
+              f"条目 {int(dump.ranges['entry'][r])}")
+    return 0
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(
+        description="spike/RTL内存dump的紧凑二进制格式: 转换、查询、比较",
+        formatter_class=argparse.RawDescriptionHelpFormatter,
+        epilog="""
+使用示例:
+  python spike_dump.py convert mnist/softdata/*/*.spike.json --verify
+  python spike_dump.py query mnist/softdata/mnist_tiny/mnist_tiny.spike.bin 0x90007000+0x28
+  python spike_dump.py diff mnist/softdata/4w8t/mnist_small.rtl.json mnist/softdata/4w8t/mnist_small.spike.bin
+query/diff/info/tojson 的输入可以是json也可以是二进制文件
+        """
+    )
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    p = sub.add_parser("convert", help="json -> 二进制 (<name>.bin)")
+    p.add_argument("paths", nargs="+")
+    p.add_argument("-o", "--output", help="输出文件(只有一个输入时有效)")
+    p.add_argument("--verify", action="store_true", help="转回json并与原文件逐字节比较")
+    p.set_defaults(func=cmd_convert)
+
+    p = sub.add_parser("tojson", help="二进制 -> json")
+    p.add_argument("path")
+    p.add_argument("-o", "--output")
+    p.set_defaults(func=cmd_tojson)
+
+    p = sub.add_parser("query", help="按地址范围查询: ADDR, START..END 或 START+LEN")
+    p.add_argument("path")
+    p.add_argument("range")
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("diff", help="比较两个dump(例如 RTL 与 Spike)")
+    p.add_argument("a")
+    p.add_argument("b")
+    p.add_argument("--max-report", type=int, default=10, help="最多列出的不一致地址数(默认10)")
+    p.add_argument("--strict", action="store_true", help="只在一侧出现的地址也算不一致")
+    p.set_defaults(func=cmd_diff)
+
+    p = sub.add_parser("info", help="列出区间表")
+    p.add_argument("path")
+    p.set_defaults(func=cmd_info)
+
+    args = parser.parse_args()
+    try:
+        return args.func(args)
+    except (OSError, ValueError) as e:
+        print(f"错误: {e}")
+        return 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -131,6 +131,11 @@ module tc;
       $readmemh(fn_data, data);
       $readmemh(fn_metadata, metadata);
       buf_num_soft = {metadata[27], metadata[26]};
+      // +BACKDOOR_MEM: 直接加载mem_image.py生成的镜像(<data文件>.mem)，跳过下面的AXI burst写入
+      if ($test$plusargs("BACKDOOR_MEM")) begin
+        $readmemh({fn_data, ".mem"}, u_ram.mem);
+        buf_num_soft = 0;
+      end
 
       //buffer base addr init
       for(i=0; i<buf_num_soft; i=i+1) begin
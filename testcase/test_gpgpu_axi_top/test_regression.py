@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+regression.py 的测试
+用 fake_vcs.py 代替vcs运行make目标，检查License失败时退避重试、普通失败不重试，
+以及重试次数用完后的状态。
+
+用法:
+    python -m unittest test_regression
+"""
+
+import os
+import shlex
+import shutil
+import sys
+import tempfile
+import unittest
+import contextlib
+from unittest import mock
+
+import regression
+
+
+FAKE_VCS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_vcs.py")
+MAKEFILE = "VCS ?= vcs\nrun-vcs-fake:\n\t$(VCS) -full64 -R -l simv.log\n"
+JOB = {'testcase': 'tc_fake', 'target': 'run-vcs-fake', 'config': 'fake', 'skip': False}
+
+
+@unittest.skipIf(shutil.which("make") is None, "需要make")
+class RetryTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        with open(os.path.join(self.tmp.name, "Makefile"), 'w') as f:
+            f.write(MAKEFILE)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def run_job(self, max_retries=3, **env):
+        make_vars = [f"VCS={shlex.quote(sys.executable)} {shlex.quote(FAKE_VCS)}"]
+        scheduler = regression.Scheduler(1, max_retries, 0.01, 0.02, 60, make_vars)
+        env = {key: str(value) for key, value in env.items()}
+        delays = []
+        original = regression.backoff_delay
+
+        def backoff_delay(attempt, base, cap):
+            delays.append((attempt, original(attempt, base, cap)))
+            return delays[-1][1]
+
+        with mock.patch.dict(os.environ, env), mock.patch.object(regression, "backoff_delay", backoff_delay), \
+                open(os.devnull, 'w') as null, contextlib.redirect_stdout(null):
+            result = scheduler.run_job(dict(JOB), workdir=self.tmp.name)
+        return result, delays
+
+    def test_license_failure_then_success(self):
+        result, delays = self.run_job(FAKE_VCS_LICENSE_FAILURES=2)
+        self.assertEqual(result['status'], 'passed')
+        self.assertEqual(result['attempts'], 3)
+        self.assertEqual(result['license_failures'], 2)
+        # 第k次失败后在 [0, min(上限, 基准*2^(k-1))] 中退避
+        self.assertEqual([attempt for attempt, _ in delays], [0, 1])
+        self.assertTrue(0 <= delays[0][1] <= 0.01 and 0 <= delays[1][1] <= 0.02, delays)
+        with open(result['log']) as f:
+            self.assertEqual(f.read().count("===== ATTEMPT #"), 3)
+
+    def test_license_exhausted(self):
+        result, delays = self.run_job(max_retries=2, FAKE_VCS_LICENSE_FAILURES=10)
+        self.assertEqual(result['status'], 'license_exhausted')
+        self.assertEqual(result['attempts'], 3)
+        self.assertEqual(len(delays), 2)
+
+    def test_other_failure_not_retried(self):
+        result, delays = self.run_job(FAKE_VCS_FAIL=1)
+        self.assertEqual(result['status'], 'failed')
+        self.assertEqual(result['attempts'], 1)
+        self.assertEqual(delays, [])
+
+    def test_backoff_delay_cap(self):
+        for attempt in range(12):
+            self.assertLessEqual(regression.backoff_delay(attempt, 5.0, 600.0), min(600.0, 5.0 * 2 ** attempt))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+rtl_split.py 的测试
+每个流的拆分结果与 extractWarpInfo.sh 使用的grep逐字节比较，包括块中没有"0x"、
+最后一行被截断且没有换行等被杀掉的仿真留下的日志。
+
+用法:
+    python -m unittest test_rtl_split
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import unittest
+import subprocess
+
+from rtl_split import StreamWriter, split_log
+
+
+def grep_stream(path, sm, warp):
+    """与 extractWarpInfo.sh -f path -s sm -w warp 相同的grep"""
+    pattern = f"^sm[[:space:]]+{sm}[[:space:]]+warp[[:space:]]+{warp}[[:space:]]+"
+    return subprocess.run(["grep", "-E", pattern, path], stdout=subprocess.PIPE).stdout
+
+
+@unittest.skipIf(shutil.which("grep") is None, "需要grep")
+class SplitTest(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def check(self, text, chunk_size=1 << 20):
+        log = os.path.join(self.tmp.name, "rtl.log")
+        with open(log, 'wb') as f:
+            f.write(text)
+        out_dir = tempfile.mkdtemp(dir=self.tmp.name)
+        writer = StreamWriter(out_dir)
+        try:
+            counts = split_log(log, writer, chunk_size=chunk_size)[0]
+        finally:
+            writer.close()
+        for sm in range(2):
+            for warp in range(3):
+                expected = grep_stream(log, sm, warp)
+                path = writer.path((sm, warp))
+                actual = b""
+                if os.path.exists(path):
+                    with open(path, 'rb') as f:
+                        actual = f.read()
+                self.assertEqual(actual, expected, f"sm {sm} warp {warp}")
+                self.assertEqual(counts.get((sm, warp), [0])[0], expected.count(b"\n"))
+
+    def test_no_hex_anywhere(self):
+        self.check(b"sm 0 warp 1 fetch\n")
+        self.check(b"sm 0 warp 1 fetch")
+
+    def test_truncated_last_line(self):
+        self.check(b"sm 0 warp 1 0x80000000 0x0 lsu.w\nsm 1 warp 2 0x80000004 add\nsm 0 wa")
+        self.check(b"sm 0 warp 1 0x80000000 0x0 lsu.w\nsm 0 warp 1 fetch")
+
+    def test_random_log_small_chunks(self):
+        rng = random.Random(1)
+        lines = []
+        for _ in range(2000):
+            sm, warp = rng.randrange(2), rng.randrange(3)
+            kind = rng.randrange(4)
+            if kind == 0:
+                lines.append(f"sm {sm} warp {warp} 0x{rng.randrange(1 << 32):08x} 0x0 op {rng.randrange(99)}")
+            elif kind == 1:
+                lines.append(f"sm  {sm}\twarp {warp} fetch {rng.randrange(99)}")
+            elif kind == 2:
+                lines.append(f"Config finish!  time: {rng.randrange(1 << 20)}")
+            else:
+                lines.append(f"sm {sm} warp{warp} 0x0")
+        text = "\n".join(lines).encode() + b"\nsm 1 warp 2 ex"
+        # 小块使很多块中完全没有"0x"
+        for chunk_size in (16, 97, 1 << 20):
+            self.check(text, chunk_size)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+spike_dump.py 的测试
+检查区间查询在空dump、区间边界和未对齐地址上的结果。
+
+用法:
+    python -m unittest test_spike_dump
+"""
+
+import os
+import json
+import tempfile
+import unittest
+
+import numpy as np
+
+from spike_dump import SpikeDump
+
+
+def make_dump(items):
+    """由 [(条目地址, {地址: 值})] 构造dump"""
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "dump.json")
+        with open(path, 'w') as f:
+            json.dump([{"address": hex(address), "data": {hex(a): hex(v) for a, v in data.items()},
+                        "size": hex(4 * len(data))} for address, data in items], f)
+        return SpikeDump.from_json(path)
+
+
+class LookupTest(unittest.TestCase):
+    def test_empty_dump(self):
+        dump = make_dump([])
+        values, valid = dump.lookup([0x90000000, 0x90000004])
+        self.assertEqual(values.tolist(), [0, 0])
+        self.assertEqual(valid.tolist(), [False, False])
+        values, valid = dump.lookup(np.zeros(0, dtype=np.uint64))
+        self.assertEqual(len(values), 0)
+        self.assertEqual(len(valid), 0)
+
+    def test_ranges(self):
+        dump = make_dump([(0x90000000, {0x90000000: 1, 0x90000004: 2, 0x90000010: 3})])
+        values, valid = dump.lookup([0x8ffffffc, 0x90000000, 0x90000002, 0x90000004,
+                                     0x90000008, 0x90000010, 0x90000014])
+        self.assertEqual(valid.tolist(), [False, True, False, True, False, True, False])
+        self.assertEqual(values[valid].tolist(), [1, 2, 3])
+
+
+if __name__ == "__main__":
+    unittest.main()